@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# benchmarks/load_generator.py
+"""
+Load test: mở hàng nghìn kết nối đồng thời tới server (không cần pygame),
+mỗi kết nối nói đúng protocol của client thật:
+CONNECT hoặc AI_MODE -> READY -> gửi INPUT khi đổi hướng (+ keepalive) -> PLAY_AGAIN khi hết trận.
+
+Báo cáo: thời gian thiết lập kết nối, độ giật giữa các snapshot,
+độ trễ input -> state (percentile) và bytes/giây mỗi client.
+
+    python run_server.py --mode async
+    python benchmarks/load_generator.py --clients 2000 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from collections import deque
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import *
+from shared.protocol import Message, FrameDecoder
+from shared.models import GameState
+from shared.codec import DeltaDecoder
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PADDLE1_FIELD = 4  # Vị trí paddle1.y / paddle2.y trong tuple field của snapshot
+PADDLE2_FIELD = 5
+
+
+def percentile(values, pct):
+    """Percentile theo nearest-rank (values đã sort)"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+def summarize(values, scale=1000.0):
+    """p50/p95/p99/max của một list (mặc định đổi giây -> ms)"""
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50) * scale,
+        'p95': percentile(values, 95) * scale,
+        'p99': percentile(values, 99) * scale,
+        'max': values[-1] * scale,
+    }
+
+
+class LoadClient:
+    """Một người chơi giả lập"""
+
+    def __init__(self, index, args):
+        self.index = index
+        self.args = args
+        self.ai_mode = random.random() < args.ai_ratio
+        self.codec = args.codec
+        self.reader = None
+        self.writer = None
+        self.decoder = FrameDecoder()
+        self.delta_decoder = DeltaDecoder()
+        self.player_id = None
+        self.playing = False
+        self.failed = False
+
+        # Input hiện tại (đổi hướng định kỳ để đo độ trễ)
+        self.input_seq = 0
+        self.input_tick = 0  # Tick của client, cùng nhịp tick_rate của server như client thật
+        self.tick_interval = 1.0 / args.input_rate if args.input_rate else None  # None: chờ PLAYER_ID
+        self.next_tick_time = None
+        self.input_changes = deque(maxlen=INPUT_REDUNDANCY)
+        self.last_input_time = 0
+        self.move_up = False
+        self.move_down = False
+        self.paddle_y = None
+        self.change_time = None  # Thời điểm đổi input chưa thấy phản hồi
+        self.change_from_y = None
+        self.next_switch = 0
+
+        # Số liệu
+        self.setup_time = None
+        self.last_snapshot = None
+        self.intervals = []
+        self.latencies = []
+        self.bytes_received = 0
+        self.connect_time = None
+        self.close_time = None
+        self.snapshots = 0
+        self.games = 0
+
+    async def run(self, stop_event):
+        started = time.perf_counter()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+            self.connect_time = time.perf_counter()
+            if self.ai_mode:
+                self.send(Message.ai_mode(self.args.difficulty, self.codec))
+            else:
+                self.send(Message.connect(self.codec))
+
+            while not stop_event.is_set():
+                data = await self.reader.read(BUFFER_SIZE)
+                if not data:
+                    break
+                now = time.perf_counter()
+                self.bytes_received += len(data)
+                for payload in self.decoder.feed(data):
+                    self.handle(payload, now, started)
+
+        except Exception:
+            self.failed = True
+        finally:
+            self.close_time = time.perf_counter()
+            self.close()
+
+    def send(self, data):
+        if self.writer and not self.writer.is_closing():
+            self.writer.write(data)
+
+    def handle(self, payload, now, started):
+        msg_type, msg_data = Message.parse(payload)
+
+        if msg_type == MSG_PLAYER_ID:
+            self.player_id = msg_data.get('id')
+            self.codec = msg_data.get('codec', CODEC_JSON)
+            if not self.args.input_rate:
+                self.tick_interval = 1.0 / msg_data.get('tick_rate', FPS)
+            self.setup_time = now - started
+
+        elif msg_type == MSG_READY:
+            self.send(Message.ready())
+            self.playing = True
+
+        elif msg_type == MSG_SNAPSHOT:
+            seq, fields = self.delta_decoder.decode(msg_data)
+            if seq is None:
+                self.send(Message.keyframe_request())
+                return
+            self.send(Message.ack(seq))
+            field = PADDLE1_FIELD if self.player_id == 1 else PADDLE2_FIELD
+            self.on_state(fields[field], now)
+
+        elif msg_type == MSG_GAME_STATE:
+            if not isinstance(msg_data, GameState):
+                msg_data = GameState.from_dict(msg_data)
+            paddle = msg_data.paddle1 if self.player_id == 1 else msg_data.paddle2
+            self.on_state(paddle.y, now)
+
+        elif msg_type == MSG_GAME_OVER:
+            self.games += 1
+            self.change_time = None
+            self.send(Message.play_again())
+
+        elif msg_type == MSG_DISCONNECT:
+            # Đối thủ thoát: kết nối không còn dùng được
+            self.playing = False
+
+    def on_state(self, paddle_y, now):
+        """Ghi nhận snapshot: khoảng cách giữa 2 snapshot và phản hồi của input"""
+        self.snapshots += 1
+        if self.last_snapshot is not None:
+            self.intervals.append(now - self.last_snapshot)
+        self.last_snapshot = now
+        self.paddle_y = paddle_y
+
+        # Paddle bắt đầu đi theo input mới -> độ trễ input -> state
+        if self.change_time is not None:
+            moved_up = self.move_up and paddle_y < self.change_from_y
+            moved_down = self.move_down and paddle_y > self.change_from_y
+            if moved_up or moved_down:
+                self.latencies.append(now - self.change_time)
+                self.change_time = None
+
+    def due_ticks(self, now):
+        """Số tick input đến hạn từ lần gọi trước (như PaddlePredictor.due_ticks)"""
+        if self.next_tick_time is None:
+            self.next_tick_time = now
+        if now < self.next_tick_time:
+            return 0
+
+        ticks = int((now - self.next_tick_time) / self.tick_interval) + 1
+        if ticks > MAX_PREDICTION_CATCH_UP:
+            self.next_tick_time = now
+            ticks = MAX_PREDICTION_CATCH_UP
+        self.next_tick_time += ticks * self.tick_interval
+        return ticks
+
+    def send_input(self, now):
+        """
+        Các tick input đến hạn: định kỳ đổi hướng về phía còn nhiều chỗ,
+        chỉ gửi khi đổi hoặc keepalive
+        """
+        if not self.playing or self.player_id is None:
+            return
+        ticks = self.due_ticks(now)
+        if not ticks:
+            return
+
+        if now >= self.next_switch and self.paddle_y is not None and self.change_time is None:
+            go_down = self.paddle_y < (SCREEN_HEIGHT - PADDLE_HEIGHT) / 2
+            self.move_up, self.move_down = not go_down, go_down
+            self.change_time = now
+            self.change_from_y = self.paddle_y
+            self.next_switch = now + self.args.switch_interval
+
+        for _ in range(ticks):
+            self.input_tick += 1
+            changes = self.input_changes
+            changed = not changes or changes[-1][1:] != (self.move_up, self.move_down)
+            if changed:
+                changes.append((self.input_tick, self.move_up, self.move_down))
+            if changed or now - self.last_input_time >= INPUT_KEEPALIVE_INTERVAL:
+                self.input_seq += 1
+                self.last_input_time = now
+                self.send(Message.input_data(list(changes), self.input_tick, self.codec, self.input_seq))
+
+    def close(self):
+        if self.writer:
+            try:
+                self.writer.write(Message.disconnect())
+                self.writer.close()
+            except Exception:
+                pass
+
+
+async def input_ticker(clients, rate, stop_event):
+    """
+    Một task gửi input cho mọi client (thay vì một timer mỗi client)
+    rate: số lần kiểm tra mỗi giây (như frame của client thật), mỗi client
+    tự tính số tick đến hạn theo tick_rate của nó
+    """
+    interval = 1.0 / rate
+    next_time = time.perf_counter()
+    while not stop_event.is_set():
+        now = time.perf_counter()
+        for client in clients:
+            client.send_input(now)
+        next_time += interval
+        await asyncio.sleep(max(0, next_time - time.perf_counter()))
+
+
+async def run_load(args, count):
+    """
+    Mở count kết nối theo tốc độ --connect-rate, chạy --duration giây
+    Returns: số liệu thô (collect_samples)
+    """
+    stop_event = asyncio.Event()
+    clients = []
+    tasks = []
+
+    ticker = asyncio.create_task(input_ticker(clients, max(FPS, args.input_rate or 0), stop_event))
+    started = time.perf_counter()
+
+    for index in range(count):
+        client = LoadClient(index, args)
+        clients.append(client)
+        tasks.append(asyncio.create_task(client.run(stop_event)))
+        await asyncio.sleep(1.0 / args.connect_rate)
+
+    ramp_time = time.perf_counter() - started
+    print(f"🚀 {count} clients started in {ramp_time:.1f}s, running for {args.duration}s...")
+    await asyncio.sleep(args.duration)
+
+    stop_event.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, ticker, return_exceptions=True)
+    return collect_samples(clients)
+
+
+def run_process(args, count, seed):
+    """Entry point của mỗi process sinh tải"""
+    random.seed(seed)
+    raise_fd_limit(count)
+    return asyncio.run(run_load(args, count))
+
+
+def collect_samples(clients):
+    """Số liệu thô của các client (để gộp nhiều process trước khi tính percentile)"""
+    connected = [c for c in clients if c.setup_time is not None]
+    rates = []
+    for c in connected:
+        # Chia cho thời gian giữ kết nối (không phải khoảng giữa byte đầu và cuối:
+        # client chỉ nhận PLAYER_ID + WAIT sẽ cho tốc độ ảo rất lớn)
+        if c.close_time is not None and c.close_time > c.connect_time:
+            rates.append(c.bytes_received / (c.close_time - c.connect_time))
+
+    return {
+        'clients': len(clients),
+        'connected': len(connected),
+        'failed': sum(1 for c in clients if c.failed or c.setup_time is None),
+        'games_finished': sum(c.games for c in clients),
+        'setup': [c.setup_time for c in connected],
+        'intervals': [i for c in connected for i in c.intervals],
+        'latencies': [l for c in connected for l in c.latencies],
+        'rates': rates,
+    }
+
+
+def build_report(samples_list):
+    """Gộp số liệu của các process và tính percentile"""
+    merged = {}
+    for samples in samples_list:
+        for key, value in samples.items():
+            merged[key] = merged.get(key, 0 if isinstance(value, int) else []) + value
+
+    intervals = merged['intervals']
+    return {
+        'clients': merged['clients'],
+        'connected': merged['connected'],
+        'failed': merged['failed'],
+        'games_finished': merged['games_finished'],
+        'setup_ms': summarize(merged['setup']),
+        'snapshot_interval_ms': summarize(intervals),
+        'snapshot_jitter_ms': statistics.pstdev(intervals) * 1000 if len(intervals) > 1 else None,
+        'input_latency_ms': summarize(merged['latencies']),
+        'bytes_per_sec_per_client': summarize(merged['rates'], scale=1.0),
+    }
+
+
+def print_report(report):
+    """In báo cáo dạng bảng"""
+    print(f"\n📊 Clients: {report['clients']} (connected {report['connected']}, "
+          f"failed {report['failed']}), games finished: {report['games_finished']}")
+
+    def line(title, stats, unit):
+        if not stats.get('count'):
+            print(f"{title:<28} no samples")
+            return
+        print(f"{title:<28} p50 {stats['p50']:9.2f}  p95 {stats['p95']:9.2f}  "
+              f"p99 {stats['p99']:9.2f}  max {stats['max']:9.2f} {unit}  (n={stats['count']})")
+
+    line("Connection setup", report['setup_ms'], "ms")
+    line("Snapshot inter-arrival", report['snapshot_interval_ms'], "ms")
+    if report['snapshot_jitter_ms'] is not None:
+        print(f"{'Snapshot jitter (stdev)':<28} {report['snapshot_jitter_ms']:.2f} ms")
+    line("Input -> state latency", report['input_latency_ms'], "ms")
+    line("Bytes/sec per client", report['bytes_per_sec_per_client'], "B/s")
+
+
+def raise_fd_limit(clients):
+    """Nâng giới hạn số file descriptor nếu cần (mỗi client một socket)"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = clients + 256
+    if soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+        if new_soft < wanted:
+            print(f"⚠️ File descriptor limit is {new_soft}, some connections may fail")
+
+
+def parse_args():
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Classic Pong load generator")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--clients', type=int, default=1000, help="Số kết nối đồng thời")
+    parser.add_argument('--duration', type=float, default=30, help="Số giây chạy sau khi mở đủ kết nối")
+    parser.add_argument('--connect-rate', type=float, default=500, help="Số kết nối mở mỗi giây")
+    parser.add_argument('--ai-ratio', type=float, default=0.5, help="Tỉ lệ client chơi với AI (còn lại PvP)")
+    parser.add_argument('--difficulty', default="medium", choices=("easy", "medium", "hard"))
+    parser.add_argument('--codec', default=DEFAULT_CODEC, choices=SUPPORTED_CODECS)
+    parser.add_argument('--input-rate', type=float, default=None,
+                        help="Ghi đè số tick input mỗi giây mỗi client (mặc định: tick_rate server gửi trong "
+                             "PLAYER_ID; INPUT chỉ gửi khi đổi + keepalive)")
+    parser.add_argument('--switch-interval', type=float, default=0.5,
+                        help="Số giây giữa 2 lần đổi hướng paddle (đo độ trễ input)")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Chia client cho nhiều process (một process Python chỉ dùng 1 core)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Ghi báo cáo ra file JSON")
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+    processes = max(1, min(args.processes, args.clients))
+    counts = [args.clients // processes + (1 if i < args.clients % processes else 0)
+              for i in range(processes)]
+
+    try:
+        if processes == 1:
+            samples_list = [run_process(args, counts[0], args.seed)]
+        else:
+            jobs = [(args, count, args.seed + i) for i, count in enumerate(counts)]
+            with multiprocessing.Pool(processes) as pool:
+                samples_list = pool.starmap(run_process, jobs)
+    except KeyboardInterrupt:
+        print("\n⚠️ Interrupted by user")
+        return 1
+
+    report = build_report(samples_list)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# benchmarks/renderer.py
+"""
+Benchmark Renderer không cần màn hình/GPU: chạy pygame trên video driver
+"dummy" của SDL, đưa một chuỗi GameState (replay đã ghi hoặc tự sinh) qua
+draw_game, và các màn hình draw_menu / draw_game_over.
+
+Báo cáo thời gian mỗi frame (p50/p95/p99/max, gồm cả update()) và bộ nhớ
+cấp phát phía Python mỗi frame (tracemalloc, đo ở một lượt riêng).
+Kết quả ghi ra JSON (--output) và so được với lần chạy trước (--baseline)
+giống benchmarks/simulation.py.
+
+    python benchmarks/renderer.py --output renderer.json
+    python benchmarks/renderer.py --replay replays/room-1.replay --baseline renderer.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Phải đặt trước khi import pygame
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from shared.constants import *
+from shared.codec import BinaryCodec
+from server.game_logic import GameLogic
+from server.ai_player import AIPlayer
+from server.replay import ReplayReader
+from client.renderer import Renderer
+from benchmarks.load_generator import summarize
+from benchmarks.simulation import compare
+
+MENU_OPTIONS = ["Multiplayer (2 Players)", "Play vs AI", "Watch a Match", "Exit"]
+
+
+def copy_state(state):
+    """Bản sao các field được vẽ của GameState"""
+    return BinaryCodec.apply_fields(BinaryCodec.state_fields(state))
+
+
+def synthetic_states(frames, seed=0):
+    """Một trận AI vs AI (có ghi điểm, chơi lại khi hết trận), mỗi tick một frame"""
+    logic = GameLogic(seed)
+    logic.reset_ball()
+    ais = [AIPlayer("hard", player_id=1, seed=seed + 1), AIPlayer("medium", player_id=2, seed=seed + 2)]
+    dt = 1.0 / FPS
+    states = []
+    for _ in range(frames):
+        state = logic.get_state()
+        if state.game_over:
+            logic.reset_game()
+        for ai in ais:
+            move_up, move_down = ai.calculate_move(state)
+            logic.set_paddle_input(ai.player_id, move_up, move_down)
+        logic.update(dt)
+        states.append(copy_state(logic.get_state()))
+    return states
+
+
+def replay_states(path, frames):
+    """Các state của file replay (tối đa frames tick đầu tiên)"""
+    reader = ReplayReader(path)
+    try:
+        return [copy_state(logic.get_state()) for _, logic in reader.replay(0, frames)]
+    finally:
+        reader.close()
+
+
+def scenarios(renderer, states):
+    """{tên: list các hàm, mỗi hàm vẽ + update một frame}"""
+    def game_frame(state):
+        def draw():
+            renderer.draw_game(state, 1)
+            renderer.update()
+        return draw
+
+    def menu_frame(selected):
+        def draw():
+            renderer.draw_menu("CLASSIC PONG", MENU_OPTIONS, selected)
+            renderer.update()
+        return draw
+
+    def game_over_frame(winner, selected):
+        def draw():
+            renderer.draw_game_over(winner, 1, selected)
+            renderer.update()
+        return draw
+
+    count = len(states)
+    return {
+        'renderer.draw_game': [game_frame(state) for state in states],
+        'renderer.draw_menu': [menu_frame(i % len(MENU_OPTIONS)) for i in range(count)],
+        'renderer.draw_game_over': [game_over_frame(1 + i // 2 % 2, i % 2) for i in range(count)],
+    }
+
+
+def time_frames(frames, warmup):
+    """Thời gian (giây) của từng frame, tắt GC trong lúc đo"""
+    for draw in frames[:warmup]:
+        draw()
+
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for draw in frames:
+            start = time.perf_counter()
+            draw()
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return times
+
+
+def trace_frames(frames):
+    """
+    Bộ nhớ Python cấp phát trong từng frame (tracemalloc chậm nên đo lượt riêng)
+    Returns: (bytes lớn nhất dùng thêm trong mỗi frame, bytes còn giữ lại sau cả lượt)
+    """
+    tracemalloc.start()
+    try:
+        start_current, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for draw in frames:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            draw()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+        end_current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peaks, end_current - start_current
+
+
+def run_benchmarks(states, warmup):
+    """Chạy mọi kịch bản, trả về {tên số liệu: giá trị} (µs cho thời gian, KB cho bộ nhớ)"""
+    renderer = Renderer(fps=0)  # Không giới hạn FPS: đo đúng chi phí vẽ
+    results = {}
+    try:
+        for name, frames in scenarios(renderer, states).items():
+            print(f"⏱️  {name} ({len(frames)} frames)")
+            times = summarize(time_frames(frames, warmup), scale=1e6)
+            peaks, retained = trace_frames(frames)
+            peaks = summarize(peaks, scale=1 / 1024)
+
+            results[f'{name}.p50_us'] = times['p50']
+            results[f'{name}.p95_us'] = times['p95']
+            results[f'{name}.p99_us'] = times['p99']
+            results[f'{name}.max_us'] = times['max']
+            results[f'{name}.alloc_p50_kb'] = peaks['p50']
+            results[f'{name}.alloc_max_kb'] = peaks['max']
+            results[f'{name}.retained_kb'] = retained / 1024
+    finally:
+        renderer.quit()
+    return results
+
+
+def parse_args():
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Classic Pong headless renderer benchmark")
+    parser.add_argument('--frames', type=int, default=600, help="Số frame mỗi kịch bản")
+    parser.add_argument('--warmup', type=int, default=60, help="Số frame chạy trước khi đo")
+    parser.add_argument('--replay', help="Dùng state của file .replay thay vì trận tự sinh")
+    parser.add_argument('--seed', type=int, default=0, help="Seed của trận tự sinh")
+    parser.add_argument('--output', help="Ghi kết quả ra file JSON")
+    parser.add_argument('--baseline', help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Chậm hơn baseline quá tỉ lệ này thì báo lỗi (mặc định 20%%)")
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+    if args.replay:
+        states = replay_states(args.replay, args.frames)
+    else:
+        states = synthetic_states(args.frames, args.seed)
+    if not states:
+        print("❌ No states to render")
+        return 1
+
+    results = run_benchmarks(states, args.warmup)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'sdl': '.'.join(map(str, pygame.get_sdl_version())),
+            'video_driver': os.environ['SDL_VIDEODRIVER'],
+            'platform': platform.platform(),
+            'source': args.replay or f'synthetic(seed={args.seed})',
+            'frames': len(states),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'unit': 'us_per_frame / kb_per_frame',
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) worse than baseline by more than {args.threshold:.0%}:")
+            for name in regressions:
+                print(f"   - {name}")
+            return 1
+        print("\n✅ No regressions")
+    else:
+        for name, value in results.items():
+            print(f"{name:<44}{value:>12.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# benchmarks/simulation.py
+"""
+Benchmark các đường nóng của server, không cần màn hình hay mạng:
+GameLogic.update, BatchGameLogic.step, AIPlayer/BatchAI, GameState.to_dict/from_dict,
+Message.create/parse, codec nhị phân và một tick đầy đủ của server với N phòng AI vs AI.
+
+Kết quả ghi ra file JSON (--output) và có thể so với một lần chạy trước
+(--baseline): benchmark nào chậm hơn quá --threshold thì thoát với mã 1.
+
+    python benchmarks/simulation.py --rooms 1,100,1000 --output baseline.json
+    python benchmarks/simulation.py --baseline baseline.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.constants import *
+from shared.models import GameState
+from shared.protocol import Message
+from shared.codec import BinaryCodec, DeltaEncoder
+from server.game_logic import GameLogic
+from server.batch_game_logic import BatchGameLogic, batch_available
+from server.batch_ai import BatchAI
+from server.ai_player import AIPlayer
+from server.connection import BaseConnection
+from server.game_server import GameServer
+from server.config import ServerConfig
+
+MIN_OPS = 20000  # Số thao tác tối thiểu mỗi lần đo (room count nhỏ thì lặp nhiều vòng)
+
+
+class NullConnection(BaseConnection):
+    """Connection bỏ đi mọi dữ liệu gửi (chỉ đếm byte) để đo riêng phần server"""
+
+    def __init__(self, addr, codec=CODEC_DELTA):
+        super().__init__(addr)
+        self.codec = codec
+        if codec == CODEC_DELTA:
+            self.delta = DeltaEncoder()
+        self.bytes_sent = 0
+
+    def send(self, data):
+        self.bytes_sent += len(data)
+
+    def send_snapshot(self, data):
+        self.bytes_sent += len(data)
+
+    def flush(self):
+        pass
+
+    def has_pending(self):
+        return False
+
+    def close(self):
+        pass
+
+
+def measure(func, ops, repeat):
+    """
+    Chạy func() repeat lần (tắt GC như timeit), lấy lần nhanh nhất
+    Returns: micro giây cho mỗi thao tác
+    """
+    best = float('inf')
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best / ops * 1e6
+
+
+def random_states(count, seed=0):
+    """Các GameState ngẫu nhiên (bóng bay về cả 2 phía)"""
+    rng = random.Random(seed)
+    states = []
+    for _ in range(count):
+        state = GameState()
+        state.ball.x = rng.uniform(0, SCREEN_WIDTH)
+        state.ball.y = rng.uniform(0, SCREEN_HEIGHT - BALL_SIZE)
+        state.ball.vx = rng.choice([-1, 1]) * rng.uniform(BALL_SPEED_X, BALL_MAX_SPEED)
+        state.ball.vy = rng.uniform(-BALL_SPEED_Y, BALL_SPEED_Y)
+        state.paddle1.y = rng.uniform(0, SCREEN_HEIGHT - PADDLE_HEIGHT)
+        state.paddle2.y = rng.uniform(0, SCREEN_HEIGHT - PADDLE_HEIGHT)
+        state.score1 = rng.randint(0, WINNING_SCORE - 1)
+        state.score2 = rng.randint(0, WINNING_SCORE - 1)
+        states.append(state)
+    return states
+
+
+def loops_for(count):
+    """Số vòng lặp để mỗi lần đo có ít nhất MIN_OPS thao tác"""
+    return max(1, MIN_OPS // count)
+
+
+def bench_game_logic(rooms, ticks, repeat):
+    logics = [GameLogic(seed=i) for i in range(rooms)]
+    dt = 1.0 / ServerConfig.SIMULATION_RATE
+
+    def run():
+        for _ in range(ticks):
+            for logic in logics:
+                if logic.state.game_over:
+                    logic.reset_game()
+                logic.update(dt)
+
+    return measure(run, rooms * ticks, repeat)
+
+
+def bench_batch_logic(rooms, ticks, repeat):
+    batch = BatchGameLogic(capacity=rooms)
+    for i in range(rooms):
+        batch.add_room(GameLogic(seed=i))
+    dt = 1.0 / ServerConfig.SIMULATION_RATE
+
+    def run():
+        for _ in range(ticks):
+            batch.game_over[:rooms] = False
+            batch.step(dt)
+
+    return measure(run, rooms * ticks, repeat)
+
+
+def bench_ai(rooms, repeat):
+    states = random_states(rooms)
+    ais = [AIPlayer("hard", player_id=1 + i % 2) for i in range(rooms)]
+    for ai in ais:
+        ai.reaction_ticks = 1  # Đo cả đường tính toán, không bị delay chặn
+    loops = loops_for(rooms)
+    pairs = list(zip(ais, states))
+
+    def calculate():
+        for _ in range(loops):
+            for ai, state in pairs:
+                ai.calculate_move(state)
+
+    def predict():
+        for _ in range(loops):
+            for ai, state in pairs:
+                ai._predict_ball_position(state)
+
+    ops = rooms * loops
+    results = {
+        'ai.calculate_move': measure(calculate, ops, repeat),
+        'ai.predict_ball_position': measure(predict, ops, repeat),
+    }
+
+    if batch_available():
+        physics = BatchGameLogic(capacity=rooms)
+        batch_ai = BatchAI(capacity=rooms)
+        room_slots = []
+        for i, state in enumerate(states):
+            logic = GameLogic(seed=i)
+            logic.state = state
+            room_slots.append(physics.add_room(logic))
+        ai_slots = [batch_ai.add_player(ai) for ai in ais]
+
+        def batch_step():
+            for _ in range(loops):
+                batch_ai.step(physics, ai_slots, room_slots)
+
+        results['batch_ai.step'] = measure(batch_step, ops, repeat)
+    return results
+
+
+def bench_models(rooms, repeat):
+    states = random_states(rooms)
+    dicts = [state.to_dict() for state in states]
+    loops = loops_for(rooms)
+
+    def to_dict():
+        for _ in range(loops):
+            for state in states:
+                state.to_dict()
+
+    def from_dict():
+        for _ in range(loops):
+            for data in dicts:
+                GameState.from_dict(data)
+
+    ops = rooms * loops
+    return {
+        'state.to_dict': measure(to_dict, ops, repeat),
+        'state.from_dict': measure(from_dict, ops, repeat),
+    }
+
+
+def bench_protocol(rooms, repeat):
+    states = random_states(rooms)
+    json_payloads = [Message.create(MSG_GAME_STATE, s.to_dict())[FRAME_HEADER_SIZE:] for s in states]
+    binary_payloads = [BinaryCodec.encode_state(s) for s in states]
+    encoders = [DeltaEncoder() for _ in states]
+    loops = loops_for(rooms)
+
+    def create_json():
+        for _ in range(loops):
+            for state in states:
+                Message.create(MSG_GAME_STATE, state.to_dict())
+
+    def parse_json():
+        for _ in range(loops):
+            for payload in json_payloads:
+                Message.parse(payload)
+
+    def create_binary():
+        for _ in range(loops):
+            for state in states:
+                Message.game_state(state, CODEC_BINARY)
+
+    def parse_binary():
+        for _ in range(loops):
+            for payload in binary_payloads:
+                Message.parse(payload)
+
+    def encode_delta():
+        for _ in range(loops):
+            for encoder, state in zip(encoders, states):
+                encoder.encode(state)
+                encoder.ack(encoder.seq)
+
+    ops = rooms * loops
+    return {
+        'message.create[json]': measure(create_json, ops, repeat),
+        'message.parse[json]': measure(parse_json, ops, repeat),
+        'message.create[binary]': measure(create_binary, ops, repeat),
+        'message.parse[binary]': measure(parse_binary, ops, repeat),
+        'delta.encode': measure(encode_delta, ops, repeat),
+    }
+
+
+def build_server(rooms, codec):
+    """GameServer (không mở socket) với N phòng AI vs AI đang chơi"""
+    server = GameServer()
+    ai_players = []
+    with contextlib.redirect_stdout(io.StringIO()):  # Bỏ log tạo phòng
+        for i in range(rooms):
+            conn = NullConnection(('bench', i), codec)
+            server.clients[conn] = conn.addr
+            room_id, player_id, _ = server.room_manager.find_or_create_room(
+                conn, conn.addr, ai_mode=True, ai_difficulty="hard"
+            )
+            room = server.room_manager.rooms[room_id]
+            room.set_ready(player_id)
+            ai_players.append((room, AIPlayer("hard", player_id=1)))
+    return server, ai_players
+
+
+def bench_server_tick(rooms, ticks, repeat, codec=CODEC_DELTA):
+    server, ai_players = build_server(rooms, codec)
+    dt = server.scheduler.dt
+    tick_counter = [0]
+
+    def run():
+        for _ in range(ticks):
+            # Player 1 cũng là AI
+            for room, ai in ai_players:
+                if not room.active:
+                    room.game_logic.reset_game()
+                    room.active = True
+                move_up, move_down = ai.calculate_move(room.game_logic.get_state())
+                room.game_logic.set_paddle_input(1, move_up, move_down)
+
+            tick_counter[0] += 1
+            server.update_rooms(tick_counter[0], dt)
+            server.flush_connections()
+
+    return measure(run, ticks, repeat)
+
+
+def run_benchmarks(room_counts, ticks, repeat, only=None):
+    """Chạy tất cả benchmark, trả về {tên: µs / thao tác}"""
+    results = {}
+
+    def wanted(group):
+        return only is None or group in only
+
+    for rooms in room_counts:
+        print(f"⏱️  rooms={rooms}")
+        if wanted('logic'):
+            results[f'game_logic.update[rooms={rooms}]'] = bench_game_logic(rooms, ticks, repeat)
+            if batch_available():
+                results[f'batch_logic.step[rooms={rooms}]'] = bench_batch_logic(rooms, ticks, repeat)
+        if wanted('ai'):
+            for name, value in bench_ai(rooms, repeat).items():
+                results[f'{name}[rooms={rooms}]'] = value
+        if wanted('models'):
+            for name, value in bench_models(rooms, repeat).items():
+                results[f'{name}[rooms={rooms}]'] = value
+        if wanted('protocol'):
+            for name, value in bench_protocol(rooms, repeat).items():
+                results[f'{name}[rooms={rooms}]'] = value
+        if wanted('server'):
+            results[f'server.tick[rooms={rooms}]'] = bench_server_tick(rooms, ticks, repeat)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    In bảng so sánh với baseline
+    Returns: list tên các benchmark chậm hơn baseline quá threshold
+    """
+    regressions = []
+    print(f"\n{'benchmark':<44}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<44}{'-':>12}{current:>12.3f}{'new':>10}")
+            continue
+
+        change = current / previous - 1
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = " ❌"
+        print(f"{name:<44}{previous:>12.3f}{current:>12.3f}{change:>+9.1%}{mark}")
+    return regressions
+
+
+def parse_args():
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Classic Pong simulation benchmarks")
+    parser.add_argument('--rooms', default="1,100,1000",
+                        help="Các số phòng cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument('--ticks', type=int, default=60, help="Số tick mỗi lần đo")
+    parser.add_argument('--repeat', type=int, default=5, help="Số lần đo (lấy lần nhanh nhất)")
+    parser.add_argument('--tick-rate', type=int, default=ServerConfig.SIMULATION_RATE, help="Tick rate mô phỏng")
+    parser.add_argument('--only', help="Chỉ chạy các nhóm: logic,ai,models,protocol,server")
+    parser.add_argument('--output', help="Ghi kết quả ra file JSON")
+    parser.add_argument('--baseline', help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Chậm hơn baseline quá tỉ lệ này thì báo lỗi (mặc định 20%%)")
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+    ServerConfig.SIMULATION_RATE = args.tick_rate
+    room_counts = [int(n) for n in args.rooms.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+
+    random.seed(0)
+    results = run_benchmarks(room_counts, args.ticks, args.repeat, only)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': batch_available(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'unit': 'us_per_op',
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}:")
+            for name in regressions:
+                print(f"   - {name}")
+            return 1
+        print("\n✅ No regressions")
+    else:
+        for name, value in results.items():
+            print(f"{name:<44}{value:>12.3f} µs")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,7 @@
 """
 Client chính - Main game loop
 """
-import time
 from client.network_handler import NetworkHandler
-from client.renderer import Renderer
-from client.input_handler import InputHandler
 from client.ui import UI
 from client.sound_manager import SoundManager 
 from shared.constants import *
@@ -13,9 +10,10 @@ from shared.constants import *
 class GameClient:
     def __init__(self):
         self.network = None # Sẽ khởi tạo mỗi khi bắt đầu game mới
-        self.renderer = Renderer()
-        self.input_handler = InputHandler()
         self.ui = UI()
+        # Dùng chung renderer / input với UI: một màn hình, một nơi đọc event
+        self.renderer = self.ui.renderer
+        self.input_handler = self.ui.input_handler
         self.sound_manager = SoundManager()
         
         self.running = True
@@ -32,6 +30,7 @@ class GameClient:
         self.network.set_callback(MSG_GAME_OVER, self._on_game_over)
         self.network.set_callback(MSG_DISCONNECT, self._on_disconnect)
         self.network.set_callback(MSG_RESTART, self._on_restart)
+        self.network.set_callback(MSG_SPECTATING, self._on_spectating)
     
     def _on_player_id(self, player_id):
         self.player_id = player_id
@@ -73,10 +72,20 @@ class GameClient:
         self.sound_manager.play('game_over')
     
     def _on_disconnect(self):
-        self.ui.show_disconnected()
+        # Thread mạng: chỉ đổi màn hình, main loop vẽ (event pygame phải xử lý ở main thread)
+        self.ui.set_screen("disconnected")
         if self.network:
             self.network.connected = False 
     
+    def _on_spectating(self, room_id):
+        if room_id is None:
+            # Không có trận nào để xem
+            self.ui.set_screen("disconnected")
+            return
+        print(f"👀 Watching room {room_id}")
+        self.game_started = True
+        self.ui.set_screen("playing")
+    
     def _on_restart(self):
         print("🎮 Game restarted!")
         self.game_started = True
@@ -94,9 +103,10 @@ class GameClient:
                 if choice == "exit":
                     break
                 
-                # Xử lý chọn chế độ (AI / Multiplayer)
+                # Xử lý chọn chế độ (AI / Multiplayer / Spectate)
                 ai_mode = False
                 ai_difficulty = "medium"
+                spectate = choice == "spectate"
                 
                 if choice == "ai_mode":
                     difficulty = self.ui.show_ai_difficulty_menu()
@@ -107,41 +117,40 @@ class GameClient:
                 
                 # 2. Kết nối Server (Tạo network mới mỗi lần chơi)
                 self.ui.show_connecting()
+                self.player_id = None  # Spectator không có player ID
                 self.network = NetworkHandler()
                 self._setup_callbacks()
                 
-                if not self.network.connect(ai_mode=ai_mode, ai_difficulty=ai_difficulty):
+                if not self.network.connect(ai_mode=ai_mode, ai_difficulty=ai_difficulty, spectate=spectate):
                     self.ui.show_disconnected()
                     continue # Quay lại vòng lặp ngoài
                 
                 # 3. [VÒNG LẶP TRONG]: Gameplay Loop
                 while self.running and self.network.is_connected():
-                    self.input_handler.process_events()
-                    
-                    if self.input_handler.should_quit():
-                        self.running = False
-                        break
-                    
                     # --- XỬ LÝ CÁC MÀN HÌNH ---
                     current_screen = self.ui.current_screen
+                    idle_timeout = UI_IDLE_TIMEOUT  # Không có gì chạy theo frame: ngủ chờ event
 
                     # A. Đang chơi
                     if current_screen == "playing" and self.game_started:
-                        move_up, move_down = self.input_handler.get_movement()
-                        self.network.send_input(move_up, move_down)
+                        if not spectate:
+                            move_up, move_down = self.input_handler.get_movement()
+                            self.network.send_input(move_up, move_down)
                         
-                        game_state = self.network.get_game_state()
+                        # Vẽ state nội suy (mượt ở mọi tần số gửi snapshot của server)
+                        game_state = self.network.get_render_state()
+                        if self.input_handler.needs_redraw():
+                            self.renderer.clear()  # Cửa sổ bị che: frame sau vẽ lại cả màn hình
                         if game_state:
                             self.renderer.draw_game(game_state, self.player_id)
-                            self.renderer.update()
+                            self.renderer.update()  # Giữ nhịp FPS
+                            idle_timeout = None
+                        else:
+                            idle_timeout = 1000 // FPS
                             
-                    # B. Màn hình chờ
+                    # B. Màn hình chờ (chỉ vẽ lại khi dấu chấm đổi)
                     elif current_screen in ["waiting", "waiting_restart"]:
-                        if current_screen == "waiting":
-                            self.renderer.draw_waiting()
-                        else:
-                            self.renderer.draw_waiting_restart()
-                        self.renderer.update()
+                        idle_timeout = self.ui.draw_waiting(current_screen)
                         
                     # C. Game Over (Hiện Menu chọn)
                     elif current_screen == "game_over":
@@ -157,12 +166,24 @@ class GameClient:
                             
                         elif result == "exit":
                             self.running = False
+                        continue
                             
                     # D. Đã ngắt kết nối
                     elif current_screen == "disconnected":
                         break # Thoát vòng lặp trong
 
-                    time.sleep(0.001) # Giảm tải CPU
+                    if idle_timeout is None:
+                        self.input_handler.process_events()
+                    else:
+                        self.input_handler.wait_events(idle_timeout)
+                    
+                    if self.input_handler.should_quit():
+                        self.running = False
+                        break
+                
+                # Server báo ngắt kết nối: hiện màn hình đến khi người dùng bấm ESC
+                if self.running and self.ui.current_screen == "disconnected":
+                    self.ui.show_disconnected()
                 
                 # Dọn dẹp kết nối cũ khi thoát ra Menu chính
                 if self.network:
@@ -13,25 +13,62 @@ class InputHandler:
         self.enter_pressed = False
         self.escape_pressed = False
         self.space_pressed = False  # Thêm space cho play again
+        self.menu_move = 0  # Số dòng menu phải chuyển (-: lên, +: xuống), mỗi KEYDOWN một dòng
+        self.exposed = False  # Cửa sổ cần vẽ lại cả màn hình
     
     def process_events(self):
         """Xử lý tất cả pygame events"""
+        self._reset_pressed()
+        
+        for event in pygame.event.get():
+            self._handle_event(event)
+    
+    def wait_events(self, timeout=UI_IDLE_TIMEOUT):
+        """
+        Ngủ đến khi có event (hoặc hết timeout ms), rồi xử lý mọi event đang chờ
+        Returns: True nếu có event
+        """
+        self._reset_pressed()
+        
+        # timeout 0 là chờ mãi mãi
+        event = pygame.event.wait(max(1, int(timeout)))
+        if event.type == pygame.NOEVENT:
+            return False
+        
+        self._handle_event(event)
+        for event in pygame.event.get():
+            self._handle_event(event)
+        return True
+    
+    def _reset_pressed(self):
+        """Các phím chỉ tính trong một lần xử lý event"""
         self.enter_pressed = False
         self.escape_pressed = False
         self.space_pressed = False  # Reset space
+        self.menu_move = 0
+    
+    def _handle_event(self, event):
+        """Xử lý một pygame event"""
+        if event.type == pygame.QUIT:
+            self.quit_game = True
         
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                self.quit_game = True
-            
-            elif event.type == pygame.KEYDOWN:
-                self._handle_keydown(event.key)
-            
-            elif event.type == pygame.KEYUP:
-                self._handle_keyup(event.key)
+        elif event.type == pygame.KEYDOWN:
+            self._handle_keydown(event.key)
+        
+        elif event.type == pygame.KEYUP:
+            self._handle_keyup(event.key)
+        
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.exposed = True
     
     def _handle_keydown(self, key):
         """Xử lý phím nhấn xuống"""
+        # Menu: mỗi KEYDOWN (kể cả do giữ phím, key repeat) chuyển một dòng
+        if key in (pygame.K_w, pygame.K_UP):
+            self.menu_move -= 1
+        elif key in (pygame.K_s, pygame.K_DOWN):
+            self.menu_move += 1
+        
         # Player 1 controls (W/S)
         if key == pygame.K_w:
             self.move_up = True
@@ -67,6 +104,16 @@ class InputHandler:
         """Kiểm tra có quit không"""
         return self.quit_game or self.escape_pressed
     
+    def get_menu_move(self):
+        """Số dòng menu phải chuyển từ lần xử lý event trước (-: lên, +: xuống)"""
+        return self.menu_move
+    
+    def needs_redraw(self):
+        """Cửa sổ bị che rồi hiện lại từ lần hỏi trước (phải vẽ lại cả màn hình)"""
+        exposed = self.exposed
+        self.exposed = False
+        return exposed
+    
     def is_enter_pressed(self):
         """Kiểm tra Enter có được nhấn không"""
         return self.enter_pressed
@@ -82,4 +129,5 @@ class InputHandler:
         self.quit_game = False
         self.enter_pressed = False
         self.escape_pressed = False
-        self.space_pressed = False
\ No newline at end of file
+        self.space_pressed = False
+        self.menu_move = 0
\ No newline at end of file
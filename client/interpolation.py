@@ -0,0 +1,128 @@
+# client/interpolation.py
+"""
+Bộ đệm snapshot để vẽ mượt, không phụ thuộc tần số gửi của server
+
+Mỗi snapshot được gắn thời điểm nhận. Client vẽ trễ INTERPOLATION_DELAY giây:
+nội suy tuyến tính giữa hai snapshot bao quanh thời điểm đó; nếu snapshot mới
+đến trễ thì ngoại suy bóng theo vận tốc (tối đa MAX_EXTRAPOLATION giây).
+"""
+import threading
+import time
+from collections import deque
+from shared.constants import *
+from shared.models import GameState
+
+BALL_MAX_Y = SCREEN_HEIGHT - BALL_SIZE
+
+
+def lerp(a, b, t):
+    """Nội suy tuyến tính từ a đến b"""
+    return a + (b - a) * t
+
+
+class SnapshotBuffer:
+    def __init__(self, delay=INTERPOLATION_DELAY, max_extrapolation=MAX_EXTRAPOLATION,
+                 size=SNAPSHOT_BUFFER_SIZE, clock=time.monotonic):
+        """
+        delay: vẽ trễ bao nhiêu giây so với hiện tại
+        max_extrapolation: ngoại suy tối đa bao nhiêu giây khi snapshot đến trễ
+        clock: hàm trả về thời gian monotonic (giây)
+        """
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.clock = clock
+        self.snapshots = deque(maxlen=size)  # (thời điểm nhận, GameState)
+        self.lock = threading.Lock()  # Thread mạng push, thread vẽ sample
+        self.render_state = GameState()  # Dùng lại mỗi frame (không cấp phát)
+
+    def push(self, state, timestamp=None):
+        """Thêm snapshot vừa nhận (thread mạng gọi)"""
+        if timestamp is None:
+            timestamp = self.clock()
+        with self.lock:
+            # Thời điểm phải tăng dần để tìm cặp snapshot
+            if self.snapshots and timestamp <= self.snapshots[-1][0]:
+                timestamp = self.snapshots[-1][0] + 1e-6
+            self.snapshots.append((timestamp, state))
+
+    def clear(self):
+        """Bỏ mọi snapshot (ví dụ khi vào ván mới)"""
+        with self.lock:
+            self.snapshots.clear()
+
+    def sample(self, now=None):
+        """
+        State để vẽ tại thời điểm now - delay
+        Returns: GameState (dùng lại giữa các lần gọi), None nếu chưa có snapshot
+        """
+        if now is None:
+            now = self.clock()
+        render_time = now - self.delay
+
+        with self.lock:
+            if not self.snapshots:
+                return None
+
+            newest_time, newest = self.snapshots[-1]
+            if render_time >= newest_time:
+                return self._extrapolate(newest, render_time - newest_time)
+
+            oldest_time, oldest = self.snapshots[0]
+            if render_time <= oldest_time:
+                return self._interpolate(oldest, oldest, 0.0)
+
+            # Buffer nhỏ: quét từ snapshot mới nhất về trước
+            for i in range(len(self.snapshots) - 1, 0, -1):
+                t0, s0 = self.snapshots[i - 1]
+                if t0 <= render_time:
+                    t1, s1 = self.snapshots[i]
+                    break
+
+        return self._interpolate(s0, s1, (render_time - t0) / (t1 - t0))
+
+    def _interpolate(self, s0, s1, alpha):
+        """Vị trí nội suy giữa s0 và s1, các giá trị rời rạc lấy theo s0"""
+        out = self._copy_discrete(s0)
+
+        # Ghi điểm / ván mới: bóng nhảy về giữa sân, không nội suy qua đó
+        if s0.score1 != s1.score1 or s0.score2 != s1.score2:
+            s1 = s0
+
+        out.ball.x = lerp(s0.ball.x, s1.ball.x, alpha)
+        out.ball.y = lerp(s0.ball.y, s1.ball.y, alpha)
+        out.paddle1.y = lerp(s0.paddle1.y, s1.paddle1.y, alpha)
+        out.paddle2.y = lerp(s0.paddle2.y, s1.paddle2.y, alpha)
+        return out
+
+    def _extrapolate(self, state, elapsed):
+        """Snapshot mới chưa đến: bóng bay tiếp theo vận tốc, paddle giữ nguyên"""
+        out = self._copy_discrete(state)
+        ball = state.ball
+
+        # Vận tốc tính theo pixel / frame ở FPS
+        scale = min(elapsed, self.max_extrapolation) * FPS
+        out.ball.x = ball.x + ball.vx * scale
+        y = ball.y + ball.vy * scale
+        # Nảy tường
+        if y < 0:
+            y = -y
+        elif y > BALL_MAX_Y:
+            y = 2 * BALL_MAX_Y - y
+        out.ball.y = max(0, min(BALL_MAX_Y, y))
+
+        out.paddle1.y = state.paddle1.y
+        out.paddle2.y = state.paddle2.y
+        return out
+
+    def _copy_discrete(self, state):
+        """Copy các giá trị không nội suy vào render_state"""
+        out = self.render_state
+        out.ball.vx = state.ball.vx
+        out.ball.vy = state.ball.vy
+        out.paddle1.x = state.paddle1.x
+        out.paddle2.x = state.paddle2.x
+        out.score1 = state.score1
+        out.score2 = state.score2
+        out.game_over = state.game_over
+        out.winner = state.winner
+        return out
@@ -4,22 +4,51 @@ Xử lý network communication
 """
 import socket
 import threading
+import time
+from collections import deque
 from shared.constants import *
-from shared.protocol import Message
+from shared.protocol import Message, FrameDecoder
 from shared.models import GameState
+from shared.codec import BinaryCodec, DeltaDecoder
+from client.interpolation import SnapshotBuffer
+from client.prediction import PaddlePredictor
 
 class NetworkHandler:
-    def __init__(self, host=HOST, port=PORT):
+    def __init__(self, host=HOST, port=PORT, codec=DEFAULT_CODEC, use_udp=True):
         self.host = host
         self.port = port
+        self.use_udp = use_udp
+        self.requested_codec = codec
+        self.codec = CODEC_JSON  # Dùng JSON cho đến khi server xác nhận codec
         self.socket = None
         self.connected = False
         self.player_id = None
         self.game_state = None
+        self.snapshots = SnapshotBuffer()  # Snapshot gắn thời điểm nhận, để vẽ nội suy
         self.waiting = False
         self.game_over = False
         self.winner = None
         self.receive_thread = None
+        self.decoder = FrameDecoder()
+        self.delta_decoder = DeltaDecoder()
+        self.keyframe_requested = False
+        self.send_lock = threading.Lock()  # Tránh 2 thread ghi xen kẽ frame
+        self.snapshot_lock = threading.Lock()  # Snapshot đến từ cả TCP và UDP
+        self.predictor = None  # Dự đoán paddle của mình (chỉ player, không phải spectator)
+        self.input_changes = deque(maxlen=INPUT_REDUNDANCY)  # (tick, move_up, move_down) gần nhất
+        self.input_seq = 0
+        self.last_input_time = 0
+        self.playing = False
+        self.spectating = False
+        self.room_id = None
+        
+        # Kênh UDP (snapshot/input), tự quay về TCP nếu không thông
+        self.udp_socket = None
+        self.udp_addr = None
+        self.udp_token = None
+        self.udp_active = False
+        self.udp_thread = None
+        self.last_udp_time = 0
         self.callbacks = {
             MSG_PLAYER_ID: None,
             MSG_WAIT: None,
@@ -27,22 +56,27 @@ class NetworkHandler:
             MSG_GAME_STATE: None,
             MSG_GAME_OVER: None,
             MSG_DISCONNECT: None,
-            MSG_RESTART: None
+            MSG_RESTART: None,
+            MSG_SPECTATING: None
         }
     
-    def connect(self, ai_mode=False, ai_difficulty="medium"):
-        """Kết nối đến server"""
+    def connect(self, ai_mode=False, ai_difficulty="medium", spectate=False, room_id=None):
+        """Kết nối đến server (spectate=True: chỉ xem phòng room_id hoặc phòng bất kỳ)"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
             self.connected = True
             
-            # Gửi connect message hoặc AI mode message
-            if ai_mode:
-                self.socket.send(Message.ai_mode(ai_difficulty))
+            # Gửi connect message, AI mode message hoặc spectate message
+            if spectate:
+                self.spectating = True
+                self._send(Message.spectate(room_id, self.requested_codec))
+                print("👀 Requesting a match to watch...")
+            elif ai_mode:
+                self._send(Message.ai_mode(ai_difficulty, self.requested_codec))
                 print(f"🤖 Requesting AI game ({ai_difficulty})...")
             else:
-                self.socket.send(Message.connect())
+                self._send(Message.connect(self.requested_codec))
             
             # Start receive thread
             self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
@@ -56,11 +90,16 @@ class NetworkHandler:
             self.connected = False
             return False
     
+    def _send(self, data):
+        """Gửi nguyên một frame (an toàn khi gọi từ nhiều thread)"""
+        with self.send_lock:
+            self.socket.sendall(data)
+    
     def disconnect(self):
         """Ngắt kết nối"""
         if self.connected and self.socket:
             try:
-                self.socket.send(Message.disconnect())
+                self._send(Message.disconnect())
             except:
                 pass
             
@@ -70,30 +109,51 @@ class NetworkHandler:
                 pass
             
             self.connected = False
+            self._stop_udp()
             print("👋 Disconnected from server")
     
     def send_ready(self):
         """Gửi ready signal"""
         if self.connected:
             try:
-                self.socket.send(Message.ready())
+                self._send(Message.ready())
             except Exception as e:
                 print(f"❌ Failed to send ready: {e}")
     
     def send_input(self, move_up, move_down):
-        """Gửi input đến server"""
-        if self.connected:
+        """
+        Mỗi tick đến hạn: di chuyển paddle dự đoán; chỉ gửi input khi input đổi
+        hoặc đến hạn keepalive (qua UDP nếu đã mở kênh)
+        """
+        if self.connected and self.predictor:
             try:
-                self.socket.send(Message.input_data(move_up, move_down))
+                now = time.monotonic()
+                for _ in range(self.predictor.due_ticks(now)):
+                    tick = self.predictor.step(move_up, move_down)
+                    changes = self.input_changes
+                    changed = not changes or changes[-1][1:] != (move_up, move_down)
+                    if changed:
+                        changes.append((tick, move_up, move_down))
+                    if changed or now - self.last_input_time >= INPUT_KEEPALIVE_INTERVAL:
+                        self._send_input_changes(tick)
+                        self.last_input_time = now
             except Exception as e:
                 print(f"❌ Failed to send input: {e}")
                 self.connected = False
     
+    def _send_input_changes(self, tick):
+        """Gửi các thay đổi input gần nhất (gửi lặp để chịu được mất gói)"""
+        self.input_seq += 1
+        changes = list(self.input_changes)
+        # Kênh UDP đóng giữa chừng hoặc gửi lỗi -> gửi qua TCP, không ngắt phiên chơi
+        if not (self.udp_active and self._send_datagram(BinaryCodec.encode_input(changes, tick, self.input_seq))):
+            self._send(Message.input_data(changes, tick, self.codec, self.input_seq))
+    
     def send_play_again(self):
         """Gửi yêu cầu chơi lại"""
         if self.connected:
             try:
-                self.socket.send(Message.play_again())
+                self._send(Message.play_again())
                 print("🔄 Requested to play again...")
             except Exception as e:
                 print(f"❌ Failed to send play again: {e}")
@@ -103,14 +163,16 @@ class NetworkHandler:
         """Loop nhận data từ server"""
         while self.connected:
             try:
-                data = self.socket.recv(BUFFER_SIZE)
-                if not data:
+                frames = self.decoder.recv_into(self.socket)
+                if frames is None:
                     print("⚠️ Server closed connection")
                     self.connected = False
                     break
                 
-                msg_type, msg_data = Message.parse(data)
-                self._handle_message(msg_type, msg_data)
+                # Một lần recv có thể chứa nhiều message
+                for payload in frames:
+                    msg_type, msg_data = Message.parse(payload)
+                    self._handle_message(msg_type, msg_data)
                 
             except Exception as e:
                 if self.connected:
@@ -118,10 +180,86 @@ class NetworkHandler:
                     self.connected = False
                 break
     
+    def _start_udp(self, udp_port, token):
+        """Mở socket UDP và bắt đầu gửi hello"""
+        try:
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.settimeout(UDP_HELLO_INTERVAL)
+            self.udp_addr = (self.host, udp_port)
+            self.udp_token = token
+            self.udp_thread = threading.Thread(target=self._udp_loop, daemon=True)
+            self.udp_thread.start()
+        except Exception as e:
+            print(f"⚠️ UDP unavailable, using TCP only: {e}")
+            self._stop_udp()
+    
+    def _stop_udp(self):
+        """Đóng kênh UDP, mọi thứ quay về TCP"""
+        self.udp_active = False
+        if self.udp_socket:
+            try:
+                self.udp_socket.close()
+            except:
+                pass
+            self.udp_socket = None
+    
+    def _send_datagram(self, payload):
+        """
+        Gửi một datagram qua kênh UDP
+        Returns: False nếu kênh đã đóng hoặc gửi lỗi (người gọi gửi lại qua TCP)
+        """
+        udp_socket = self.udp_socket  # Đọc một lần: thread UDP có thể đóng kênh bất cứ lúc nào
+        if udp_socket is None:
+            return False
+        try:
+            udp_socket.sendto(payload, self.udp_addr)
+        except OSError:
+            return False
+        return True
+    
+    def _udp_loop(self):
+        """Gửi hello cho đến khi server xác nhận, sau đó nhận snapshot qua UDP"""
+        started = time.monotonic()
+        
+        while self.connected and self.udp_socket:
+            try:
+                now = time.monotonic()
+                if not self.udp_active:
+                    if now - started > UDP_HANDSHAKE_TIMEOUT:
+                        print("⚠️ No UDP reply from server, using TCP only")
+                        self._stop_udp()
+                        break
+                    self.udp_socket.sendto(BinaryCodec.encode_udp_hello(self.udp_token), self.udp_addr)
+                
+                elif self.playing and now - self.last_udp_time > UDP_FALLBACK_TIMEOUT:
+                    # Đang chơi mà không nhận được gì qua UDP -> bảo server gửi qua TCP
+                    print("⚠️ UDP channel stalled, falling back to TCP")
+                    self._stop_udp()
+                    self._send(Message.udp_disable())
+                    break
+                
+                payload, _ = self.udp_socket.recvfrom(MAX_DATAGRAM_SIZE)
+                msg_type, msg_data = Message.parse(payload)
+                if msg_type == MSG_SNAPSHOT:
+                    self.last_udp_time = time.monotonic()
+                    self._handle_snapshot(msg_data)
+            
+            except socket.timeout:
+                continue
+            except Exception as e:
+                if self.connected and self.udp_socket:
+                    print(f"⚠️ UDP error, using TCP only: {e}")
+                    self._stop_udp()
+                break
+    
     def _handle_message(self, msg_type, msg_data):
         """Xử lý message từ server"""
         if msg_type == MSG_PLAYER_ID:
             self.player_id = msg_data.get('id')
+            self.codec = msg_data.get('codec', CODEC_JSON)
+            self.predictor = PaddlePredictor(self.player_id, msg_data.get('tick_rate', FPS))
+            if self.use_udp and 'udp_token' in msg_data:
+                self._start_udp(msg_data['udp_port'], msg_data['udp_token'])
             print(f"🎮 You are Player {self.player_id}")
             if self.callbacks[MSG_PLAYER_ID]:
                 self.callbacks[MSG_PLAYER_ID](self.player_id)
@@ -132,19 +270,48 @@ class NetworkHandler:
             if self.callbacks[MSG_WAIT]:
                 self.callbacks[MSG_WAIT]()
         
+        elif msg_type == MSG_SPECTATING:
+            self.room_id = msg_data.get('room_id')
+            self.codec = msg_data.get('codec', CODEC_JSON)
+            if self.room_id is None:
+                print("⚠️ No match to watch")
+            else:
+                print(f"👀 Watching room {self.room_id}")
+                self._set_playing(True)
+            if self.callbacks[MSG_SPECTATING]:
+                self.callbacks[MSG_SPECTATING](self.room_id)
+        
+        elif msg_type == MSG_UDP_READY:
+            if self.udp_socket and not self.udp_active:
+                self.last_udp_time = time.monotonic()
+                self.udp_active = True
+                print("📡 UDP channel ready")
+        
         elif msg_type == MSG_READY:
             self.waiting = False
+            self._set_playing(True)
             print("🎯 Game starting!")
             if self.callbacks[MSG_READY]:
                 self.callbacks[MSG_READY]()
         
+        elif msg_type == MSG_SNAPSHOT:
+            self._handle_snapshot(msg_data)
+        
         elif msg_type == MSG_GAME_STATE:
-            self.game_state = GameState.from_dict(msg_data)
+            # Codec nhị phân trả về GameState, JSON trả về dict
+            if isinstance(msg_data, GameState):
+                self.game_state = msg_data
+            else:
+                self.game_state = GameState.from_dict(msg_data)
+            if self.predictor:
+                self.predictor.reconcile(self.game_state)
+            self.snapshots.push(self.game_state)
             if self.callbacks[MSG_GAME_STATE]:
                 self.callbacks[MSG_GAME_STATE](self.game_state)
         
         elif msg_type == MSG_GAME_OVER:
             self.game_over = True
+            self._set_playing(False)
             self.winner = msg_data.get('winner')
             print(f"🏆 Game Over! Player {self.winner} wins!")
             if self.callbacks[MSG_GAME_OVER]:
@@ -160,9 +327,44 @@ class NetworkHandler:
             print("♻️  Game restarting...")
             self.game_over = False
             self.winner = None
+            if self.predictor:
+                self.predictor.clear()
+            self.snapshots.clear()  # Không nội suy từ snapshot của ván cũ
+            self.input_changes.clear()  # Ván mới: gửi lại input hiện tại ngay
+            self._set_playing(True)
             if self.callbacks[MSG_RESTART]:
                 self.callbacks[MSG_RESTART]()
     
+    def _set_playing(self, playing):
+        """Đánh dấu đang trong trận (chỉ khi đó mới chờ snapshot qua UDP)"""
+        self.playing = playing
+        self.last_udp_time = time.monotonic()
+    
+    def _handle_snapshot(self, payload):
+        """Dựng lại state từ keyframe/delta rồi ack cho server"""
+        with self.snapshot_lock:
+            # Snapshot mới nhất thắng: bỏ datagram đến trễ
+            if self.delta_decoder.is_stale(payload):
+                return
+            
+            seq, fields = self.delta_decoder.decode(payload)
+            if seq is None:
+                # Mất baseline -> xin keyframe (chỉ gửi 1 lần cho đến khi nhận được)
+                if not self.keyframe_requested:
+                    self.keyframe_requested = True
+                    self._send(Message.keyframe_request())
+                return
+            
+            self.keyframe_requested = False
+            if not self.spectating:  # Spectator nhận keyframe chung, không cần ack
+                self._send_ack(seq)
+            self._handle_message(MSG_GAME_STATE, BinaryCodec.apply_fields(fields))
+    
+    def _send_ack(self, seq):
+        """Ack snapshot qua kênh đang dùng để nhận snapshot"""
+        if not (self.udp_active and self._send_datagram(BinaryCodec.encode_ack(seq))):
+            self._send(Message.ack(seq))
+    
     def set_callback(self, msg_type, callback):
         """Set callback cho message type"""
         if msg_type in self.callbacks:
@@ -173,9 +375,19 @@ class NetworkHandler:
         return self.connected
     
     def get_game_state(self):
-        """Lấy game state hiện tại"""
+        """Lấy game state hiện tại (snapshot mới nhất)"""
         return self.game_state
     
+    def get_render_state(self):
+        """
+        State để vẽ: nội suy giữa các snapshot, trễ INTERPOLATION_DELAY;
+        paddle của mình lấy vị trí dự đoán (không trễ)
+        """
+        state = self.snapshots.sample()
+        if state and self.predictor and self.playing:
+            self.predictor.apply(state)
+        return state
+    
     def get_player_id(self):
         """Lấy player ID"""
         return self.player_id
\ No newline at end of file
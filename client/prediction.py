@@ -0,0 +1,86 @@
+# client/prediction.py
+"""
+Dự đoán paddle của mình phía client (không phải chờ một vòng RTT)
+
+Mỗi tick (cùng nhịp với server) client lấy input, di chuyển paddle ngay bằng
+cùng luật với GameLogic và giữ lại input của các tick chưa được ack (tick là
+seq của input; NetworkHandler chỉ gửi cho server khi input đổi).
+Khi có snapshot: lấy vị trí server làm gốc, bỏ các input server đã áp dụng
+(seq <= input_seq trong snapshot) rồi chạy lại các input còn lại.
+"""
+import threading
+import time
+from collections import deque
+from shared.constants import *
+from shared.physics import move_paddle, tick_scale
+
+START_Y = (SCREEN_HEIGHT - PADDLE_HEIGHT) // 2
+
+
+class PaddlePredictor:
+    def __init__(self, player_id, tick_rate=FPS, history=PREDICTION_HISTORY, clock=time.monotonic):
+        """
+        tick_rate: số tick/giây của server (server áp dụng một tick client mỗi tick)
+        history: số input chưa ack giữ lại tối đa
+        """
+        self.player_id = player_id
+        self.dt = 1.0 / tick_rate
+        self.scale = tick_scale(tick_rate)
+        self.clock = clock
+        self.pending = deque(maxlen=history)  # (seq, move_up, move_down) chưa được ack
+        self.seq = 0
+        self.y = START_Y
+        self.next_tick_time = None
+        self.lock = threading.Lock()  # Thread chính step, thread mạng reconcile
+
+    def due_ticks(self, now=None):
+        """Số tick đến hạn từ lần gọi trước (tối đa MAX_PREDICTION_CATCH_UP)"""
+        if now is None:
+            now = self.clock()
+        if self.next_tick_time is None:
+            self.next_tick_time = now
+        if now < self.next_tick_time:
+            return 0
+
+        ticks = int((now - self.next_tick_time) / self.dt) + 1
+        if ticks > MAX_PREDICTION_CATCH_UP:
+            # Bị treo lâu (kéo cửa sổ, ...): bỏ qua phần trễ thay vì chạy bù
+            self.next_tick_time = now
+            ticks = MAX_PREDICTION_CATCH_UP
+        self.next_tick_time += ticks * self.dt
+        return ticks
+
+    def step(self, move_up, move_down):
+        """
+        Một tick: di chuyển paddle dự đoán và lưu input
+        Returns: tick vừa chạy (seq của input)
+        """
+        with self.lock:
+            self.seq += 1
+            self.y = move_paddle(self.y, move_up, move_down, PADDLE_SPEED, self.scale)
+            self.pending.append((self.seq, move_up, move_down))
+            return self.seq
+
+    def clear(self):
+        """Bỏ các input chưa ack (ván mới: server không áp dụng input của ván cũ)"""
+        with self.lock:
+            self.pending.clear()
+
+    def reconcile(self, state):
+        """Snapshot của server đến: vị trí server + các input server chưa áp dụng"""
+        paddle = state.paddle1 if self.player_id == 1 else state.paddle2
+        with self.lock:
+            pending = self.pending
+            while pending and pending[0][0] <= paddle.input_seq:
+                pending.popleft()
+
+            y = paddle.y
+            for _, move_up, move_down in pending:
+                y = move_paddle(y, move_up, move_down, PADDLE_SPEED, self.scale)
+            self.y = y
+
+    def apply(self, state):
+        """Ghi vị trí dự đoán vào state để vẽ (state được vẽ trễ, paddle của mình thì không)"""
+        paddle = state.paddle1 if self.player_id == 1 else state.paddle2
+        paddle.y = self.y
+        return state
@@ -1,16 +1,23 @@
 # client/renderer.py
 """
 Vẽ graphics với Pygame
+
+Màn hình chơi vẽ theo lớp: nền + lưới vẽ sẵn một lần, lớp HUD (điểm, indicator)
+chỉ vẽ lại khi đổi. Mỗi frame chỉ xóa/vẽ lại paddle và bóng, rồi cập nhật đúng
+các vùng đó lên màn hình (display.update(rects)) thay vì flip cả màn hình.
+Text được render một lần và cache theo nội dung.
 """
 import pygame
 import random # <--- THÊM DÒNG NÀY
 from shared.constants import *
 
 class Renderer:
-    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, fps=FPS):
+        """fps: giới hạn số frame/giây của update() (0: không giới hạn, dùng khi benchmark)"""
         pygame.init()
         self.width = width
         self.height = height
+        self.fps = fps
         self.screen = pygame.display.set_mode((width, height))
         pygame.display.set_caption("Classic Pong - Multiplayer")
         
@@ -20,6 +27,17 @@ class Renderer:
         
         # Clock for FPS
         self.clock = pygame.time.Clock()
+        
+        # Cache
+        self.text_cache = {}  # {(font, text, color): Surface}
+        self.background = self._build_background()  # Nền + lưới
+        self.hud = None  # background + điểm + indicator (vẽ lại khi đổi)
+        self.hud_key = None
+        
+        # Dirty rects: None = cập nhật cả màn hình ở update() kế tiếp
+        self.dirty_rects = None
+        self.sprite_rects = []  # Vùng paddle/bóng đã vẽ ở frame trước (cần xóa)
+        self.game_on_screen = False  # Màn hình đang là màn chơi (chỉ cần vẽ lại phần đổi)
 
         # --- BỔ SUNG ĐỂ THEO DÕI BÓNG ---
         self.ball_color = WHITE
@@ -27,53 +45,101 @@ class Renderer:
         self.last_dx_sign = 0
     
     def clear(self):
-        """Xóa màn hình"""
+        """Xóa màn hình (các màn hình tĩnh: vẽ lại và cập nhật cả màn hình)"""
         self.screen.fill(BLACK)
+        self.game_on_screen = False
+        self.dirty_rects = None
+    
+    def _text(self, font, text, color):
+        """Surface của text (render một lần, cache theo font/nội dung/màu)"""
+        key = (font, text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE:
+                self.text_cache.clear()
+            surface = self.text_cache[key] = font.render(text, True, color)
+        return surface
+    
+    def _blit_text(self, font, text, color, surface=None, **position):
+        """Vẽ text đã cache lên surface (mặc định màn hình), position như của Rect (center=...)"""
+        text_surface = self._text(font, text, color)
+        rect = text_surface.get_rect(**position)
+        (surface or self.screen).blit(text_surface, rect)
+        return rect
+    
+    def _build_background(self):
+        """Nền đen + lưới giữa màn hình (vẽ một lần)"""
+        background = pygame.Surface((self.width, self.height)).convert()
+        background.fill(BLACK)
+        self._draw_net(background)
+        return background
+    
+    def _build_hud(self, score1, score2, player_id):
+        """Nền + điểm + indicator (chỉ vẽ lại khi các giá trị này đổi)"""
+        hud = self.background.copy()
+        self._draw_scores(hud, score1, score2)
+        
+        # Draw player indicator
+        if player_id:
+            self._draw_player_indicator(hud, player_id)
+        
+        # Draw AI indicator nếu là AI mode
+        if player_id == 1:  # Player 1 vs AI
+            self._draw_ai_indicator(hud)
+        return hud
     
     def draw_game(self, game_state, player_id=None):
-        """Vẽ game state"""
+        """
+        Vẽ game state: lần đầu (hoặc khi HUD đổi) vẽ cả màn hình,
+        các frame sau chỉ xóa và vẽ lại paddle/bóng
+        """
         if not game_state:
             return
         
-        self.clear()
+        hud_key = (game_state.score1, game_state.score2, player_id)
+        if hud_key != self.hud_key:
+            self.hud = self._build_hud(*hud_key)
+            self.hud_key = hud_key
+            self.game_on_screen = False
         
-        # Draw net
-        self._draw_net()
+        if self.game_on_screen:
+            # Xóa paddle/bóng của frame trước bằng phần tương ứng của HUD
+            dirty = self.sprite_rects
+            for rect in dirty:
+                self.screen.blit(self.hud, rect, rect)
+        else:
+            self.screen.blit(self.hud, (0, 0))
+            dirty = None
         
         # Draw paddles
-        self._draw_paddle(game_state.paddle1, player_id == 1)
-        self._draw_paddle(game_state.paddle2, player_id == 2 or player_id == 1) 
+        sprites = [
+            self._draw_paddle(game_state.paddle1, player_id == 1),
+            self._draw_paddle(game_state.paddle2, player_id == 2 or player_id == 1),
+        ]
         
         # Draw ball
-        self._draw_ball(game_state.ball)
+        sprites.append(self._draw_ball(game_state.ball))
         
-        # Draw scores
-        self._draw_scores(game_state.score1, game_state.score2)
-        
-        # Draw player indicator
-        if player_id:
-            self._draw_player_indicator(player_id)
-        
-        # Draw AI indicator nếu là AI mode
-        if player_id == 1:  # Player 1 vs AI
-            self._draw_ai_indicator()
+        self.sprite_rects = sprites
+        self.dirty_rects = dirty + sprites if dirty is not None else None
+        self.game_on_screen = True
     
-    def _draw_net(self):
+    def _draw_net(self, surface):
         """Vẽ lưới giữa màn hình"""
         net_height = 15
         net_gap = 10
         x = self.width // 2 - NET_WIDTH // 2
         
         for y in range(0, self.height, net_height + net_gap):
-            pygame.draw.rect(self.screen, GRAY, (x, y, NET_WIDTH, net_height))
+            pygame.draw.rect(surface, GRAY, (x, y, NET_WIDTH, net_height))
     
     def _draw_paddle(self, paddle, is_current_player=False):
-        """Vẽ paddle"""
+        """Vẽ paddle. Returns: vùng đã vẽ"""
         color = WHITE
         if is_current_player:
             color = (100, 200, 255)  # Màu xanh dương cho paddle của mình
         
-        pygame.draw.rect(
+        return pygame.draw.rect(
             self.screen,
             color,
             (paddle.x, paddle.y, paddle.width, paddle.height)
@@ -88,7 +154,7 @@ class Renderer:
         return (r, g, b)
 
     def _draw_ball(self, ball):
-        """Vẽ bóng to hơn, hình tròn và đổi màu khi chạm thanh"""
+        """Vẽ bóng to hơn, hình tròn và đổi màu khi chạm thanh. Returns: vùng đã vẽ"""
 
         # --- 1. Logic đổi màu (Giữ nguyên như trước) ---
         current_dx = ball.x - self.last_ball_x
@@ -111,58 +177,43 @@ class Renderer:
         visual_radius = int(ball.size * 0.8) # <--- CHỈNH SỐ NÀY ĐỂ BÓNG TO/NHỎ
         # Hoặc gán cứng: visual_radius = 15 
 
-        pygame.draw.circle(
+        return pygame.draw.circle(
             self.screen,
             self.ball_color,
             (real_center_x, real_center_y),
             visual_radius
         )
     
-    def _draw_scores(self, score1, score2):
+    def _draw_scores(self, surface, score1, score2):
         """Vẽ điểm số"""
         # Score Player 1 (left)
-        score1_text = self.font_large.render(str(score1), True, WHITE)
-        score1_rect = score1_text.get_rect()
-        score1_rect.center = (self.width // 4, 50)
-        self.screen.blit(score1_text, score1_rect)
+        self._blit_text(self.font_large, str(score1), WHITE, surface, center=(self.width // 4, 50))
         
         # Score Player 2 (right)
-        score2_text = self.font_large.render(str(score2), True, WHITE)
-        score2_rect = score2_text.get_rect()
-        score2_rect.center = (3 * self.width // 4, 50)
-        self.screen.blit(score2_text, score2_rect)
+        self._blit_text(self.font_large, str(score2), WHITE, surface, center=(3 * self.width // 4, 50))
     
-    def _draw_player_indicator(self, player_id):
+    def _draw_player_indicator(self, surface, player_id):
         """Vẽ indicator cho player"""
         text = f"You: Player {player_id}"
-        indicator = self.font_small.render(text, True, (100, 200, 255))
-        rect = indicator.get_rect()
-        rect.bottomright = (self.width - 10, self.height - 10)
-        self.screen.blit(indicator, rect)
+        self._blit_text(self.font_small, text, (100, 200, 255), surface,
+                        bottomright=(self.width - 10, self.height - 10))
     
-    def _draw_ai_indicator(self):
+    def _draw_ai_indicator(self, surface):
         """Vẽ indicator cho AI"""
         text = "🤖 AI Opponent"
-        indicator = self.font_small.render(text, True, (255, 100, 100))
-        rect = indicator.get_rect()
-        rect.bottomleft = (10, self.height - 10)
-        self.screen.blit(indicator, rect)
+        self._blit_text(self.font_small, text, (255, 100, 100), surface,
+                        bottomleft=(10, self.height - 10))
     
     def draw_menu(self, title, options, selected=0):
         """Vẽ menu"""
         self.clear()
         
         # Title
-        title_text = self.font_large.render(title, True, WHITE)
-        title_rect = title_text.get_rect()
-        title_rect.center = (self.width // 2, self.height // 4)
-        self.screen.blit(title_text, title_rect)
+        self._blit_text(self.font_large, title, WHITE, center=(self.width // 2, self.height // 4))
         
         # Instructions
-        hint_text = self.font_small.render("Use W/S or Arrow keys to navigate, Enter to select", True, GRAY)
-        hint_rect = hint_text.get_rect()
-        hint_rect.center = (self.width // 2, self.height // 4 + 60)
-        self.screen.blit(hint_text, hint_rect)
+        self._blit_text(self.font_small, "Use W/S or Arrow keys to navigate, Enter to select", GRAY,
+                        center=(self.width // 2, self.height // 4 + 60))
         
         # Options
         y_start = self.height // 2
@@ -171,73 +222,49 @@ class Renderer:
             
             # Draw selector arrow
             if i == selected:
-                arrow = self.font_small.render(">", True, (100, 200, 255))
-                arrow_rect = arrow.get_rect()
-                arrow_rect.center = (self.width // 2 - 150, y_start + i * 50)
-                self.screen.blit(arrow, arrow_rect)
+                self._blit_text(self.font_small, ">", (100, 200, 255),
+                                center=(self.width // 2 - 150, y_start + i * 50))
             
-            option_text = self.font_small.render(option, True, color)
-            option_rect = option_text.get_rect()
-            option_rect.center = (self.width // 2, y_start + i * 50)
-            self.screen.blit(option_text, option_rect)
+            self._blit_text(self.font_small, option, color, center=(self.width // 2, y_start + i * 50))
     
     def draw_waiting(self):
         """Vẽ màn hình chờ"""
-        self.clear()
-        
-        text = "Waiting for another player..."
-        waiting_text = self.font_small.render(text, True, WHITE)
-        rect = waiting_text.get_rect()
-        rect.center = (self.width // 2, self.height // 2)
-        self.screen.blit(waiting_text, rect)
-        
-        # Animation dots
-        dots = "." * (pygame.time.get_ticks() // 500 % 4)
-        dots_text = self.font_small.render(dots, True, WHITE)
-        dots_rect = dots_text.get_rect()
-        dots_rect.center = (self.width // 2, self.height // 2 + 40)
-        self.screen.blit(dots_text, dots_rect)
+        self._draw_waiting_text("Waiting for another player...")
     
     def draw_waiting_restart(self):
         """Vẽ màn hình chờ player khác chơi lại"""
+        self._draw_waiting_text("Waiting for other player...")
+    
+    def _draw_waiting_text(self, text):
+        """Text chờ + dấu chấm động"""
         self.clear()
         
-        text = "Waiting for other player..."
-        waiting_text = self.font_small.render(text, True, WHITE)
-        rect = waiting_text.get_rect()
-        rect.center = (self.width // 2, self.height // 2)
-        self.screen.blit(waiting_text, rect)
+        self._blit_text(self.font_small, text, WHITE, center=(self.width // 2, self.height // 2))
         
         # Animation dots
-        dots = "." * (pygame.time.get_ticks() // 500 % 4)
-        dots_text = self.font_small.render(dots, True, WHITE)
-        dots_rect = dots_text.get_rect()
-        dots_rect.center = (self.width // 2, self.height // 2 + 40)
-        self.screen.blit(dots_text, dots_rect)
+        dots = "." * (pygame.time.get_ticks() // WAITING_DOTS_INTERVAL % 4)
+        self._blit_text(self.font_small, dots, WHITE, center=(self.width // 2, self.height // 2 + 40))
 
     def draw_game_over(self, winner, player_id, selected_option=0):
         """Vẽ màn hình game over với menu lựa chọn"""
         self.clear()
         
-        # 1. Vẽ kết quả (Thắng/Thua)
-        if winner == player_id:
+        # 1. Vẽ kết quả (Thắng/Thua, spectator chỉ thấy Game Over)
+        if player_id is None:
+            result_text = TEXT_GAME_OVER
+            color = WHITE
+        elif winner == player_id:
             result_text = TEXT_WIN
             color = (100, 255, 100)
         else:
             result_text = TEXT_LOSE
             color = (255, 100, 100)
         
-        result = self.font_large.render(result_text, True, color)
-        rect = result.get_rect()
-        rect.center = (self.width // 2, self.height // 2 - 100)
-        self.screen.blit(result, rect)
+        self._blit_text(self.font_large, result_text, color, center=(self.width // 2, self.height // 2 - 100))
         
         # Vẽ tên người thắng
-        winner_text = TEXT_WINNER_ANNO.format(winner)
-        winner_render = self.font_small.render(winner_text, True, WHITE)
-        winner_rect = winner_render.get_rect()
-        winner_rect.center = (self.width // 2, self.height // 2 - 50)
-        self.screen.blit(winner_render, winner_rect)
+        self._blit_text(self.font_small, TEXT_WINNER_ANNO.format(winner), WHITE,
+                        center=(self.width // 2, self.height // 2 - 50))
         
         # 2. Vẽ Menu Lựa Chọn (Chơi Lại / Về Menu)
         options = [TEXT_PLAY_AGAIN, TEXT_MAIN_MENU]
@@ -247,54 +274,41 @@ class Renderer:
             # Đổi màu nếu đang được chọn
             color = (100, 200, 255) if i == selected_option else GRAY
             
-            text = self.font_small.render(option, True, color)
-            rect = text.get_rect()
-            rect.center = (self.width // 2, start_y + i * 40)
-            
             # Vẽ mũi tên chỉ vào dòng đang chọn
             if i == selected_option:
-                arrow = self.font_small.render(">", True, (100, 200, 255))
-                arrow_rect = arrow.get_rect()
-                arrow_rect.center = (self.width // 2 - 120, start_y + i * 40)
-                self.screen.blit(arrow, arrow_rect)
+                self._blit_text(self.font_small, ">", (100, 200, 255),
+                                center=(self.width // 2 - 120, start_y + i * 40))
                 
-            self.screen.blit(text, rect)
+            self._blit_text(self.font_small, option, color, center=(self.width // 2, start_y + i * 40))
             
         # 3. Vẽ hướng dẫn
-        hint = self.font_small.render(TEXT_GAME_OVER_HINT, True, (80, 80, 80))
-        hint_rect = hint.get_rect()
-        hint_rect.center = (self.width // 2, self.height - 30)
-        self.screen.blit(hint, hint_rect)
+        self._blit_text(self.font_small, TEXT_GAME_OVER_HINT, (80, 80, 80),
+                        center=(self.width // 2, self.height - 30))
     
     def draw_connecting(self):
         """Vẽ màn hình đang kết nối"""
         self.clear()
         
-        text = "Connecting to server..."
-        conn_text = self.font_small.render(text, True, WHITE)
-        rect = conn_text.get_rect()
-        rect.center = (self.width // 2, self.height // 2)
-        self.screen.blit(conn_text, rect)
+        self._blit_text(self.font_small, "Connecting to server...", WHITE,
+                        center=(self.width // 2, self.height // 2))
     
     def draw_disconnected(self):
         """Vẽ màn hình disconnect"""
         self.clear()
         
-        text = "Disconnected from server"
-        disc_text = self.font_small.render(text, True, (255, 100, 100))
-        rect = disc_text.get_rect()
-        rect.center = (self.width // 2, self.height // 2)
-        self.screen.blit(disc_text, rect)
-        
-        instruction = self.font_small.render("Press ESC to exit", True, WHITE)
-        inst_rect = instruction.get_rect()
-        inst_rect.center = (self.width // 2, self.height // 2 + 40)
-        self.screen.blit(instruction, inst_rect)
+        self._blit_text(self.font_small, "Disconnected from server", (255, 100, 100),
+                        center=(self.width // 2, self.height // 2))
+        self._blit_text(self.font_small, "Press ESC to exit", WHITE,
+                        center=(self.width // 2, self.height // 2 + 40))
     
     def update(self):
-        """Update display"""
-        pygame.display.flip()
-        self.clock.tick(FPS)
+        """Update display: chỉ các vùng đã đổi nếu có, không thì cả màn hình"""
+        if self.dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty_rects)
+        self.dirty_rects = None
+        self.clock.tick(self.fps)
     
     def get_fps(self):
         """Lấy FPS hiện tại"""
@@ -1,105 +1,109 @@
 # client/ui.py
 """
 UI components: Menu, screens
+
+Menu và các màn hình chờ chạy theo event: ngủ trong pygame.event.wait đến khi
+có phím / màn hình đổi / tới frame animation kế tiếp, chỉ vẽ lại khi có gì đổi.
+Giữ phím lên/xuống thì menu tự chuyển dòng nhờ key repeat của pygame.
 """
 import pygame
 from client.renderer import Renderer
 from client.input_handler import InputHandler
+from shared.constants import *
+
+# Event đánh thức vòng lặp đang ngủ chờ event khi màn hình đổi (post được từ thread mạng)
+SCREEN_CHANGED = pygame.event.custom_type()
 
 class UI:
     def __init__(self):
         self.renderer = Renderer()
         self.input_handler = InputHandler()
         self.current_screen = "menu"  # menu, connecting, waiting, playing, game_over, disconnected
-    
-    def show_main_menu(self):
-        """Hiển thị main menu"""
-        options = ["Multiplayer (2 Players)", "Play vs AI", "Exit"]
-        selected = 0
+        self.drawn_frame = None  # (màn hình, frame animation) đang hiển thị
         
-        while True:
-            self.input_handler.process_events()
+        # Giữ phím lên/xuống thì menu tự chuyển dòng (thay cho debounce bằng wait)
+        pygame.key.set_repeat(MENU_KEY_REPEAT_DELAY, MENU_KEY_REPEAT_INTERVAL)
+    
+    def _run_menu(self, draw, count, selected=0, screen=None):
+        """
+        Vòng lặp menu theo event: ngủ đến khi có phím, chỉ vẽ lại khi lựa chọn đổi
+        draw: hàm vẽ menu với index đang chọn
+        screen: thoát khi current_screen không còn là màn hình này
+        Returns: index được chọn (Enter), None nếu thoát (ESC, đóng cửa sổ, đổi màn hình)
+        """
+        dirty = True
+        while screen is None or self.current_screen == screen:
+            if dirty:
+                draw(selected)
+                self.renderer.update()
+            
+            self.input_handler.wait_events()
             
             if self.input_handler.should_quit():
-                return "exit"
-            
-            # Get input state
-            move_up, move_down = self.input_handler.get_movement()
+                return None
             
             # Menu navigation
-            if move_up and selected > 0:
-                selected -= 1
-                pygame.time.wait(150)  # Debounce
-            elif move_down and selected < len(options) - 1:
-                selected += 1
-                pygame.time.wait(150)  # Debounce
+            moved = max(0, min(count - 1, selected + self.input_handler.get_menu_move()))
+            dirty = moved != selected or self.input_handler.needs_redraw()
+            selected = moved
             
             # Handle selection
             if self.input_handler.is_enter_pressed():
-                if selected == 0:
-                    return "multiplayer"
-                elif selected == 1:
-                    return "ai_mode"
-                else:
-                    return "exit"
-            
-            # Draw menu
-            self.renderer.draw_menu("CLASSIC PONG", options, selected)
-            self.renderer.update()
+                return selected
+        
+        return None
+    
+    def show_main_menu(self):
+        """Hiển thị main menu"""
+        options = ["Multiplayer (2 Players)", "Play vs AI", "Watch a Match", "Exit"]
+        actions = ["multiplayer", "ai_mode", "spectate", "exit"]
+        
+        selected = self._run_menu(
+            lambda i: self.renderer.draw_menu("CLASSIC PONG", options, i), len(options))
+        return "exit" if selected is None else actions[selected]
     
     def show_ai_difficulty_menu(self):
         """Hiển thị menu chọn độ khó AI"""
         options = ["Easy", "Medium", "Hard", "Back"]
-        selected = 1  # Default: Medium
+        difficulties = ["easy", "medium", "hard", None]  # None: Back
         
-        while True:
-            self.input_handler.process_events()
-            
-            if self.input_handler.should_quit():
-                return None
-            
-            # Get input state
-            move_up, move_down = self.input_handler.get_movement()
-            
-            # Menu navigation
-            if move_up and selected > 0:
-                selected -= 1
-                pygame.time.wait(150)
-            elif move_down and selected < len(options) - 1:
-                selected += 1
-                pygame.time.wait(150)
-            
-            # Handle selection
-            if self.input_handler.is_enter_pressed():
-                if selected == 0:
-                    return "easy"
-                elif selected == 1:
-                    return "medium"
-                elif selected == 2:
-                    return "hard"
-                else:
-                    return None  # Back
-            
-            # Draw menu
-            self.renderer.draw_menu("SELECT DIFFICULTY", options, selected)
-            self.renderer.update()
+        selected = self._run_menu(
+            lambda i: self.renderer.draw_menu("SELECT DIFFICULTY", options, i),
+            len(options), selected=1)  # Default: Medium
+        return None if selected is None else difficulties[selected]
     
     def show_connecting(self):
         """Hiển thị màn hình connecting"""
+        self.current_screen = "connecting"
         self.renderer.draw_connecting()
         self.renderer.update()
     
+    def draw_waiting(self, screen="waiting"):
+        """
+        Vẽ màn hình chờ nếu cần: vừa vào màn hình, tới frame dấu chấm kế tiếp
+        hoặc cửa sổ cần vẽ lại (còn lại không vẽ gì)
+        screen: "waiting" hoặc "waiting_restart"
+        Returns: số ms đến frame kế tiếp (thời gian được ngủ chờ event)
+        """
+        now = pygame.time.get_ticks()
+        frame = (screen, now // WAITING_DOTS_INTERVAL)
+        if frame != self.drawn_frame or self.input_handler.needs_redraw():
+            if screen == "waiting":
+                self.renderer.draw_waiting()
+            else:
+                self.renderer.draw_waiting_restart()
+            self.renderer.update()
+            self.drawn_frame = frame
+        return WAITING_DOTS_INTERVAL - now % WAITING_DOTS_INTERVAL
+    
     def show_waiting(self):
         """Hiển thị màn hình waiting"""
-        self.current_screen = "waiting"
+        self.set_screen("waiting")
         while self.current_screen == "waiting":
-            self.input_handler.process_events()
+            self.input_handler.wait_events(self.draw_waiting())
             
             if self.input_handler.should_quit():
                 return False
-            
-            self.renderer.draw_waiting()
-            self.renderer.update()
         
         return True
     
@@ -111,51 +115,39 @@ class UI:
     def show_game_over(self, winner, player_id):
         """Hiển thị game over dạng menu"""
         self.current_screen = "game_over"
-        selected = 0
         options = ["play_again", "menu"] # Các hành động trả về tương ứng
         
         self.input_handler.reset() # Xóa trạng thái phím cũ
         
-        while self.current_screen == "game_over":
-            self.input_handler.process_events()
-            
-            if self.input_handler.should_quit():
-                return "exit"
-            
-            # Xử lý di chuyển lên xuống
-            move_up, move_down = self.input_handler.get_movement()
-            if move_up and selected > 0:
-                selected -= 1
-                pygame.time.wait(150)
-            elif move_down and selected < len(options) - 1:
-                selected += 1
-                pygame.time.wait(150)
-            
-            # Xử lý chọn
-            if self.input_handler.is_enter_pressed():
-                return options[selected]
-            
-            # Vẽ Game Over kèm menu lựa chọn
-            self.renderer.draw_game_over(winner, player_id, selected)
-            self.renderer.update()
-        
-        return "exit"
+        # Vẽ Game Over kèm menu lựa chọn
+        selected = self._run_menu(
+            lambda i: self.renderer.draw_game_over(winner, player_id, i),
+            len(options), screen="game_over")
+        return "exit" if selected is None else options[selected]
     
     def show_disconnected(self):
-        """Hiển thị màn hình disconnected"""
+        """Hiển thị màn hình disconnected (màn hình tĩnh: chỉ vẽ lại khi cửa sổ cần)"""
         self.current_screen = "disconnected"
+        dirty = True
         while self.current_screen == "disconnected":
-            self.input_handler.process_events()
+            if dirty:
+                self.renderer.draw_disconnected()
+                self.renderer.update()
+            
+            self.input_handler.wait_events()
             
             if self.input_handler.should_quit():
                 return
-            
-            self.renderer.draw_disconnected()
-            self.renderer.update()
+            dirty = self.input_handler.needs_redraw()
     
     def set_screen(self, screen_name):
-        """Set current screen"""
+        """Set current screen (gọi được từ thread mạng: đánh thức vòng lặp đang chờ event)"""
         self.current_screen = screen_name
+        self.drawn_frame = None
+        try:
+            pygame.event.post(pygame.event.Event(SCREEN_CHANGED))
+        except pygame.error:
+            pass  # pygame đã quit
     
     def cleanup(self):
         """Cleanup UI"""
@@ -5,18 +5,64 @@ Script chạy server
 """
 import sys
 import os
+import argparse
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from server.game_server import GameServer
+from server.async_game_server import AsyncGameServer
+from server.sharded_server import ShardedGameServer
 from server.config import ServerConfig
 
+SERVER_MODES = {
+    'threaded': GameServer,
+    'async': AsyncGameServer,
+    'sharded': ShardedGameServer,
+}
+
+def parse_args():
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Classic Pong server")
+    parser.add_argument('--mode', choices=sorted(SERVER_MODES), default=ServerConfig.SERVER_MODE,
+                        help="threaded: 1 thread / client, async: 1 event loop cho mọi client, "
+                             "sharded: nhiều process chia nhau các phòng")
+    parser.add_argument('--workers', type=int, default=ServerConfig.SHARD_WORKERS,
+                        help="Số worker process cho sharded mode")
+    parser.add_argument('--tick-rate', type=int, default=ServerConfig.SIMULATION_RATE,
+                        help="Số tick mô phỏng mỗi giây")
+    parser.add_argument('--send-rate', type=int, default=ServerConfig.BROADCAST_RATE,
+                        help="Số snapshot gửi cho player mỗi giây")
+    parser.add_argument('--physics', choices=('scalar', 'batch'), default=ServerConfig.PHYSICS_ENGINE,
+                        help="batch: mô phỏng mọi phòng cùng lúc bằng NumPy")
+    parser.add_argument('--room-workers', type=int, default=ServerConfig.ROOM_WORKERS,
+                        help="Số thread tick các phòng song song (threaded mode, 0: tắt)")
+    parser.add_argument('--seed', type=int, default=ServerConfig.SIMULATION_SEED,
+                        help="Seed cho RNG của các phòng (tái lập được ván đấu)")
+    parser.add_argument('--record', metavar='DIR', default=ServerConfig.REPLAY_DIR,
+                        help="Ghi replay của mỗi phòng vào thư mục DIR")
+    parser.add_argument('--no-udp', action='store_true',
+                        help="Chỉ dùng TCP (không mở kênh UDP cho snapshot/input)")
+    return parser.parse_args()
+
 def main():
     """Main entry point"""
+    args = parse_args()
+    ServerConfig.SERVER_MODE = args.mode
+    ServerConfig.SIMULATION_RATE = args.tick_rate
+    ServerConfig.BROADCAST_RATE = min(args.send_rate, args.tick_rate)
+    ServerConfig.PHYSICS_ENGINE = args.physics
+    ServerConfig.ROOM_WORKERS = args.room_workers
+    ServerConfig.SIMULATION_SEED = args.seed
+    ServerConfig.REPLAY_DIR = args.record
+    if args.no_udp:
+        ServerConfig.ENABLE_UDP = False
     print(ServerConfig.get_server_info())
     
-    server = GameServer()
+    if args.mode == 'sharded':
+        server = ShardedGameServer(workers=args.workers)
+    else:
+        server = SERVER_MODES[args.mode]()
     
     try:
         server.start()
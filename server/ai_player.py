@@ -1,112 +1,154 @@
 # server/ai_player.py
 """
 AI Player logic
+
+Mọi thứ tính theo tick mô phỏng (không đọc đồng hồ) nên AI không phụ thuộc
+tải của server. Sai số ngẫu nhiên lấy từ RNG đếm (counter-based) theo seed
+của từng AI: lần quyết định thứ n luôn cho cùng kết quả, và BatchAI tính
+được cùng giá trị đó cho mọi phòng trong một phép vector.
 """
+import math
 import random
-import time
 from shared.constants import *
+from server.config import ServerConfig
+from server.game_logic import BALL_MAX_Y
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+AI_DEAD_ZONE = 15  # Không di chuyển nếu paddle đã gần target
+AI_MAX_ERROR = 50  # Sai số tối đa (pixel) khi AI "miss"
+
+# difficulty -> (accuracy, reaction delay tính bằng giây)
+AI_DIFFICULTIES = {
+    "easy": (AI_DIFFICULTY_EASY, 0.1),
+    "medium": (AI_DIFFICULTY_MEDIUM, 0.05),
+    "hard": (AI_DIFFICULTY_HARD, 0.02),
+}
+
+
+def ai_random(seed, counter):
+    """
+    Số ngẫu nhiên thứ counter trong [0, 1) của seed (splitmix64)
+    Không có state nên tính song song được cho nhiều AI
+    """
+    z = (seed + counter * GOLDEN_GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    z ^= z >> 31
+    return (z >> 11) * 2.0 ** -53
+
+
+def delay_to_ticks(reaction_delay, tick_rate):
+    """Số tick phải chờ giữa hai lần quyết định (ít nhất 1)"""
+    return max(1, math.ceil(reaction_delay * tick_rate - 1e-9))
+
+
+def reflect_y(y):
+    """
+    Gập tọa độ y (mép trên bóng) về [0, BALL_MAX_Y] như khi bóng nảy giữa hai tường
+    Quỹ đạo phản xạ tuần hoàn với chu kỳ 2 * BALL_MAX_Y nên chỉ cần một phép modulo
+    """
+    period = 2 * BALL_MAX_Y
+    y %= period
+    return period - y if y > BALL_MAX_Y else y
+
 
 class AIPlayer:
-    def __init__(self, difficulty="medium"):
+    def __init__(self, difficulty="medium", player_id=2, seed=None, tick_rate=None):
         """
         difficulty: "easy", "medium", "hard"
+        player_id: paddle AI điều khiển (2 khi chơi với người, 1 hoặc 2 khi AI vs AI)
+        seed: seed của RNG (None: ngẫu nhiên), cùng seed -> cùng chuỗi quyết định
+        tick_rate: số tick mỗi giây để đổi reaction delay ra tick
         """
-        self.difficulty = difficulty
-        self.last_move_time = 0
-        self.reaction_delay = AI_REACTION_DELAY
+        self.player_id = player_id
+        self.seed = (seed if seed is not None else random.getrandbits(64)) & MASK64
+        self.tick_rate = tick_rate or ServerConfig.SIMULATION_RATE
+        self.decisions = 0  # Số lần đã quyết định (counter của RNG)
         
-        # Set độ chính xác theo difficulty
-        if difficulty == "easy":
-            self.accuracy = AI_DIFFICULTY_EASY
-            self.reaction_delay = 0.1
-        elif difficulty == "hard":
-            self.accuracy = AI_DIFFICULTY_HARD
-            self.reaction_delay = 0.02
-        else:  # medium
-            self.accuracy = AI_DIFFICULTY_MEDIUM
-            self.reaction_delay = 0.05
+        # Cache dự đoán cho đoạn quỹ đạo hiện tại (vận tốc đổi khi nảy/chạm paddle/reset)
+        self.cached_velocity = None
+        self.cached_target = None
+        
+        self.set_difficulty(difficulty)
+        self.ticks_waited = self.reaction_ticks - 1  # Tick đầu tiên quyết định luôn
     
     def calculate_move(self, game_state):
         """
-        Tính toán move của AI dựa trên game state
+        Tính toán move của AI cho tick này (gọi đúng một lần mỗi tick)
         Returns: (move_up, move_down)
         """
-        current_time = time.time()
-        
-        # Thêm delay để AI không phản ứng tức thì
-        if current_time - self.last_move_time < self.reaction_delay:
+        # Chờ đủ reaction_ticks để AI không phản ứng tức thì
+        self.ticks_waited += 1
+        if self.ticks_waited < self.reaction_ticks:
             return False, False
+        self.ticks_waited = 0
         
-        ball = game_state.ball
-        paddle = game_state.paddle2  # AI là player 2
+        paddle = self._get_paddle(game_state)
         
         # Tính target position (nơi AI muốn di chuyển paddle đến)
         target_y = self._predict_ball_position(game_state)
         
         # Thêm random error dựa trên difficulty
-        if random.random() > self.accuracy:
+        counter = 2 * self.decisions
+        self.decisions += 1
+        if ai_random(self.seed, counter) > self.accuracy:
             # AI đôi khi miss
-            error = random.randint(-50, 50)
+            error = int(ai_random(self.seed, counter + 1) * (2 * AI_MAX_ERROR + 1)) - AI_MAX_ERROR
             target_y += error
         
         # Tính toán paddle center
         paddle_center = paddle.y + PADDLE_HEIGHT / 2
         
-        # Dead zone - không cần di chuyển nếu đã gần target
-        dead_zone = 15
-        
         move_up = False
         move_down = False
         
-        if target_y < paddle_center - dead_zone:
+        if target_y < paddle_center - AI_DEAD_ZONE:
             move_up = True
-        elif target_y > paddle_center + dead_zone:
+        elif target_y > paddle_center + AI_DEAD_ZONE:
             move_down = True
         
-        self.last_move_time = current_time
         return move_up, move_down
     
+    def _get_paddle(self, game_state):
+        """Paddle do AI điều khiển"""
+        return game_state.paddle1 if self.player_id == 1 else game_state.paddle2
+    
     def _predict_ball_position(self, game_state):
         """
-        Dự đoán vị trí bóng sẽ đến paddle của AI
+        Dự đoán tâm bóng (theo trục y) khi bóng đến paddle của AI
+        Chỉ tính lại khi vận tốc bóng đổi, còn lại dùng kết quả đã cache
         """
         ball = game_state.ball
-        paddle = game_state.paddle2
         
         # Nếu bóng đang bay ra xa AI, target vào giữa màn hình
-        if ball.vx < 0:  # Bay sang trái (ra xa AI)
+        moving_away = ball.vx > 0 if self.player_id == 1 else ball.vx < 0
+        if moving_away:
             return SCREEN_HEIGHT / 2
         
-        # Predict đơn giản: giả sử bóng bay thẳng
-        # Tính thời gian để bóng đến paddle
-        distance_to_paddle = paddle.x - ball.x
-        
         if ball.vx == 0:
-            return ball.y
+            return ball.y + BALL_SIZE / 2
         
-        time_to_reach = distance_to_paddle / ball.vx
-        
-        # Predict y position
-        predicted_y = ball.y + (ball.vy * time_to_reach)
-        
-        # Xử lý bounce với top/bottom
-        while predicted_y < 0 or predicted_y > SCREEN_HEIGHT:
-            if predicted_y < 0:
-                predicted_y = -predicted_y
-            elif predicted_y > SCREEN_HEIGHT:
-                predicted_y = 2 * SCREEN_HEIGHT - predicted_y
+        velocity = (ball.vx, ball.vy)
+        if velocity != self.cached_velocity:
+            self.cached_velocity = velocity
+            self.cached_target = self._intercept_y(ball, self._get_paddle(game_state))
+        return self.cached_target
+    
+    def _intercept_y(self, ball, paddle):
+        """Tâm bóng khi chạm mặt trong của paddle (O(1) với mọi tốc độ bóng)"""
+        # Vị trí x của mép trái bóng lúc chạm paddle
+        if self.player_id == 1:
+            contact_x = paddle.x + PADDLE_WIDTH
+        else:
+            contact_x = paddle.x - BALL_SIZE
         
-        return predicted_y
+        time_to_reach = (contact_x - ball.x) / ball.vx
+        predicted_y = reflect_y(ball.y + ball.vy * time_to_reach)
+        return predicted_y + BALL_SIZE / 2
     
     def set_difficulty(self, difficulty):
         """Thay đổi độ khó"""
         self.difficulty = difficulty
-        if difficulty == "easy":
-            self.accuracy = AI_DIFFICULTY_EASY
-            self.reaction_delay = 0.1
-        elif difficulty == "hard":
-            self.accuracy = AI_DIFFICULTY_HARD
-            self.reaction_delay = 0.02
-        else:
-            self.accuracy = AI_DIFFICULTY_MEDIUM
-            self.reaction_delay = 0.05
\ No newline at end of file
+        self.accuracy, self.reaction_delay = AI_DIFFICULTIES.get(difficulty, AI_DIFFICULTIES["medium"])
+        self.reaction_ticks = delay_to_ticks(self.reaction_delay, self.tick_rate)
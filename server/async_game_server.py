@@ -0,0 +1,130 @@
+# server/async_game_server.py
+"""
+Server một thread dùng asyncio: accept, đọc từ client, game loop và broadcast
+đều chạy trên cùng một event loop (không tạo thread cho mỗi client)
+"""
+import asyncio
+from shared.constants import *
+from server.game_server import GameServer
+from server.connection import AsyncConnection
+from server.config import ServerConfig
+
+class DatagramHandler(asyncio.DatagramProtocol):
+    """Chuyển datagram UDP nhận được cho server"""
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        try:
+            self.server.handle_datagram(data, addr)
+        except Exception as e:
+            print(f"❌ Error handling UDP datagram from {addr}: {e}")
+
+
+class AsyncGameServer(GameServer):
+    def __init__(self, host='0.0.0.0', port=PORT):
+        super().__init__(host, port)
+        self.loop = None
+        self.tcp_server = None
+        self.udp_transport = None
+
+    def start(self):
+        """Khởi động server (block cho đến khi server dừng)"""
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            print(f"❌ Error starting server: {e}")
+        finally:
+            self.stop()
+
+    async def serve(self):
+        """Coroutine chính: mở listener và chạy game loop"""
+        self.loop = asyncio.get_running_loop()
+        await self.open_listeners()
+        self.running = True
+
+        print(f"🎮 Async server started on {self.host}:{self.port}")
+        print("Waiting for players...")
+
+        await self.game_loop()
+
+    async def open_listeners(self):
+        """Mở TCP listener và kênh UDP"""
+        self.tcp_server = await asyncio.start_server(
+            self.handle_stream,
+            self.host,
+            self.port,
+            backlog=ServerConfig.LISTEN_BACKLOG,
+            reuse_address=True
+        )
+        await self.open_udp()
+
+    async def open_udp(self):
+        """Mở kênh UDP cho snapshot/input (nếu được bật)"""
+        if ServerConfig.ENABLE_UDP:
+            self.udp_transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: DatagramHandler(self),
+                local_addr=(self.host, self.udp_port)
+            )
+
+    def udp_send(self, payload, addr):
+        """Gửi một datagram (không block)"""
+        self.udp_transport.sendto(payload, addr)
+
+    def udp_enabled(self):
+        """Server có đang mở kênh UDP không"""
+        return self.udp_transport is not None
+
+    async def handle_stream(self, reader, writer, initial_data=b''):
+        """
+        Xử lý messages từ một client (mỗi client là một coroutine)
+        initial_data: bytes đã được đọc trước (khi nhận socket từ front acceptor)
+        """
+        addr = writer.get_extra_info('peername')
+        conn = AsyncConnection(reader, writer, addr)
+        self.clients[conn] = addr
+        print(f"✅ New connection from {addr}")
+
+        try:
+            if initial_data and not self.handle_frames(conn, addr, conn.decoder.feed(initial_data)):
+                return
+
+            while self.running:
+                frames = await conn.recv_frames()
+                if frames is None:
+                    break
+
+                if not self.handle_frames(conn, addr, frames):
+                    break
+
+        except ConnectionResetError:
+            print(f"👋 Client {addr} closed connection")
+        except Exception as e:
+            print(f"❌ Error handling client {addr}: {e}")
+        finally:
+            self.disconnect_client(conn)
+
+    def create_room_pool(self):
+        """Mọi thứ chạy trên event loop (transport không an toàn khi gửi từ thread khác)"""
+        return None
+
+    async def game_loop(self):
+        """Main game loop - tick cố định trên event loop"""
+        self.scheduler.start()
+
+        while self.running:
+            self.run_due_ticks()
+
+            # Nhường event loop cho I/O đến tick kế tiếp
+            await asyncio.sleep(self.scheduler.time_until_next())
+
+    def stop(self):
+        """Dừng server"""
+        self.running = False
+        if self.tcp_server:
+            self.tcp_server.close()
+            self.tcp_server = None
+        if self.udp_transport:
+            self.udp_transport.close()
+            self.udp_transport = None
+        super().stop()
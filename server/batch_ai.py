@@ -0,0 +1,192 @@
+# server/batch_ai.py
+"""
+AI dạng batch: tham số và trạng thái của mọi AI nằm trong các mảng NumPy,
+mỗi tick quyết định cho tất cả phòng AI bằng vài phép toán vector.
+Đọc state và ghi input thẳng vào BatchGameLogic. Kết quả giống hệt AIPlayer
+(cùng công thức dự đoán, cùng cache theo vận tốc, cùng RNG đếm theo seed).
+Cần NumPy (tùy chọn): kiểm tra bằng batch_available() trước khi dùng.
+"""
+import weakref
+from shared.constants import *
+from server.ai_player import (
+    AIPlayer, AI_DIFFICULTIES, AI_DEAD_ZONE, AI_MAX_ERROR, GOLDEN_GAMMA, delay_to_ticks
+)
+from server.game_logic import BALL_MAX_Y, PADDLE1_FACE, PADDLE2_FACE
+from server.batch_game_logic import np
+
+# Mảng của mỗi AI
+FLOAT_FIELDS = ('accuracy', 'cached_vx', 'cached_vy', 'cached_target')
+INT_FIELDS = ('player_id', 'reaction_ticks', 'ticks_waited')
+UINT_FIELDS = ('seed', 'decisions')
+BOOL_FIELDS = ('has_cache',)
+
+
+def ai_random_batch(seeds, counters):
+    """ai_random cho cả mảng (phép nhân uint64 tự quay vòng như & MASK64)"""
+    z = seeds + counters * np.uint64(GOLDEN_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+class BatchAI:
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise RuntimeError("BatchAI requires NumPy (pip install numpy)")
+        self.capacity = 0
+        self.size = 0  # Số slot đã cấp (kể cả slot đã trả lại)
+        self.free_slots = []
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Mở rộng các mảng (giữ nguyên dữ liệu cũ)"""
+        for name in FLOAT_FIELDS + INT_FIELDS + UINT_FIELDS + BOOL_FIELDS:
+            if name in FLOAT_FIELDS:
+                dtype = np.float64
+            elif name in INT_FIELDS:
+                dtype = np.int64
+            elif name in UINT_FIELDS:
+                dtype = np.uint64
+            else:
+                dtype = np.bool_
+            array = np.zeros(capacity, dtype=dtype)
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def add_player(self, ai):
+        """
+        Thêm một AI, copy tham số và trạng thái từ AIPlayer
+        Returns: slot của AI trong các mảng
+        """
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+
+        self.player_id[slot] = ai.player_id
+        self.accuracy[slot] = ai.accuracy
+        self.reaction_ticks[slot] = ai.reaction_ticks
+        self.ticks_waited[slot] = ai.ticks_waited
+        self.seed[slot] = ai.seed
+        self.decisions[slot] = ai.decisions
+        self.has_cache[slot] = ai.cached_velocity is not None
+        if ai.cached_velocity is not None:
+            self.cached_vx[slot], self.cached_vy[slot] = ai.cached_velocity
+            self.cached_target[slot] = ai.cached_target
+        return slot
+
+    def remove_player(self, slot):
+        """Trả slot lại để dùng cho AI khác"""
+        self.free_slots.append(slot)
+
+    def set_difficulty(self, slot, difficulty, tick_rate):
+        """Đổi độ khó của một AI (giống AIPlayer.set_difficulty)"""
+        accuracy, reaction_delay = AI_DIFFICULTIES.get(difficulty, AI_DIFFICULTIES["medium"])
+        self.accuracy[slot] = accuracy
+        self.reaction_ticks[slot] = delay_to_ticks(reaction_delay, tick_rate)
+
+    def step(self, physics, ai_slots, room_slots):
+        """
+        Quyết định một tick cho các AI: ai_slots[i] điều khiển phòng room_slots[i]
+        của physics (BatchGameLogic), input được ghi thẳng vào physics
+        """
+        if not len(ai_slots):
+            return
+        ai = np.asarray(ai_slots, dtype=np.intp)
+        rooms = np.asarray(room_slots, dtype=np.intp)
+        is_p1 = self.player_id[ai] == 1
+
+        # Chờ đủ reaction_ticks, các AI chưa đến lượt thì đứng yên
+        waited = self.ticks_waited[ai] + 1
+        deciding = waited >= self.reaction_ticks[ai]
+        self.ticks_waited[ai] = np.where(deciding, 0, waited)
+
+        move_up = np.zeros(len(ai), dtype=np.bool_)
+        move_down = np.zeros(len(ai), dtype=np.bool_)
+        if deciding.any():
+            a = ai[deciding]
+            r = rooms[deciding]
+            p1 = is_p1[deciding]
+            target = self._predict(a, p1, physics.ball_x[r], physics.ball_y[r],
+                                   physics.ball_vx[r], physics.ball_vy[r])
+
+            # Sai số ngẫu nhiên: cùng counter với AIPlayer.calculate_move
+            counters = self.decisions[a] * np.uint64(2)
+            self.decisions[a] += np.uint64(1)
+            seeds = self.seed[a]
+            miss = ai_random_batch(seeds, counters) > self.accuracy[a]
+            error = np.floor(ai_random_batch(seeds, counters + np.uint64(1)) * (2 * AI_MAX_ERROR + 1)) - AI_MAX_ERROR
+            target = np.where(miss, target + error, target)
+
+            paddle_y = np.where(p1, physics.paddle1_y[r], physics.paddle2_y[r])
+            paddle_center = paddle_y + PADDLE_HEIGHT / 2
+            up = target < paddle_center - AI_DEAD_ZONE
+            move_up[deciding] = up
+            move_down[deciding] = ~up & (target > paddle_center + AI_DEAD_ZONE)
+
+        physics.up1[rooms[is_p1]] = move_up[is_p1]
+        physics.down1[rooms[is_p1]] = move_down[is_p1]
+        physics.up2[rooms[~is_p1]] = move_up[~is_p1]
+        physics.down2[rooms[~is_p1]] = move_down[~is_p1]
+
+    def _predict(self, ai, is_p1, ball_x, ball_y, ball_vx, ball_vy):
+        """AIPlayer._predict_ball_position cho cả mảng (chỉ tính lại khi vận tốc đổi)"""
+        moving_away = np.where(is_p1, ball_vx > 0, ball_vx < 0)
+        still = ball_vx == 0
+        toward = ~moving_away & ~still
+
+        changed = toward & (~self.has_cache[ai]
+                            | (ball_vx != self.cached_vx[ai])
+                            | (ball_vy != self.cached_vy[ai]))
+        if changed.any():
+            c = ai[changed]
+            vx = ball_vx[changed]
+            vy = ball_vy[changed]
+            contact_x = np.where(is_p1[changed], PADDLE1_FACE, PADDLE2_FACE)
+            time_to_reach = (contact_x - ball_x[changed]) / vx
+
+            # Phản xạ theo modulo như reflect_y
+            period = 2 * BALL_MAX_Y
+            predicted_y = np.remainder(ball_y[changed] + vy * time_to_reach, period)
+            predicted_y = np.where(predicted_y > BALL_MAX_Y, period - predicted_y, predicted_y)
+
+            self.cached_target[c] = predicted_y + BALL_SIZE / 2
+            self.cached_vx[c] = vx
+            self.cached_vy[c] = vy
+            self.has_cache[c] = True
+
+        return np.where(moving_away, SCREEN_HEIGHT / 2,
+                        np.where(still, ball_y + BALL_SIZE / 2, self.cached_target[ai]))
+
+    def create_player(self, difficulty="medium", player_id=2, seed=None, tick_rate=None):
+        """Tạo AI cho một phòng mới, state nằm trong batch này"""
+        return BatchAIPlayer(self, difficulty, player_id, seed, tick_rate)
+
+
+class BatchAIPlayer:
+    """
+    Cùng cấu hình với AIPlayer nhưng state nằm trong BatchAI.
+    Không có calculate_move: server gọi BatchAI.step() một lần cho mọi phòng AI.
+    """
+
+    def __init__(self, batch, difficulty="medium", player_id=2, seed=None, tick_rate=None):
+        ai = AIPlayer(difficulty, player_id, seed, tick_rate)
+        self.batch = batch
+        self.difficulty = difficulty
+        self.player_id = player_id
+        self.seed = ai.seed
+        self.tick_rate = ai.tick_rate
+        self.slot = batch.add_player(ai)
+        # Phòng bị xóa -> trả slot cho batch
+        weakref.finalize(self, batch.remove_player, self.slot)
+
+    def set_difficulty(self, difficulty):
+        """Thay đổi độ khó"""
+        self.difficulty = difficulty
+        self.batch.set_difficulty(self.slot, difficulty, self.tick_rate)
@@ -0,0 +1,299 @@
+# server/batch_game_logic.py
+"""
+Engine vật lý dạng batch: state của mọi phòng nằm trong các mảng NumPy
+(struct-of-arrays), mỗi tick chỉ cần vài phép toán vector cho tất cả phòng.
+Kết quả giống hệt GameLogic (cùng thứ tự phép tính float, cùng RNG mỗi phòng).
+Cần NumPy (tùy chọn): kiểm tra bằng batch_available() trước khi dùng.
+"""
+import weakref
+from shared.constants import *
+from shared.models import GameState
+from shared.physics import PADDLE_MAX_Y
+from server.game_logic import (
+    GameLogic, BRIGHT_COLORS, BALL_MAX_Y, PADDLE1_FACE, PADDLE2_FACE, MAX_BOUNCES_PER_STEP
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Mảng float64 / int của mỗi phòng
+FLOAT_FIELDS = ('ball_x', 'ball_y', 'ball_vx', 'ball_vy', 'paddle1_y', 'paddle2_y')
+INT_FIELDS = ('score1', 'score2', 'winner')
+BOOL_FIELDS = ('game_over', 'up1', 'down1', 'up2', 'down2')
+
+
+def batch_available():
+    """NumPy đã được cài chưa"""
+    return np is not None
+
+
+class BatchGameLogic:
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise RuntimeError("BatchGameLogic requires NumPy (pip install numpy)")
+        self.capacity = 0
+        self.size = 0  # Số slot đã cấp (kể cả slot đã trả lại)
+        self.free_slots = []
+        self.rngs = []  # RoomRandom của mỗi phòng
+        self.colors = []  # Màu bóng của mỗi phòng
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Mở rộng các mảng (giữ nguyên dữ liệu cũ)"""
+        for name in FLOAT_FIELDS + INT_FIELDS + BOOL_FIELDS:
+            dtype = np.float64 if name in FLOAT_FIELDS else (np.int64 if name in INT_FIELDS else np.bool_)
+            array = np.zeros(capacity, dtype=dtype)
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def add_room(self, logic=None):
+        """
+        Thêm một phòng, copy state và RNG từ GameLogic (mặc định: phòng mới)
+        Returns: slot của phòng trong các mảng
+        """
+        if logic is None:
+            logic = GameLogic()
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+            self.rngs.append(None)
+            self.colors.append(None)
+
+        state = logic.state
+        ball = state.ball
+        self.ball_x[slot] = ball.x
+        self.ball_y[slot] = ball.y
+        self.ball_vx[slot] = ball.vx
+        self.ball_vy[slot] = ball.vy
+        self.paddle1_y[slot] = state.paddle1.y
+        self.paddle2_y[slot] = state.paddle2.y
+        self.score1[slot] = state.score1
+        self.score2[slot] = state.score2
+        self.winner[slot] = state.winner or 0
+        self.game_over[slot] = state.game_over
+        self.up1[slot] = state.paddle1.move_up
+        self.down1[slot] = state.paddle1.move_down
+        self.up2[slot] = state.paddle2.move_up
+        self.down2[slot] = state.paddle2.move_down
+
+        self.rngs[slot] = logic.rng.copy()
+        self.colors[slot] = logic.ball_color
+        return slot
+
+    def remove_room(self, slot):
+        """Trả slot lại để dùng cho phòng khác"""
+        self.game_over[slot] = True  # Slot trống không được mô phỏng
+        self.rngs[slot] = None
+        self.free_slots.append(slot)
+
+    def set_paddle_input(self, slot, player_id, move_up, move_down):
+        if player_id == 1:
+            self.up1[slot] = move_up
+            self.down1[slot] = move_down
+        elif player_id == 2:
+            self.up2[slot] = move_up
+            self.down2[slot] = move_down
+
+    def reset_ball(self, slot, direction=None):
+        """Reset bóng của một phòng về giữa màn hình (giống GameLogic.reset_ball)"""
+        rng = self.rngs[slot]
+        self.ball_x[slot] = SCREEN_WIDTH // 2
+        self.ball_y[slot] = SCREEN_HEIGHT // 2
+        self.colors[slot] = "#FFFFFF"
+
+        if direction is None:
+            direction = rng.choice([-1, 1])
+
+        self.ball_vx[slot] = BALL_SPEED_X * direction
+        self.ball_vy[slot] = rng.uniform(-BALL_SPEED_Y, BALL_SPEED_Y)
+
+    def reset_game(self, slot):
+        """Reset toàn bộ trạng thái của một phòng"""
+        self.score1[slot] = 0
+        self.score2[slot] = 0
+        self.game_over[slot] = False
+        self.winner[slot] = 0
+        self.paddle1_y[slot] = (SCREEN_HEIGHT - PADDLE_HEIGHT) // 2
+        self.paddle2_y[slot] = (SCREEN_HEIGHT - PADDLE_HEIGHT) // 2
+        self.reset_ball(slot)
+
+    def step(self, dt=1/FPS, slots=None):
+        """
+        Mô phỏng một bước dt cho các slot (mặc định: mọi slot)
+        Các phòng đã game over bị bỏ qua, giống GameLogic.update
+        """
+        if slots is None:
+            idx = np.arange(self.size)
+        else:
+            idx = np.fromiter(slots, dtype=np.intp)
+        idx = idx[~self.game_over[idx]]
+        if not len(idx):
+            return
+
+        scale = dt * FPS
+        paddle_step = PADDLE_SPEED * scale
+
+        # Paddle (trừ rồi mới cộng, giống thứ tự của GameLogic)
+        paddle1_y = self.paddle1_y[idx]
+        paddle1_y = np.where(self.up1[idx], paddle1_y - paddle_step, paddle1_y)
+        paddle1_y = np.where(self.down1[idx], paddle1_y + paddle_step, paddle1_y)
+        paddle1_y = np.maximum(0, np.minimum(PADDLE_MAX_Y, paddle1_y))
+
+        paddle2_y = self.paddle2_y[idx]
+        paddle2_y = np.where(self.up2[idx], paddle2_y - paddle_step, paddle2_y)
+        paddle2_y = np.where(self.down2[idx], paddle2_y + paddle_step, paddle2_y)
+        paddle2_y = np.maximum(0, np.minimum(PADDLE_MAX_Y, paddle2_y))
+
+        # Bóng: va chạm liên tục, mỗi vòng xử lý va chạm sớm nhất của mỗi phòng
+        x = self.ball_x[idx]
+        y = self.ball_y[idx]
+        vx = self.ball_vx[idx]
+        vy = self.ball_vy[idx]
+        remaining = np.full(len(idx), scale)
+        pending = np.ones(len(idx), dtype=np.bool_)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(MAX_BOUNCES_PER_STEP):
+                # Tường trên/dưới
+                wall_y = np.where(vy < 0, 0.0, BALL_MAX_Y)
+                t_wall = np.maximum(0.0, (wall_y - y) / vy)
+                wall = pending & (vy != 0) & (t_wall <= remaining)
+                best_t = np.where(wall, t_wall, remaining)
+
+                # Mặt trong của paddle
+                toward1 = (vx < 0) & (x >= PADDLE1_FACE)
+                toward2 = (vx > 0) & (x <= PADDLE2_FACE)
+                face = np.where(toward1, PADDLE1_FACE, PADDLE2_FACE)
+                paddle_y = np.where(toward1, paddle1_y, paddle2_y)
+                t_paddle = (face - x) / vx
+                hit_y = y + vy * t_paddle
+                paddle = (pending & (toward1 | toward2) & (t_paddle <= best_t) &
+                          (~wall | (t_paddle < best_t)) &
+                          (hit_y + BALL_SIZE >= paddle_y) & (hit_y <= paddle_y + PADDLE_HEIGHT))
+
+                impact = wall | paddle
+                if not impact.any():
+                    break
+                pending = impact  # Phòng không còn va chạm: chỉ cần đi nốt
+                best_t = np.where(paddle, t_paddle, best_t)
+                wall &= ~paddle
+
+                x = np.where(impact, x + vx * best_t, x)
+                y = np.where(impact, y + vy * best_t, y)
+                remaining = np.where(impact, remaining - best_t, remaining)
+
+                y = np.where(wall, wall_y, y)
+                vy = np.where(wall, vy * -1, vy)
+
+                hit1 = paddle & toward1
+                hit2 = paddle & toward2
+                x = np.where(hit1, PADDLE1_FACE, np.where(hit2, PADDLE2_FACE, x))
+                vx = np.where(hit1, np.abs(vx), np.where(hit2, -np.abs(vx), vx))
+                relative_y = (y - paddle_y) / PADDLE_HEIGHT
+                vy = np.where(paddle, (relative_y - 0.5) * BALL_SPEED_Y * 2, vy)
+                vx = np.where(paddle & (np.abs(vx) < BALL_MAX_SPEED), vx * 1.05, vx)
+                if paddle.any():
+                    self._pick_colors(idx[paddle])
+
+        x = x + vx * remaining
+        y = y + vy * remaining
+        y = np.maximum(0, np.minimum(BALL_MAX_Y, y))
+
+        self.paddle1_y[idx] = paddle1_y
+        self.paddle2_y[idx] = paddle2_y
+        self.ball_x[idx] = x
+        self.ball_y[idx] = y
+        self.ball_vx[idx] = vx
+        self.ball_vy[idx] = vy
+
+        # Ghi điểm (hiếm, reset bóng từng phòng để dùng đúng RNG của phòng đó)
+        scored2 = x < 0
+        scored1 = x > SCREEN_WIDTH
+        if scored2.any() or scored1.any():
+            for slot in idx[scored2].tolist():
+                self.score2[slot] += 1
+                self.reset_ball(slot, direction=1)
+            for slot in idx[scored1].tolist():
+                self.score1[slot] += 1
+                self.reset_ball(slot, direction=-1)
+
+            # Thắng
+            score1 = self.score1[idx]
+            score2 = self.score2[idx]
+            won1 = score1 >= WINNING_SCORE
+            won2 = ~won1 & (score2 >= WINNING_SCORE)
+            self.game_over[idx] = won1 | won2
+            self.winner[idx] = np.where(won1, 1, np.where(won2, 2, self.winner[idx]))
+
+    def _pick_colors(self, slots):
+        """Đổi màu bóng khi chạm paddle (RNG riêng của mỗi phòng)"""
+        for slot in slots.tolist():
+            self.colors[slot] = self.rngs[slot].choice(BRIGHT_COLORS)
+
+    def read_state(self, slot, state=None):
+        """Ghi state của một phòng vào GameState (tạo mới nếu không truyền vào)"""
+        if state is None:
+            state = GameState()
+        ball = state.ball
+        ball.x = self.ball_x[slot].item()
+        ball.y = self.ball_y[slot].item()
+        ball.vx = self.ball_vx[slot].item()
+        ball.vy = self.ball_vy[slot].item()
+        ball.color = self.colors[slot]
+        state.paddle1.y = self.paddle1_y[slot].item()
+        state.paddle2.y = self.paddle2_y[slot].item()
+        state.paddle1.move_up = bool(self.up1[slot])
+        state.paddle1.move_down = bool(self.down1[slot])
+        state.paddle2.move_up = bool(self.up2[slot])
+        state.paddle2.move_down = bool(self.down2[slot])
+        state.score1 = int(self.score1[slot])
+        state.score2 = int(self.score2[slot])
+        state.game_over = bool(self.game_over[slot])
+        state.winner = int(self.winner[slot]) or None
+        return state
+
+    def create_logic(self, seed=None):
+        """Tạo GameLogic cho một phòng mới, state nằm trong batch này"""
+        return BatchRoomLogic(self, seed)
+
+
+class BatchRoomLogic:
+    """
+    Cùng interface với GameLogic nhưng state nằm trong BatchGameLogic.
+    update() không làm gì: server gọi BatchGameLogic.step() một lần cho mọi phòng.
+    """
+
+    def __init__(self, batch, seed=None):
+        self.batch = batch
+        self.state = GameState()
+        self.slot = batch.add_room(GameLogic(seed))
+        # Phòng bị xóa / chơi lại -> trả slot cho batch
+        weakref.finalize(self, batch.remove_room, self.slot)
+
+    @property
+    def rng(self):
+        return self.batch.rngs[self.slot]
+
+    def reset_ball(self, direction=None):
+        self.batch.reset_ball(self.slot, direction)
+
+    def reset_game(self):
+        self.batch.reset_game(self.slot)
+
+    def update(self, dt=1/FPS):
+        pass
+
+    def set_paddle_input(self, player_id, move_up, move_down):
+        self.batch.set_paddle_input(self.slot, player_id, move_up, move_down)
+
+    def get_state(self):
+        return self.batch.read_state(self.slot, self.state)
@@ -2,6 +2,7 @@
 """
 Server configuration
 """
+import os
 from shared.constants import *
 
 class ServerConfig:
@@ -10,15 +11,74 @@ class ServerConfig:
     PORT = PORT
     MAX_CLIENTS = 10
     BUFFER_SIZE = BUFFER_SIZE
+    LISTEN_BACKLOG = 1024
+    
+    # Gửi GAME_STATE/INPUT qua UDP (cùng số port với TCP) nếu client hỗ trợ
+    ENABLE_UDP = True
+    
+    # Hàng đợi gửi của mỗi client (game loop không bao giờ chờ socket)
+    SEND_QUEUE_MAX_FRAMES = 256
+    SEND_QUEUE_MAX_BYTES = 256 * 1024
+    SNAPSHOT_HIGH_WATER = 16 * 1024  # Buffer lớn hơn mức này -> giữ lại snapshot
+    SEND_STALL_TIMEOUT = 5.0  # Không gửi được gì trong 5s -> ngắt kết nối
+    SENDMSG_MAX_BUFFERS = 64  # Số frame tối đa gom vào một lần sendmsg
+    
+    # Chống gửi dồn: budget message của mỗi client (token bucket, TCP + UDP).
+    # Client thật gửi ~60 ack/giây + vài input; hết budget thì message bị bỏ,
+    # bị bỏ quá CLIENT_KICK_THROTTLED message (hoặc gửi quá CLIENT_KICK_MALFORMED
+    # input sai định dạng) giữa 2 lần báo cáo thì bị ngắt kết nối
+    CLIENT_MESSAGE_RATE = 200
+    CLIENT_MESSAGE_BURST = 200
+    CLIENT_KICK_THROTTLED = 2000
+    CLIENT_KICK_MALFORMED = 50  # Client thật không gửi input sai định dạng
+    FLOOD_REPORT_INTERVAL = 10  # Giây giữa 2 lần in các client bị throttle nhiều nhất
+    
+    # Spectator
+    MAX_SPECTATORS_PER_ROOM = 500
+    SPECTATOR_SNAPSHOT_RATE = 20  # Snapshot/giây cho spectator (player nhận BROADCAST_RATE)
+    
+    # Server mode: "threaded" (1 thread / client), "async" (1 event loop)
+    # hoặc "sharded" (nhiều process, mỗi process một event loop)
+    SERVER_MODE = "threaded"
+    
+    # Sharded mode: số worker process và thời gian chờ message đầu tiên
+    SHARD_WORKERS = os.cpu_count() or 1
+    SHARD_HANDSHAKE_TIMEOUT = 5.0
     
     # Game settings
-    GAME_FPS = FPS
+    SIMULATION_RATE = FPS  # Số tick mô phỏng mỗi giây
+    BROADCAST_RATE = FPS  # Số snapshot gửi cho player mỗi giây (<= SIMULATION_RATE)
+    MAX_CATCH_UP_TICKS = 5  # Server bị chậm: chạy bù tối đa 5 tick mỗi vòng
+    INPUT_MAX_LAG_TICKS = 8  # Input của player được áp dụng trễ tối đa 8 tick so với client
+    
+    # Vật lý + AI: "scalar" (từng phòng) hoặc "batch" (NumPy, mọi phòng một lần)
+    PHYSICS_ENGINE = "scalar"
+    # Số thread tick các phòng song song (0: tick tuần tự trong game loop).
+    # Chỉ có lợi khi code không giữ GIL lâu (Python free-threaded, ...)
+    ROOM_WORKERS = 0
     ROOM_TIMEOUT = 300  # 5 minutes
+    SIMULATION_SEED = None  # Seed cho RNG của các phòng (None: ngẫu nhiên)
+    
+    # Replay: None = không ghi, hoặc thư mục chứa file .replay của mỗi phòng
+    REPLAY_DIR = None
+    REPLAY_KEYFRAME_SECONDS = 5  # Keyframe mỗi 5 giây (tua đến tick bất kỳ)
+    REPLAY_FLUSH_TICKS = 60  # Gom 60 tick rồi mới đưa cho thread ghi
     
     # Logging
     LOG_CONNECTIONS = True
     LOG_GAME_EVENTS = True
     
+    @staticmethod
+    def to_dict():
+        """Các giá trị cấu hình hiện tại (gồm cả giá trị ghi đè từ dòng lệnh)"""
+        return {name: value for name, value in vars(ServerConfig).items() if name.isupper()}
+    
+    @staticmethod
+    def update(values):
+        """Áp dụng các giá trị cấu hình (worker process nhận từ process cha)"""
+        for name, value in values.items():
+            setattr(ServerConfig, name, value)
+    
     @staticmethod
     def get_server_info():
         """Get server info string"""
@@ -29,6 +89,8 @@ class ServerConfig:
 ║ Host: {ServerConfig.HOST:<31}║
 ║ Port: {ServerConfig.PORT:<31}║
 ║ Max Clients: {ServerConfig.MAX_CLIENTS:<23}║
-║ Game FPS: {ServerConfig.GAME_FPS:<26}║
+║ Tick Rate: {ServerConfig.SIMULATION_RATE:<25}║
+║ Send Rate: {ServerConfig.BROADCAST_RATE:<25}║
+║ Mode: {ServerConfig.SERVER_MODE:<31}║
 ╚════════════════════════════════════════╝
 """
\ No newline at end of file
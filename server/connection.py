@@ -0,0 +1,281 @@
+# server/connection.py
+"""
+Bọc kết nối của client để các server dùng chung một interface.
+Việc gửi không bao giờ block game loop: mỗi kết nối có hàng đợi gửi giới hạn,
+snapshot mới thay snapshot cũ chưa gửi, client bị kẹt quá lâu thì bị ngắt.
+"""
+import collections
+import select
+import threading
+import time
+from shared.constants import BUFFER_SIZE, CODEC_JSON
+from shared.protocol import FrameDecoder
+from server.config import ServerConfig
+
+
+def _wait_readable(sock, timeout):
+    """Chờ socket có dữ liệu để đọc (poll nếu có, không thì select)"""
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        return bool(poller.poll(timeout * 1000))
+    readable, _, _ = select.select([sock], [], [], timeout)
+    return bool(readable)
+
+
+class TokenBucket:
+    """Budget message của một client: nạp rate token/giây, giữ tối đa burst token"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self):
+        """Lấy 1 token. Returns: False nếu đã hết budget"""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class BaseConnection:
+    """Trạng thái riêng của mỗi client, dùng chung cho mọi kiểu kết nối"""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.decoder = FrameDecoder()
+        self.codec = CODEC_JSON  # Codec cho GAME_STATE/INPUT, chọn lúc handshake
+        self.delta = None  # DeltaEncoder nếu client dùng CODEC_DELTA
+        self.udp_token = None  # Token client gửi trong UDP hello
+        self.udp_addr = None  # Địa chỉ UDP đã xác nhận (None = chỉ dùng TCP)
+        # Lệnh của thread mạng cho trạng thái gửi snapshot (ack, keyframe, UDP):
+        # game loop áp dụng, thread mạng không sửa delta/udp_addr trực tiếp
+        self.commands = collections.deque()
+        self.budget = TokenBucket(ServerConfig.CLIENT_MESSAGE_RATE, ServerConfig.CLIENT_MESSAGE_BURST)
+        self.kicked = False  # Gửi quá nhiều message -> server sẽ ngắt kết nối
+
+        # Số liệu để tìm client gửi dồn
+        self.messages_received = 0
+        self.messages_throttled = 0  # Bị bỏ vì hết budget (không parse)
+        self.inputs_overwritten = 0  # Input bị input sau đè trước khi đến tick
+        self.throttled_reported = 0  # messages_throttled ở lần báo cáo trước
+        self.inputs_malformed = 0  # Input sai định dạng (bị bỏ, không đến game loop)
+        self.malformed_reported = 0  # inputs_malformed ở lần báo cáo trước
+
+        self.stuck = False  # Hàng đợi gửi tràn -> server sẽ ngắt kết nối
+        self.stalled_since = None  # Thời điểm bắt đầu có dữ liệu chưa gửi được
+        self.snapshots_dropped = 0
+
+    def post(self, command, data=None):
+        """Đưa lệnh vào hàng đợi của kết nối (thread mạng gọi, deque.append không cần khóa)"""
+        self.commands.append((command, data))
+
+    def drain_commands(self):
+        """Lấy lần lượt các lệnh đang chờ (chỉ game loop gọi)"""
+        commands = self.commands
+        while commands:
+            yield commands.popleft()
+
+    def is_stuck(self, now):
+        """Client không nhận dữ liệu quá lâu hoặc hàng đợi đã tràn"""
+        return self.stuck or (
+            self.stalled_since is not None and
+            now - self.stalled_since > ServerConfig.SEND_STALL_TIMEOUT
+        )
+
+
+class Connection(BaseConnection):
+    """
+    Kết nối TCP cho server nhiều thread: socket non-blocking, thread của client
+    chờ dữ liệu bằng poll/select, việc gửi chỉ ghi phần socket nhận được ngay
+    """
+
+    def __init__(self, sock, addr):
+        super().__init__(addr)
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.send_lock = threading.Lock()  # Game loop và thread client cùng gửi
+        self.outbox = collections.deque()  # [is_snapshot, frame]
+        self.outbox_bytes = 0
+        self.current = None  # memoryview của frame đang gửi dở
+
+    def send(self, data):
+        """Đưa frame điều khiển vào hàng đợi và gửi ngay phần có thể"""
+        with self.send_lock:
+            self._enqueue(False, data)
+            self._flush()
+
+    def send_snapshot(self, data):
+        """
+        Đưa snapshot vào hàng đợi; nếu snapshot trước vẫn chưa được gửi
+        (client đang chậm) thì thay thế nó thay vì xếp thêm
+        """
+        with self.send_lock:
+            if self.outbox and self.outbox[-1][0]:
+                stale = self.outbox[-1]
+                self.outbox_bytes += len(data) - len(stale[1])
+                stale[1] = data
+                self.snapshots_dropped += 1
+            else:
+                self._enqueue(True, data)
+            self._flush()
+
+    def flush(self):
+        """Gửi tiếp dữ liệu còn trong hàng đợi (không block)"""
+        with self.send_lock:
+            self._flush()
+
+    def has_pending(self):
+        """Còn dữ liệu chưa gửi"""
+        return self.current is not None or bool(self.outbox)
+
+    def _enqueue(self, is_snapshot, data):
+        self.outbox.append([is_snapshot, data])
+        self.outbox_bytes += len(data)
+        if (len(self.outbox) > ServerConfig.SEND_QUEUE_MAX_FRAMES or
+                self.outbox_bytes > ServerConfig.SEND_QUEUE_MAX_BYTES):
+            self.stuck = True
+
+    def _flush(self):
+        while self.current is not None or self.outbox:
+            # Gom nhiều frame vào một syscall (writev/sendmsg)
+            entries = []
+            while self.outbox and len(entries) < ServerConfig.SENDMSG_MAX_BUFFERS:
+                entries.append(self.outbox.popleft())
+            buffers = [memoryview(entry[1]) for entry in entries]
+            if self.current is not None:
+                buffers.insert(0, self.current)
+
+            try:
+                sent = self._send_buffers(buffers)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self.outbox.extendleft(reversed(entries))
+                self.stuck = True
+                return
+
+            if self.current is not None:
+                if sent < len(self.current):
+                    self.current = self.current[sent:]
+                    self._requeue(entries)
+                    return
+                sent -= len(self.current)
+                self.current = None
+
+            for i, entry in enumerate(entries):
+                size = len(entry[1])
+                if sent >= size:
+                    sent -= size
+                    self.outbox_bytes -= size
+                    continue
+
+                # Frame gửi dở: giữ phần còn lại, các frame sau quay lại hàng đợi
+                rest = entries[i:]
+                if sent:
+                    self.current = memoryview(entry[1])[sent:]
+                    self.outbox_bytes -= size
+                    rest = entries[i + 1:]
+                self._requeue(rest)
+                return
+
+        self.stalled_since = None
+
+    def _send_buffers(self, buffers):
+        """Gửi nhiều buffer trong một syscall nếu hệ điều hành hỗ trợ"""
+        if len(buffers) > 1 and hasattr(self.sock, 'sendmsg'):
+            return self.sock.sendmsg(buffers)
+        return self.sock.send(buffers[0])
+
+    def _requeue(self, entries):
+        """Socket buffer đầy: đưa các frame chưa gửi về đầu hàng đợi"""
+        self.outbox.extendleft(reversed(entries))
+        if self.stalled_since is None:
+            self.stalled_since = time.monotonic()
+
+    def recv_frames(self, timeout=1.0):
+        """
+        Chờ và nhận dữ liệu, tách frame
+        Returns: list payload (rỗng nếu hết timeout), hoặc None nếu client đã đóng kết nối
+        """
+        if not _wait_readable(self.sock, timeout):
+            return []
+        try:
+            return self.decoder.recv_into(self.sock)
+        except (BlockingIOError, InterruptedError):
+            return []
+
+    def close(self):
+        """Đóng kết nối"""
+        self.sock.close()
+
+
+class AsyncConnection(BaseConnection):
+    """
+    Kết nối TCP dùng asyncio stream (server một thread).
+    Transport tự gửi dần buffer; snapshot chỉ được ghi khi buffer đã gần cạn,
+    nếu không thì giữ lại snapshot mới nhất để ghi ở lần flush sau.
+    """
+
+    def __init__(self, reader, writer, addr):
+        super().__init__(addr)
+        self.reader = reader
+        self.writer = writer
+        self.transport = writer.transport
+        self.pending_snapshot = None
+
+    def send(self, data):
+        """Ghi frame điều khiển vào buffer của transport (không block)"""
+        if self.writer.is_closing():
+            return
+        self.writer.write(data)
+        self._check_buffer()
+
+    def send_snapshot(self, data):
+        """Ghi snapshot nếu client theo kịp, không thì thay snapshot đang chờ"""
+        if self.pending_snapshot is not None:
+            self.snapshots_dropped += 1
+        self.pending_snapshot = data
+        self.flush()
+
+    def flush(self):
+        """Ghi snapshot đang chờ khi buffer của transport đã gần cạn"""
+        if self.pending_snapshot is not None and not self.writer.is_closing():
+            if self.transport.get_write_buffer_size() <= ServerConfig.SNAPSHOT_HIGH_WATER:
+                self.writer.write(self.pending_snapshot)
+                self.pending_snapshot = None
+        self._check_buffer()
+
+    def has_pending(self):
+        """Còn dữ liệu chưa gửi"""
+        return self.pending_snapshot is not None or self.transport.get_write_buffer_size() > 0
+
+    def _check_buffer(self):
+        buffered = self.transport.get_write_buffer_size()
+        if buffered > ServerConfig.SEND_QUEUE_MAX_BYTES:
+            self.stuck = True
+        if buffered > ServerConfig.SNAPSHOT_HIGH_WATER:
+            if self.stalled_since is None:
+                self.stalled_since = time.monotonic()
+        else:
+            self.stalled_since = None
+
+    async def recv_frames(self):
+        """
+        Đọc dữ liệu và tách frame
+        Returns: list payload, hoặc None nếu client đã đóng kết nối
+        """
+        data = await self.reader.read(BUFFER_SIZE)
+        if not data:
+            return None
+        return self.decoder.feed(data)
+
+    def close(self):
+        """Đóng kết nối"""
+        self.writer.close()
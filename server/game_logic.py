@@ -5,6 +5,7 @@ Fix lỗi: 'dict' object has no attribute 'ball'
 import random
 from shared.models import GameState
 from shared.constants import *
+from shared.physics import move_paddle
 
 # Danh sách màu rực rỡ
 BRIGHT_COLORS = [
@@ -12,8 +13,57 @@ BRIGHT_COLORS = [
     "#00FFFF", "#FF00FF", "#FFA500", "#FFFFFF"
 ]
 
+# Va chạm liên tục
+BALL_MAX_Y = SCREEN_HEIGHT - BALL_SIZE
+PADDLE1_FACE = PADDLE_OFFSET + PADDLE_WIDTH  # x của bóng khi chạm mặt paddle 1
+PADDLE2_FACE = SCREEN_WIDTH - PADDLE_OFFSET - PADDLE_WIDTH - BALL_SIZE  # ... paddle 2
+MAX_BOUNCES_PER_STEP = 8
+IMPACT_WALL = 1
+IMPACT_PADDLE1 = 2
+IMPACT_PADDLE2 = 3
+
+class RoomRandom(random.Random):
+    """
+    random.Random đếm số word 32 bit đã dùng: (seed, draws) xác định đúng state
+    của RNG, replay lưu cặp này ở keyframe thay vì toàn bộ state (hay seed lại RNG)
+    Cho ra đúng dãy số như random.Random cùng seed.
+    """
+
+    def seed(self, a=None, version=2):
+        # Seed luôn là số 64 bit để ghi được vào replay
+        if a is None:
+            a = random.SystemRandom().getrandbits(64)
+        elif not (isinstance(a, int) and 0 <= a < 1 << 64):
+            a = random.Random(a).getrandbits(64)
+        super().seed(a, version)
+        self.initial_seed = a
+        self.draws = 0
+
+    def random(self):
+        self.draws += 2  # 53 bit từ 2 word
+        return super().random()
+
+    def getrandbits(self, k):
+        self.draws += (k + 31) // 32
+        return super().getrandbits(k)
+
+    def restore(self, seed, draws):
+        """Đưa RNG về vị trí (seed, draws) đã lưu"""
+        self.seed(seed)
+        random.Random.getrandbits(self, 32 * draws)  # Bỏ qua đúng draws word
+        self.draws = draws
+
+    def copy(self):
+        """Bản sao độc lập (cùng state và bộ đếm)"""
+        rng = RoomRandom(self.initial_seed)
+        rng.setstate(self.getstate())
+        rng.draws = self.draws
+        return rng
+
+
 class GameLogic:
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.rng = RoomRandom(seed)  # RNG riêng mỗi phòng (tái lập được khi có seed)
         self.state = GameState()
         self.ball_color = "#FFFFFF" # Mặc định màu trắng
         self.reset_ball()
@@ -26,10 +76,10 @@ class GameLogic:
         
         # Random hướng bay
         if direction is None:
-            direction = random.choice([-1, 1])
+            direction = self.rng.choice([-1, 1])
         
         self.state.ball.vx = BALL_SPEED_X * direction
-        self.state.ball.vy = random.uniform(-BALL_SPEED_Y, BALL_SPEED_Y)
+        self.state.ball.vy = self.rng.uniform(-BALL_SPEED_Y, BALL_SPEED_Y)
 
     def reset_game(self):
         """Reset toàn bộ trạng thái"""
@@ -43,72 +93,99 @@ class GameLogic:
         
         self.reset_ball()
     
-    def update(self, dt=1/60):
+    def update(self, dt=1/FPS):
+        """
+        Mô phỏng một bước dài dt giây
+        Tốc độ trong constants tính theo pixel / frame ở FPS, nên được nhân với dt * FPS
+        """
         if self.state.game_over:
             return
         
-        self._update_paddles()
-        self._update_ball()
-        self._check_collisions()
+        scale = dt * FPS
+        self._update_paddles(scale)
+        self._update_ball(scale)
         self._check_scoring()
         self._check_win_condition()
     
-    def _update_paddles(self):
-        # Paddle 1
-        if self.state.paddle1.move_up:
-            self.state.paddle1.y -= self.state.paddle1.speed
-        if self.state.paddle1.move_down:
-            self.state.paddle1.y += self.state.paddle1.speed
+    def _update_paddles(self, scale=1.0):
+        # Dùng chung luật với client (dự đoán paddle của mình)
+        for paddle in (self.state.paddle1, self.state.paddle2):
+            paddle.y = move_paddle(paddle.y, paddle.move_up, paddle.move_down, paddle.speed, scale)
+    
+    def _update_ball(self, scale=1.0):
+        """
+        Di chuyển bóng trong scale frame với va chạm liên tục (swept):
+        tìm thời điểm chạm tường/mặt paddle sớm nhất trong bước, nảy tại đúng
+        thời điểm đó rồi đi tiếp phần thời gian còn lại (nhiều lần nảy / bước)
+        """
+        ball = self.state.ball
+        remaining = scale
         
-        # Paddle 2
-        if self.state.paddle2.move_up:
-            self.state.paddle2.y -= self.state.paddle2.speed
-        if self.state.paddle2.move_down:
-            self.state.paddle2.y += self.state.paddle2.speed
+        for _ in range(MAX_BOUNCES_PER_STEP):
+            t, event = self._next_impact(remaining)
+            if event is None:
+                break
+            
+            ball.x += ball.vx * t
+            ball.y += ball.vy * t
+            remaining -= t
+            
+            if event == IMPACT_WALL:
+                ball.y = 0 if ball.vy < 0 else BALL_MAX_Y
+                ball.vy *= -1
+            elif event == IMPACT_PADDLE1:
+                ball.x = PADDLE1_FACE
+                ball.vx = abs(ball.vx)
+                self._bounce_off_paddle(self.state.paddle1)
+            else:
+                ball.x = PADDLE2_FACE
+                ball.vx = -abs(ball.vx)
+                self._bounce_off_paddle(self.state.paddle2)
         
-        # Giới hạn màn hình
-        self.state.paddle1.y = max(0, min(SCREEN_HEIGHT - PADDLE_HEIGHT, self.state.paddle1.y))
-        self.state.paddle2.y = max(0, min(SCREEN_HEIGHT - PADDLE_HEIGHT, self.state.paddle2.y))
+        ball.x += ball.vx * remaining
+        ball.y += ball.vy * remaining
+        ball.y = max(0, min(BALL_MAX_Y, ball.y))
     
-    def _update_ball(self):
-        self.state.ball.x += self.state.ball.vx
-        self.state.ball.y += self.state.ball.vy
-    
-    def _check_collisions(self):
+    def _next_impact(self, remaining):
+        """
+        Va chạm sớm nhất trong khoảng remaining frame tới
+        Returns: (t, loại va chạm) hoặc (remaining, None) nếu không chạm gì
+        """
         ball = self.state.ball
+        best_t = remaining
+        event = None
         
         # Tường trên/dưới
-        if ball.y <= 0 or ball.y >= SCREEN_HEIGHT - BALL_SIZE:
-            ball.vy *= -1
-            ball.y = max(0, min(SCREEN_HEIGHT - BALL_SIZE, ball.y))
+        if ball.vy != 0:
+            wall_y = 0 if ball.vy < 0 else BALL_MAX_Y
+            t = max(0.0, (wall_y - ball.y) / ball.vy)
+            if t <= best_t:
+                best_t, event = t, IMPACT_WALL
         
-        # Paddle 1
-        if (ball.x <= self.state.paddle1.x + PADDLE_WIDTH and
-            ball.x >= self.state.paddle1.x and
-            ball.y + BALL_SIZE >= self.state.paddle1.y and
-            ball.y <= self.state.paddle1.y + PADDLE_HEIGHT):
-            
-            ball.vx = abs(ball.vx)
-            ball.x = self.state.paddle1.x + PADDLE_WIDTH
-            relative_y = (ball.y - self.state.paddle1.y) / PADDLE_HEIGHT
-            ball.vy = (relative_y - 0.5) * BALL_SPEED_Y * 2
-            
-            self._increase_ball_speed()
-            self.ball_color = random.choice(BRIGHT_COLORS) # Đổi màu
+        # Mặt trong của paddle (bóng phải đang ở phía trước mặt paddle)
+        if ball.vx < 0 and ball.x >= PADDLE1_FACE:
+            paddle, face, kind = self.state.paddle1, PADDLE1_FACE, IMPACT_PADDLE1
+        elif ball.vx > 0 and ball.x <= PADDLE2_FACE:
+            paddle, face, kind = self.state.paddle2, PADDLE2_FACE, IMPACT_PADDLE2
+        else:
+            return best_t, event
         
-        # Paddle 2
-        if (ball.x + BALL_SIZE >= self.state.paddle2.x and
-            ball.x <= self.state.paddle2.x + PADDLE_WIDTH and
-            ball.y + BALL_SIZE >= self.state.paddle2.y and
-            ball.y <= self.state.paddle2.y + PADDLE_HEIGHT):
-            
-            ball.vx = -abs(ball.vx)
-            ball.x = self.state.paddle2.x - BALL_SIZE
-            relative_y = (ball.y - self.state.paddle2.y) / PADDLE_HEIGHT
-            ball.vy = (relative_y - 0.5) * BALL_SPEED_Y * 2
-            
-            self._increase_ball_speed()
-            self.ball_color = random.choice(BRIGHT_COLORS) # Đổi màu
+        t = (face - ball.x) / ball.vx
+        if t <= best_t and (event is None or t < best_t):
+            hit_y = ball.y + ball.vy * t
+            if hit_y + BALL_SIZE >= paddle.y and hit_y <= paddle.y + PADDLE_HEIGHT:
+                best_t, event = t, kind
+        
+        return best_t, event
+    
+    def _bounce_off_paddle(self, paddle):
+        """Góc nảy theo vị trí chạm trên paddle, tăng tốc và đổi màu bóng"""
+        ball = self.state.ball
+        relative_y = (ball.y - paddle.y) / PADDLE_HEIGHT
+        ball.vy = (relative_y - 0.5) * BALL_SPEED_Y * 2
+        
+        self._increase_ball_speed()
+        self.ball_color = self.rng.choice(BRIGHT_COLORS) # Đổi màu
     
     def _increase_ball_speed(self):
         if abs(self.state.ball.vx) < BALL_MAX_SPEED:
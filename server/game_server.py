@@ -3,20 +3,70 @@
 Server chính quản lý kết nối và game loop (Final Fix)
 """
 import socket
+import secrets
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from shared.constants import *
 from shared.protocol import Message
+from shared.codec import BinaryCodec, DeltaEncoder
 from server.room_manager import RoomManager
+from server.input_buffer import parse_input
+from server.game_logic import GameLogic
+from server.batch_game_logic import BatchGameLogic, batch_available
+from server.batch_ai import BatchAI
+from server.ai_player import AIPlayer
+from server.connection import Connection
+from server.config import ServerConfig
+from server.tick_scheduler import TickScheduler
+from server.replay import ReplayWriter
 
 class GameServer:
     def __init__(self, host='0.0.0.0', port=PORT):
         self.host = host
         self.port = port
+        self.udp_port = port  # Worker của chế độ sharded dùng port UDP riêng
         self.server_socket = None
-        self.room_manager = RoomManager()
+        self.batch = self.create_batch()
+        self.batch_ai = BatchAI() if self.batch else None  # AI mọi phòng một lần mỗi tick
+        self.logic_factory = self.batch.create_logic if self.batch else GameLogic
+        self.ai_factory = self.batch_ai.create_player if self.batch_ai else AIPlayer
+        self.room_manager = RoomManager(logic_factory=self.logic_factory, ai_factory=self.ai_factory,
+                                        seed=ServerConfig.SIMULATION_SEED)
+        self.room_pool = self.create_room_pool()
+        self.replay_writer = ReplayWriter(ServerConfig.REPLAY_DIR) if ServerConfig.REPLAY_DIR else None
         self.running = False
         self.clients = {}  # {conn: addr}
+        self.clients_lock = threading.Lock()  # Game loop và thread client đều có thể ngắt kết nối
+        self.next_flood_report = 0
+        self.scheduler = TickScheduler(ServerConfig.SIMULATION_RATE)
+        # Số snapshot/giây cho player và spectator (không cần chia hết SIMULATION_RATE)
+        self.broadcast_rate = ServerConfig.BROADCAST_RATE
+        self.spectator_rate = ServerConfig.SPECTATOR_SNAPSHOT_RATE
+        
+        # Kênh UDP cho snapshot/input
+        self.udp_socket = None
+        self.udp_tokens = {}  # {token: conn}
+        self.udp_peers = {}  # {udp addr: conn}
+    
+    def create_batch(self):
+        """Engine vật lý batch nếu được chọn (cần NumPy, không có thì dùng scalar)"""
+        if ServerConfig.PHYSICS_ENGINE != "batch":
+            return None
+        if not batch_available():
+            print("⚠️ NumPy not installed, using scalar physics")
+            return None
+        return BatchGameLogic()
+    
+    def create_room_pool(self):
+        """
+        Thread pool tick các phòng song song (ROOM_WORKERS > 0)
+        Engine batch đã gộp vật lý mọi phòng nên không dùng pool
+        """
+        if ServerConfig.ROOM_WORKERS <= 0 or self.batch:
+            return None
+        return ThreadPoolExecutor(max_workers=ServerConfig.ROOM_WORKERS,
+                                  thread_name_prefix="room")
     
     def start(self):
         """Khởi động server"""
@@ -25,12 +75,19 @@ class GameServer:
         
         try:
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(ServerConfig.LISTEN_BACKLOG)
             self.running = True
             
             print(f"🎮 Server started on {self.host}:{self.port}")
             print("Waiting for players...")
             
+            # Start UDP thread (snapshot/input)
+            if ServerConfig.ENABLE_UDP:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.bind((self.host, self.udp_port))
+                udp_thread = threading.Thread(target=self.udp_loop, daemon=True)
+                udp_thread.start()
+            
             # Start game loop thread
             game_thread = threading.Thread(target=self.game_loop, daemon=True)
             game_thread.start()
@@ -47,7 +104,8 @@ class GameServer:
         """Accept client connections"""
         while self.running:
             try:
-                conn, addr = self.server_socket.accept()
+                sock, addr = self.server_socket.accept()
+                conn = Connection(sock, addr)
                 self.clients[conn] = addr
                 print(f"✅ New connection from {addr}")
                 
@@ -63,32 +121,29 @@ class GameServer:
                 if self.running:
                     print(f"❌ Error accepting connection: {e}")
     
+    def udp_loop(self):
+        """Nhận datagram UDP"""
+        while self.running:
+            try:
+                data, addr = self.udp_socket.recvfrom(MAX_DATAGRAM_SIZE)
+                self.handle_datagram(data, addr)
+            except Exception as e:
+                if self.running:
+                    print(f"❌ Error receiving UDP datagram: {e}")
+    
+    def udp_send(self, payload, addr):
+        """Gửi một datagram"""
+        self.udp_socket.sendto(payload, addr)
+    
     def handle_client(self, conn, addr):
         """Xử lý messages từ client"""
         try:
             while self.running:
-                data = conn.recv(BUFFER_SIZE)
-                if not data:
+                frames = conn.recv_frames()
+                if frames is None:
                     break
                 
-                msg_type, msg_data = Message.parse(data)
-                
-                if msg_type == MSG_CONNECT:
-                    self.handle_connect(conn, addr)
-                
-                elif msg_type == MSG_AI_MODE:
-                    self.handle_ai_mode(conn, addr, msg_data)
-                
-                elif msg_type == MSG_READY:
-                    self.handle_ready(conn)
-                
-                elif msg_type == MSG_INPUT:
-                    self.handle_input(conn, msg_data)
-                
-                elif msg_type == MSG_PLAY_AGAIN:
-                    self.handle_play_again(conn)
-                
-                elif msg_type == MSG_DISCONNECT:
+                if not self.handle_frames(conn, addr, frames):
                     break
         
         except ConnectionResetError:
@@ -98,11 +153,154 @@ class GameServer:
         finally:
             self.disconnect_client(conn)
     
-    def handle_connect(self, conn, addr):
+    def handle_frames(self, conn, addr, frames):
+        """
+        Xử lý tất cả message nhận được trong một lần recv
+        Returns: False nếu client muốn ngắt kết nối
+        """
+        for payload in frames:
+            if not self.admit_message(conn):
+                if conn.kicked:
+                    return False
+                continue
+            msg_type, msg_data = Message.parse(payload)
+            if not self.handle_message(conn, addr, msg_type, msg_data) or conn.kicked:
+                return False
+        return True
+    
+    def admit_message(self, conn):
+        """
+        Trừ budget của client cho một message (trước khi parse)
+        Returns: False nếu message bị bỏ vì client gửi quá nhiều
+        """
+        conn.messages_received += 1
+        if conn.budget.take():
+            return True
+        
+        conn.messages_throttled += 1
+        throttled = conn.messages_throttled - conn.throttled_reported
+        if throttled > ServerConfig.CLIENT_KICK_THROTTLED and not conn.kicked:
+            conn.kicked = True
+            print(f"🚫 Client {conn.addr} is flooding ({conn.messages_received} messages, "
+                  f"{conn.messages_throttled} throttled), disconnecting")
+        return False
+    
+    def handle_message(self, conn, addr, msg_type, msg_data):
+        """
+        Điều phối một message đến handler tương ứng
+        Returns: False nếu client muốn ngắt kết nối
+        """
+        if msg_type == MSG_CONNECT:
+            self.handle_connect(conn, addr, msg_data)
+        
+        elif msg_type == MSG_AI_MODE:
+            self.handle_ai_mode(conn, addr, msg_data)
+        
+        elif msg_type == MSG_SPECTATE:
+            self.handle_spectate(conn, msg_data)
+        
+        elif msg_type == MSG_READY:
+            self.handle_ready(conn)
+        
+        elif msg_type == MSG_INPUT:
+            self.handle_input(conn, msg_data)
+        
+        elif msg_type in (MSG_ACK, MSG_KEYFRAME_REQUEST, MSG_UDP_DISABLE):
+            # Trạng thái gửi snapshot: game loop áp dụng (apply_connection_commands)
+            conn.post(msg_type, msg_data)
+        
+        elif msg_type == MSG_PLAY_AGAIN:
+            self.handle_play_again(conn)
+        
+        elif msg_type == MSG_DISCONNECT:
+            return False
+        
+        return True
+    
+    def handle_datagram(self, data, addr):
+        """Xử lý datagram UDP: hello mở kênh, sau đó chỉ nhận INPUT/ACK"""
+        # Datagram của client đã mở kênh tính vào budget của client đó (trước khi parse)
+        peer = self.udp_peers.get(addr)
+        if peer and not self.admit_message(peer):
+            return
+        msg_type, msg_data = Message.parse(data)
+        
+        if msg_type == MSG_UDP_HELLO:
+            # Hello hỏng/không có token: bỏ datagram, không để lỗi lên vòng nhận UDP
+            token = msg_data.get('token') if isinstance(msg_data, dict) else None
+            if not isinstance(token, int):
+                return
+            conn = self.udp_tokens.get(token)
+            if conn is None or conn not in self.clients:
+                return
+            conn.post(MSG_UDP_HELLO, addr)
+            return
+        
+        if peer and msg_type in (MSG_INPUT, MSG_ACK):
+            self.handle_message(peer, peer.addr, msg_type, msg_data)
+    
+    def offer_udp(self, conn):
+        """Cấp token UDP cho client (chỉ với CODEC_DELTA vì snapshot cần seq)"""
+        if not self.udp_enabled() or conn.codec != CODEC_DELTA:
+            return None
+        
+        token = secrets.randbits(32)
+        while token in self.udp_tokens:
+            token = secrets.randbits(32)
+        conn.udp_token = token
+        self.udp_tokens[token] = conn
+        return {'udp_port': self.udp_port, 'udp_token': token}
+    
+    def udp_enabled(self):
+        """Server có đang mở kênh UDP không"""
+        return self.udp_socket is not None
+    
+    def apply_connection_commands(self, conn):
+        """Áp dụng các lệnh đang chờ của kết nối (chỉ game loop gọi)"""
+        for command, data in conn.drain_commands():
+            if command == MSG_ACK:
+                seq = data.get('seq') if isinstance(data, dict) else None
+                if conn.delta and isinstance(seq, int):
+                    conn.delta.ack(seq)
+            elif command == MSG_KEYFRAME_REQUEST:
+                if conn.delta:
+                    conn.delta.request_keyframe()
+            elif command == MSG_UDP_HELLO:
+                self.enable_udp(conn, data)
+            elif command == MSG_UDP_DISABLE:
+                self.disable_udp(conn)
+    
+    def enable_udp(self, conn, addr):
+        """Gửi snapshot cho client này qua địa chỉ UDP vừa gửi hello"""
+        if conn.udp_token is None:
+            return  # Đã tắt UDP sau khi hello đến
+        if conn.udp_addr != addr:
+            self.udp_peers.pop(conn.udp_addr, None)
+            conn.udp_addr = addr
+            self.udp_peers[addr] = conn
+        # Client gửi hello cho đến khi nhận được xác nhận qua TCP
+        conn.send(Message.udp_ready())
+    
+    def disable_udp(self, conn):
+        """Quay về gửi snapshot qua TCP cho client này"""
+        self.udp_peers.pop(conn.udp_addr, None)
+        self.udp_tokens.pop(conn.udp_token, None)
+        conn.udp_addr = None
+        conn.udp_token = None
+    
+    def negotiate_codec(self, conn, data):
+        """Chọn codec cho GAME_STATE/INPUT theo yêu cầu của client (mặc định JSON)"""
+        codec = data.get('codec', CODEC_JSON)
+        conn.codec = codec if codec in SUPPORTED_CODECS else CODEC_JSON
+        conn.delta = DeltaEncoder() if conn.codec == CODEC_DELTA else None
+        return conn.codec
+    
+    def handle_connect(self, conn, addr, data):
         """Xử lý khi client connect (Multiplayer)"""
+        codec = self.negotiate_codec(conn, data)
         room_id, player_id, room_full = self.room_manager.find_or_create_room(conn, addr, ai_mode=False)
         
-        conn.send(Message.player_id(player_id))
+        conn.send(Message.player_id(player_id, codec, self.offer_udp(conn), ServerConfig.SIMULATION_RATE))
         
         if room_full:
             print(f"🎯 Room {room_id} is full! Starting game...")
@@ -118,11 +316,12 @@ class GameServer:
     def handle_ai_mode(self, conn, addr, data):
         """Xử lý khi client chọn AI mode"""
         difficulty = data.get('difficulty', 'medium')
+        codec = self.negotiate_codec(conn, data)
         room_id, player_id, room_full = self.room_manager.find_or_create_room(
             conn, addr, ai_mode=True, ai_difficulty=difficulty
         )
         
-        conn.send(Message.player_id(player_id))
+        conn.send(Message.player_id(player_id, codec, self.offer_udp(conn), ServerConfig.SIMULATION_RATE))
         print(f"🤖 AI Room {room_id} created with difficulty: {difficulty}")
         
         # AI room tự động full ngay
@@ -130,125 +329,313 @@ class GameServer:
             try: conn.send(Message.ready())
             except: pass
     
-    def handle_ready(self, conn):
-        """Xử lý khi player ready"""
-        player_id = self.room_manager.get_player_id(conn)
-        room = self.room_manager.get_room(conn)
+    def handle_spectate(self, conn, data):
+        """Xử lý khi client muốn xem một phòng"""
+        codec = self.negotiate_codec(conn, data)
+        conn.delta = None  # Spectator nhận keyframe chung, không delta riêng
+        
+        room = self.room_manager.add_spectator(
+            conn, data.get('room_id'), ServerConfig.MAX_SPECTATORS_PER_ROOM
+        )
+        conn.send(Message.spectating(room.room_id if room else None, codec))
         
         if room:
-            room.set_ready(player_id)
-            print(f"✓ Player {player_id} ready in room {room.room_id}")
+            print(f"👀 Spectator joined room {room.room_id} ({len(room.spectators)} watching)")
+    
+    def handle_ready(self, conn):
+        """Xử lý khi player ready (game loop áp dụng ở tick tới)"""
+        self.room_manager.post_command(conn, MSG_READY)
     
     def handle_input(self, conn, data):
-        """Xử lý input từ player"""
-        player_id = self.room_manager.get_player_id(conn)
-        room = self.room_manager.get_room(conn)
+        """Xử lý input từ player (ghi đè slot input, game loop đọc một lần mỗi tick)"""
+        message = parse_input(data)
+        if message is None:
+            self.reject_input(conn)
+            return
         
-        if room and room.active:
-            move_up = data.get('move_up', False)
-            move_down = data.get('move_down', False)
-            room.game_logic.set_paddle_input(player_id, move_up, move_down)
+        # Message cũ đến trễ qua UDP bị game loop bỏ (InputBuffer.poll so seq)
+        if self.room_manager.post_input(conn, message):
+            conn.inputs_overwritten += 1
+    
+    def reject_input(self, conn):
+        """Bỏ input sai định dạng, gửi quá nhiều thì ngắt kết nối như client gửi dồn"""
+        conn.inputs_malformed += 1
+        malformed = conn.inputs_malformed - conn.malformed_reported
+        if malformed > ServerConfig.CLIENT_KICK_MALFORMED and not conn.kicked:
+            conn.kicked = True
+            print(f"🚫 Client {conn.addr} sent {conn.inputs_malformed} malformed inputs, disconnecting")
     
     def handle_play_again(self, conn):
-        """Xử lý khi player muốn chơi lại (PvP)"""
+        """Xử lý khi player muốn chơi lại (game loop áp dụng ở tick tới)"""
+        self.room_manager.post_command(conn, MSG_PLAY_AGAIN)
+    
+    def apply_commands(self, room):
+        """Áp dụng các lệnh đang chờ của phòng (chỉ game loop gọi, ở đầu tick)"""
+        for command, player_id, data in room.drain_commands():
+            if command == MSG_READY:
+                self.apply_ready(room, player_id)
+            elif command == MSG_PLAY_AGAIN:
+                self.apply_play_again(room, player_id)
+            elif command == MSG_DISCONNECT:
+                self.room_manager.release_player(room, player_id)
+                if room.room_id not in self.room_manager.rooms:
+                    self.close_recorder(room)
+    
+    def apply_ready(self, room, player_id):
+        """Player ready"""
+        room.set_ready(player_id)
+        print(f"✓ Player {player_id} ready in room {room.room_id}")
+    
+    def apply_play_again(self, room, player_id):
+        """Player muốn chơi lại"""
         try:
-            room = self.room_manager.get_room(conn)
-            player_id = self.room_manager.get_player_id(conn)
-            
-            if not room or not player_id:
-                return
-
             # Kiểm tra chế độ chơi
             if room.ai_mode:
                 # Nếu là AI (client thường tự disconnect, nhưng nếu gửi msg thì ta xử lý luôn)
                 print(f"🤖 AI Room {room.room_id} restarting...")
                 room.restart_game()
-                conn.send(Message.restart())
+                for c in room.get_connections():
+                    try: c.send(Message.restart())
+                    except: pass
             else:
                 # Nếu là PvP (Người vs Người)
                 # Dùng hàm set_play_again của RoomManager để đếm số người đồng ý
                 if room.set_play_again(player_id):
                     # Nếu hàm trả về True -> Cả 2 người đã đồng ý -> Restart
                     restart_msg = Message.restart()
-                    for c in room.get_connections():
+                    for c in room.get_connections() + room.get_spectators():
                         try: c.send(restart_msg)
                         except: pass
                         
         except Exception as e:
-            print(f"❌ Error in handle_play_again: {e}")
+            print(f"❌ Error in apply_play_again: {e}")
 
     def disconnect_client(self, conn):
-        """Xử lý disconnect"""
-        # Kiểm tra xem conn còn trong danh sách không
-        if conn not in self.clients:
+        """Xử lý disconnect (gọi nhiều lần chỉ dọn một lần)"""
+        # Lấy conn ra khỏi danh sách; thread khác đã lấy trước thì thôi
+        with self.clients_lock:
+            addr = self.clients.pop(conn, None)
+        if addr is None:
             return
 
-        addr = self.clients[conn]
         print(f"👋 Client {addr} disconnected")
         
         # Báo cho đối thủ biết
         room = self.room_manager.get_room(conn)
         if room:
-            for c in room.get_connections():
+            for c in room.get_connections() + room.get_spectators():
                 if c != conn:
                     try: c.send(Message.disconnect())
                     except: pass
         
+        self.disable_udp(conn)
         self.room_manager.remove_player(conn)
-        del self.clients[conn]
         
         try: conn.close()
         except: pass
     
     def game_loop(self):
-        """Main game loop - chạy ở 60 FPS"""
-        target_fps = FPS
-        frame_time = 1.0 / target_fps
+        """Main game loop - tick cố định SIMULATION_RATE lần/giây (không trôi)"""
+        self.scheduler.start()
         
         while self.running:
-            start_time = time.time()
+            self.run_due_ticks()
             
-            # Update tất cả active rooms
-            active_rooms = self.room_manager.get_all_active_rooms()
-            
-            for room in active_rooms:
-                try:
-                    # Update AI nếu có
-                    if room.ai_mode:
-                        room.update_ai()
-                    
-                    # Update game logic (truyền dt nếu cần, hiện tại giữ nguyên logic cũ)
-                    room.game_logic.update()
-                    
-                    # Broadcast game state
-                    state = room.game_logic.get_state()
-                    state_msg = Message.game_state(state)
-                    
+            # Sleep đến tick kế tiếp
+            time.sleep(self.scheduler.time_until_next())
+    
+    def run_due_ticks(self):
+        """Chạy các tick đã đến hạn rồi gửi tiếp dữ liệu còn tồn"""
+        for tick in self.scheduler.due_ticks():
+            self.update_rooms(tick, self.scheduler.dt)
+        self.flush_connections()
+    
+    def update_rooms(self, tick, dt):
+        """Mô phỏng một tick cho tất cả active rooms, broadcast nếu đến lượt gửi"""
+        rooms = self.room_manager.rooms_to_tick()
+        broadcast_frame = self.is_send_tick(tick, self.broadcast_rate)
+        spectator_frame = self.is_send_tick(tick, self.spectator_rate)
+        
+        self.simulate_rooms(rooms, dt)
+        
+        for room in rooms:
+            if not room.active:
+                continue
+            try:
+                state = room.game_logic.get_state()
+                
+                # Broadcast game state (encode 1 lần cho mỗi codec, luôn gửi frame cuối)
+                if broadcast_frame or state.game_over:
+                    state_msgs = {}
                     for conn in room.get_connections():
-                        try: conn.send(state_msg)
+                        try: self.send_state(conn, state, state_msgs)
                         except: pass
-                    
-                    # Check game over
-                    if state.game_over:
-                        game_over_msg = Message.game_over(state.winner)
-                        for conn in room.get_connections():
-                            try: conn.send(game_over_msg)
-                            except: pass
-                        room.active = False
                 
-                except Exception as e:
-                    print(f"❌ Error in game loop for room {room.room_id}: {e}")
+                # Spectator nhận snapshot thưa hơn (và luôn nhận frame cuối)
+                if spectator_frame or state.game_over:
+                    self.broadcast_spectators(room, state)
+                
+                # Check game over
+                if state.game_over:
+                    game_over_msg = Message.game_over(state.winner)
+                    for conn in room.get_connections() + room.get_spectators():
+                        try: conn.send(game_over_msg)
+                        except: pass
+                    room.active = False
             
-            # Sleep để duy trì FPS
-            elapsed = time.time() - start_time
-            sleep_time = max(0, frame_time - elapsed)
-            time.sleep(sleep_time)
+            except Exception as e:
+                print(f"❌ Error in game loop for room {room.room_id}: {e}")
+    
+    def is_send_tick(self, tick, rate):
+        """
+        Tick này có gửi snapshot không: gửi khi tick * rate // SIMULATION_RATE tăng,
+        nên trung bình đúng rate lần/giây kể cả khi không chia hết (30 tick, 20 snapshot:
+        gửi ở tick 2, 3, 5, 6, ...) thay vì làm tròn khoảng cách thành 2 tick (15/giây)
+        """
+        simulation_rate = self.scheduler.rate
+        return tick * rate // simulation_rate != (tick - 1) * rate // simulation_rate
+    
+    def simulate_rooms(self, rooms, dt):
+        """
+        Xử lý lệnh chờ, update AI và vật lý một tick cho mỗi phòng
+        (song song trên room_pool nếu có; engine batch: AI và vật lý một lần cho mọi phòng)
+        """
+        if self.room_pool:
+            list(self.room_pool.map(lambda room: self.tick_room(room, dt), rooms))
+        else:
+            for room in rooms:
+                self.tick_room(room, dt)
+        
+        if self.batch:
+            active_rooms = [room for room in rooms if room.active]
+            ai_rooms = [room for room in active_rooms if room.ai_mode]
+            self.batch_ai.step(self.batch, [room.ai_player.slot for room in ai_rooms],
+                               [room.game_logic.slot for room in ai_rooms])
+            for room in active_rooms:
+                self.record_tick(room)
+            self.batch.step(dt, [room.game_logic.slot for room in active_rooms])
+    
+    def tick_room(self, room, dt):
+        """Một tick của một phòng: chỉ chạm vào trạng thái của phòng đó"""
+        try:
+            self.apply_commands(room)
+            if room.active:
+                room.apply_inputs()
+            # Engine batch: AI, ghi replay và vật lý chạy sau, một lần cho mọi phòng
+            if room.active and not self.batch:
+                if room.ai_mode:
+                    room.update_ai()
+                self.record_tick(room)
+                room.game_logic.update(dt)
+        except Exception as e:
+            print(f"❌ Error in game loop for room {room.room_id}: {e}")
+    
+    def record_tick(self, room):
+        """Ghi input của tick sắp mô phỏng vào replay của phòng (nếu bật)"""
+        if not self.replay_writer:
+            return
+        if room.recorder is None:
+            room.recorder = self.replay_writer.create_recorder(room.room_id, ServerConfig.SIMULATION_RATE)
+        room.recorder.record(room.game_logic)
+    
+    def close_recorder(self, room):
+        """Kết thúc file replay của phòng"""
+        if room.recorder:
+            room.recorder.close()
+            room.recorder = None
+    
+    def send_state(self, conn, state, cache):
+        """
+        Encode và gửi game state cho một connection
+        Delta phụ thuộc baseline riêng của từng client (qua UDP nếu đã mở),
+        các codec khác dùng chung cache
+        """
+        if conn.delta:
+            payload = conn.delta.encode(state)
+            udp_addr = conn.udp_addr  # Đọc một lần: disconnect ở thread khác có thể xóa
+            if udp_addr:
+                self.udp_send(payload, udp_addr)
+            else:
+                conn.send_snapshot(Message.frame(payload))
+            return
+        
+        state_msg = cache.get(conn.codec)
+        if state_msg is None:
+            state_msg = cache[conn.codec] = Message.game_state(state, conn.codec)
+        conn.send_snapshot(state_msg)
+    
+    def broadcast_spectators(self, room, state):
+        """
+        Gửi snapshot cho spectator: encode 1 lần cho mỗi codec,
+        mọi spectator dùng chung một buffer (không copy)
+        """
+        spectators = room.get_spectators()
+        if not spectators:
+            return
+        
+        room.spectator_seq += 1
+        frames = {}
+        for conn in spectators:
+            frame = frames.get(conn.codec)
+            if frame is None:
+                if conn.codec == CODEC_DELTA:
+                    frame = Message.frame(BinaryCodec.encode_keyframe(state, room.spectator_seq))
+                else:
+                    frame = Message.game_state(state, conn.codec)
+                frames[conn.codec] = frame
+            try: conn.send_snapshot(frame)
+            except: pass
+    
+    def flush_connections(self):
+        """
+        Áp dụng lệnh chờ của mỗi kết nối (ack, keyframe, UDP), gửi tiếp dữ liệu
+        còn tồn trong hàng đợi, ngắt các client bị kẹt
+        """
+        now = time.monotonic()
+        for conn in list(self.clients):
+            try:
+                self.apply_connection_commands(conn)
+            except Exception as e:
+                print(f"❌ Error applying commands for client {conn.addr}: {e}")
+            if conn.has_pending():
+                conn.flush()
+            if conn.kicked:
+                self.disconnect_client(conn)
+            elif conn.is_stuck(now):
+                print(f"🐢 Client {conn.addr} is not reading, disconnecting")
+                self.disconnect_client(conn)
+        
+        if now >= self.next_flood_report:
+            self.next_flood_report = now + ServerConfig.FLOOD_REPORT_INTERVAL
+            self.report_flooders()
+    
+    def report_flooders(self, limit=5):
+        """In các client bị throttle nhiều nhất kể từ lần báo cáo trước"""
+        flooders = [c for c in list(self.clients) if c.messages_throttled > c.throttled_reported
+                    or c.inputs_malformed > c.malformed_reported]
+        flooders.sort(key=lambda c: c.messages_throttled - c.throttled_reported, reverse=True)
+        for conn in flooders[:limit]:
+            print(f"🌊 Client {conn.addr}: {conn.messages_received} messages, "
+                  f"{conn.messages_throttled - conn.throttled_reported} throttled, "
+                  f"{conn.inputs_malformed - conn.malformed_reported} malformed inputs since last report, "
+                  f"{conn.inputs_overwritten} inputs overwritten")
+        for conn in flooders:
+            conn.throttled_reported = conn.messages_throttled
+            conn.malformed_reported = conn.inputs_malformed
     
     def stop(self):
         """Dừng server"""
         print("\n🛑 Shutting down server...")
         self.running = False
         
+        if self.room_pool:
+            self.room_pool.shutdown(wait=False)
+        
+        if self.replay_writer:
+            for room in list(self.room_manager.rooms.values()):
+                self.close_recorder(room)
+            self.replay_writer.close()
+        
         for conn in list(self.clients.keys()):
             try: conn.close()
             except: pass
@@ -257,6 +644,10 @@ class GameServer:
             try: self.server_socket.close()
             except: pass
         
+        if self.udp_socket:
+            try: self.udp_socket.close()
+            except: pass
+        
         print("✅ Server stopped")
 
 if __name__ == "__main__":
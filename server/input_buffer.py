@@ -0,0 +1,126 @@
+# server/input_buffer.py
+"""
+Dòng input của một player
+
+Client chỉ gửi input khi input đổi (kèm vài thay đổi trước đó phòng mất gói)
+và keepalive định kỳ; mỗi thay đổi ghi tick của client mà nó bắt đầu áp dụng.
+Server đi theo tick của client: mỗi tick server tiến một tick client và áp
+dụng input đang giữ ở tick đó, rồi gửi lại tick đã áp dụng trong snapshot
+(Paddle.input_seq): client lấy vị trí của server làm gốc và chạy lại các tick
+sau đó để dự đoán paddle của mình.
+
+Thread mạng không xếp hàng từng message: message input mới nhất ghi đè vào
+một slot, game loop đọc slot đúng một lần mỗi tick (client gửi dồn bao nhiêu
+thì mỗi tick cũng chỉ xử lý một message; các thay đổi gần nhất đã nằm sẵn
+trong message đó). Message được kiểm tra (parse_input) ngay ở thread mạng,
+message sai định dạng không bao giờ đến game loop.
+"""
+from collections import deque
+from server.config import ServerConfig
+
+MAX_CHANGES = 255  # Số thay đổi tối đa trong một message (giống giới hạn 1 byte của INPUT nhị phân)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_input(data):
+    """
+    Kiểm tra data của message INPUT (thread mạng gọi, trước khi đưa vào slot)
+    Returns: (seq, tick, [(tick, move_up, move_down), ...]), None nếu sai định dạng
+    """
+    if not isinstance(data, dict):
+        return None
+    seq = data.get('seq', 0)
+    tick = data.get('tick')
+    changes = data.get('changes', ())
+    if not (_is_int(seq) and _is_int(tick) and isinstance(changes, (list, tuple))):
+        return None
+    if len(changes) > MAX_CHANGES:
+        return None
+
+    parsed = []
+    for change in changes:
+        if not isinstance(change, (list, tuple)) or len(change) != 3:
+            return None
+        change_tick, move_up, move_down = change
+        if not (_is_int(change_tick) and isinstance(move_up, bool) and isinstance(move_down, bool)):
+            return None
+        parsed.append((change_tick, move_up, move_down))
+    return seq, tick, parsed
+
+
+class InputBuffer:
+    def __init__(self, max_lag=None):
+        """max_lag: server chậm hơn client quá số tick này thì nhảy lên (giới hạn độ trễ)"""
+        self.max_lag = max_lag or ServerConfig.INPUT_MAX_LAG_TICKS
+        self.slot = deque(maxlen=1)  # Message input mới nhất chưa đọc (append/popleft an toàn giữa thread)
+        self.changes = deque()  # (tick, move_up, move_down) chưa đến lượt, tick tăng dần
+        self.last_change = 0  # Tick của thay đổi mới nhất đã nhận (bỏ bản gửi lặp)
+        self.seq = 0  # Tick client đã áp dụng gần nhất (ack gửi cho client)
+        self.message_seq = 0  # seq của message mới nhất đã đọc (bỏ message cũ đến trễ qua UDP)
+        self.started = False
+        self.hold = 0  # Số tick phải đứng chờ vì server chạy trước client
+        self.move_up = False
+        self.move_down = False
+
+    def offer(self, message):
+        """
+        Thread mạng: ghi message input vào slot (đè message chưa đọc)
+        message: (seq, tick, changes) đã kiểm tra bằng parse_input
+        Returns: True nếu đã đè một message chưa được game loop đọc
+        """
+        overwritten = bool(self.slot)
+        self.slot.append(message)
+        return overwritten
+
+    def poll(self):
+        """Game loop, mỗi tick một lần: lấy message trong slot (nếu có) đưa vào dòng input"""
+        try:
+            seq, tick, changes = self.slot.popleft()
+        except IndexError:
+            return
+        if seq:
+            if seq <= self.message_seq:
+                return
+            self.message_seq = seq
+        self.push(tick, changes)
+
+    def push(self, tick, changes):
+        """
+        Thêm message input vừa nhận
+        tick: tick hiện tại của client lúc gửi
+        changes: [(tick, move_up, move_down), ...] cũ -> mới, có thể lặp lại thay đổi đã nhận
+        """
+        for change_tick, move_up, move_down in changes:
+            if change_tick > self.last_change:
+                self.changes.append((change_tick, move_up, move_down))
+                self.last_change = change_tick
+
+        if not self.started:
+            # Message đầu tiên: tick kế tiếp của server ứng với tick này của client
+            self.started = True
+            self.seq = tick - 1
+        elif tick <= self.seq:
+            # Message đến trễ hơn thường lệ: đứng chờ để tick sau của client
+            # không bị trễ nữa (không lùi lại vì ack không được giảm)
+            self.hold = max(self.hold, self.seq - tick + 1)
+        elif tick - self.seq > self.max_lag:
+            # Server chậm hơn client quá nhiều: bỏ qua các tick ở giữa
+            self.seq = tick - self.max_lag
+            self.hold = 0
+
+    def next(self):
+        """Input cho tick hiện tại: tiến một tick client, áp dụng thay đổi đã đến lượt"""
+        if not self.started:
+            return self.move_up, self.move_down
+        if self.hold:
+            self.hold -= 1
+        else:
+            self.seq += 1
+
+        changes = self.changes
+        while changes and changes[0][0] <= self.seq:
+            _, self.move_up, self.move_down = changes.popleft()
+        return self.move_up, self.move_down
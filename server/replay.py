@@ -0,0 +1,326 @@
+# server/replay.py
+"""
+Ghi và phát lại replay của một phòng
+
+File replay chỉ ghi thêm (append-only):
+    header | keyframe | input | input | ... | keyframe | input | ...
+- Input: 1 byte mỗi tick (bit 0-3: up1, down1, up2, down2)
+- Keyframe: byte TAG_KEYFRAME + state đầy đủ + vị trí RNG (seed của ván, số
+  word đã dùng - RoomRandom). Ghi replay không chạm vào RNG của phòng: cùng seed
+  thì ván đấu giống hệt nhau dù có ghi replay hay không
+- File <replay>.idx: (tick, offset) của mỗi keyframe để nhảy đến tick bất kỳ
+
+Tick thread chỉ gom bytes vào buffer, ReplayWriter ghi xuống đĩa trên thread nền.
+ReplayReader mmap file, tìm keyframe gần nhất rồi mô phỏng lại bằng GameLogic.
+
+    python -m server.replay replays/room1_20250101_120000.replay --tick 600
+"""
+import argparse
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from bisect import bisect_right
+from shared.constants import *
+from server.config import ServerConfig
+from server.game_logic import GameLogic, BRIGHT_COLORS
+
+MAGIC = b'PONGRPL1'
+VERSION = 2
+HEADER = struct.Struct('<8sHHId')  # magic, version, tick rate, room id, thời điểm tạo
+TAG_KEYFRAME = 0x80  # Byte input luôn < 0x80
+# tick, seed RNG, số word RNG đã dùng, ball x/y/vx/vy, paddle1 y, paddle2 y,
+# score1, score2, game_over, winner, màu
+KEYFRAME = struct.Struct('<IQQ6dBBBBB')
+INDEX_ENTRY = struct.Struct('<IQ')  # tick, offset của keyframe trong file replay
+
+INPUT_UP1 = 1
+INPUT_DOWN1 = 2
+INPUT_UP2 = 4
+INPUT_DOWN2 = 8
+
+
+def pack_input(state):
+    """Input của cả 2 paddle trong 1 byte"""
+    return ((INPUT_UP1 if state.paddle1.move_up else 0)
+            | (INPUT_DOWN1 if state.paddle1.move_down else 0)
+            | (INPUT_UP2 if state.paddle2.move_up else 0)
+            | (INPUT_DOWN2 if state.paddle2.move_down else 0))
+
+
+class ReplayWriter:
+    """Thread nền ghi replay xuống đĩa: tick thread chỉ đưa bytes vào hàng đợi"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="replay-writer", daemon=True)
+        self.thread.start()
+
+    def create_recorder(self, room_id, tick_rate):
+        """Recorder ghi vào file mới của phòng"""
+        name = f"room{room_id}_{time.strftime('%Y%m%d_%H%M%S')}.replay"
+        return ReplayRecorder(self, os.path.join(self.directory, name), room_id, tick_rate)
+
+    def submit(self, path, data, index, close=False):
+        """Đưa một đoạn dữ liệu (và index keyframe tương ứng) vào hàng đợi ghi"""
+        self.queue.put((path, data, index, close))
+
+    def run(self):
+        """Ghi mọi đoạn đang chờ rồi flush một lần"""
+        files = {}  # {path: (file replay, file index)}
+        running = True
+        while running:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in items:
+                if item is None:
+                    running = False
+                    continue
+                path, data, index, close = item
+                try:
+                    handles = files.get(path)
+                    if handles is None:
+                        handles = files[path] = (open(path, 'ab'), open(path + '.idx', 'ab'))
+                    # Dữ liệu trước, index sau: index không bao giờ trỏ ra ngoài file
+                    handles[0].write(data)
+                    handles[1].write(index)
+                    if close:
+                        for f in files.pop(path):
+                            f.close()
+                except OSError as e:
+                    print(f"❌ Error writing replay {path}: {e}")
+
+            for handles in files.values():
+                for f in handles:
+                    try: f.flush()
+                    except OSError: pass
+
+        for handles in files.values():
+            for f in handles:
+                try: f.close()
+                except OSError: pass
+
+    def close(self):
+        """Ghi nốt dữ liệu còn trong hàng đợi rồi dừng thread"""
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+
+class ReplayRecorder:
+    """Ghi replay của một phòng (chỉ game loop gọi)"""
+
+    def __init__(self, writer, path, room_id, tick_rate, keyframe_interval=None, flush_ticks=None):
+        """
+        keyframe_interval: số tick giữa hai keyframe (mặc định REPLAY_KEYFRAME_SECONDS)
+        flush_ticks: gom bao nhiêu tick rồi mới đưa cho writer
+        """
+        self.writer = writer
+        self.path = path
+        self.keyframe_interval = keyframe_interval or max(1, round(ServerConfig.REPLAY_KEYFRAME_SECONDS * tick_rate))
+        self.flush_ticks = flush_ticks or ServerConfig.REPLAY_FLUSH_TICKS
+        self.tick = 0  # Số tick đã ghi
+        self.offset = 0  # Số byte đã đưa cho writer
+        self.buffer = bytearray(HEADER.pack(MAGIC, VERSION, tick_rate, room_id, time.time()))
+        self.index = bytearray()
+        self.logic = None  # GameLogic của keyframe gần nhất (đổi khi chơi lại)
+        self.last_keyframe = 0
+        self.pending_ticks = 0
+
+    def record(self, logic):
+        """Ghi một tick, gọi ngay trước logic.update() (sau khi đã set input)"""
+        if logic is not self.logic or self.tick - self.last_keyframe >= self.keyframe_interval:
+            self.write_keyframe(logic)
+
+        self.buffer.append(pack_input(logic.get_state()))
+        self.tick += 1
+        self.pending_ticks += 1
+        if self.pending_ticks >= self.flush_ticks:
+            self.flush()
+
+    def write_keyframe(self, logic):
+        """Ghi toàn bộ state và vị trí RNG (chỉ đọc, không đổi RNG của phòng)"""
+        rng = logic.rng
+        state = logic.get_state()
+        ball = state.ball
+        self.index += INDEX_ENTRY.pack(self.tick, self.offset + len(self.buffer))
+        self.buffer.append(TAG_KEYFRAME)
+        self.buffer += KEYFRAME.pack(
+            self.tick, rng.initial_seed, rng.draws, ball.x, ball.y, ball.vx, ball.vy,
+            state.paddle1.y, state.paddle2.y, state.score1, state.score2,
+            state.game_over, state.winner or 0, BRIGHT_COLORS.index(ball.color)
+        )
+        self.logic = logic
+        self.last_keyframe = self.tick
+
+    def flush(self, close=False):
+        """Đưa dữ liệu đã gom cho writer"""
+        self.writer.submit(self.path, bytes(self.buffer), bytes(self.index), close)
+        self.offset += len(self.buffer)
+        self.buffer.clear()
+        self.index.clear()
+        self.pending_ticks = 0
+
+    def close(self):
+        """Kết thúc file replay"""
+        self.flush(close=True)
+        self.logic = None
+
+
+class ReplayReader:
+    """Đọc replay (mmap) và mô phỏng lại đến tick bất kỳ"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a replay file")
+
+        magic, version, self.tick_rate, self.room_id, self.created = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a replay file (version {VERSION})")
+        self.dt = 1.0 / self.tick_rate
+
+        self.index = self.load_index()
+        self.keyframe_ticks = [tick for tick, _ in self.index]
+        if not self.index:
+            raise ValueError(f"{path} has no keyframe")
+        self.total_ticks = self._count_ticks()
+
+    def load_index(self):
+        """Đọc file .idx (thiếu thì quét file replay để dựng lại)"""
+        try:
+            with open(self.path + '.idx', 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return self.scan_index()
+        raw = raw[:len(raw) - len(raw) % INDEX_ENTRY.size]  # Bỏ entry ghi dở
+        return [(tick, offset) for tick, offset in INDEX_ENTRY.iter_unpack(raw)
+                if offset + 1 + KEYFRAME.size <= len(self.data)]
+
+    def scan_index(self):
+        """Dựng index bằng cách đọc tuần tự toàn bộ file"""
+        index = []
+        data = self.data
+        pos = HEADER.size
+        while pos < len(data):
+            if data[pos] & TAG_KEYFRAME:
+                if pos + 1 + KEYFRAME.size > len(data):
+                    break
+                index.append((KEYFRAME.unpack_from(data, pos + 1)[0], pos))
+                pos += 1 + KEYFRAME.size
+            else:
+                pos += 1
+        return index
+
+    def _count_ticks(self):
+        """Tổng số tick: đi từ keyframe cuối trong index đến hết file"""
+        tick, pos = self.index[-1]
+        data = self.data
+        while pos < len(data):
+            if data[pos] & TAG_KEYFRAME:
+                if pos + 1 + KEYFRAME.size > len(data):
+                    break
+                tick = KEYFRAME.unpack_from(data, pos + 1)[0]
+                pos += 1 + KEYFRAME.size
+            else:
+                tick += 1
+                pos += 1
+        return tick
+
+    def load_keyframe(self, pos):
+        """GameLogic với state của keyframe tại offset pos"""
+        (tick, rng_seed, rng_draws, ball_x, ball_y, ball_vx, ball_vy, paddle1_y, paddle2_y,
+         score1, score2, game_over, winner, color) = KEYFRAME.unpack_from(self.data, pos + 1)
+        logic = GameLogic()
+        logic.rng.restore(rng_seed, rng_draws)
+        logic.ball_color = BRIGHT_COLORS[color]
+        state = logic.state
+        state.ball.x, state.ball.y = ball_x, ball_y
+        state.ball.vx, state.ball.vy = ball_vx, ball_vy
+        state.paddle1.y = paddle1_y
+        state.paddle2.y = paddle2_y
+        state.score1 = score1
+        state.score2 = score2
+        state.game_over = bool(game_over)
+        state.winner = winner or None
+        return tick, logic
+
+    def replay(self, start=0, stop=None):
+        """
+        Mô phỏng lại từ tick start
+        Yields: (tick, GameLogic) với state ngay trước khi mô phỏng tick đó
+        (GameLogic được dùng lại giữa các lần yield, copy nếu cần giữ)
+        """
+        stop = self.total_ticks if stop is None else min(stop, self.total_ticks)
+        if not 0 <= start <= stop:
+            raise ValueError(f"tick {start} is outside the replay (0..{self.total_ticks})")
+
+        # Keyframe gần nhất không sau start
+        i = max(0, bisect_right(self.keyframe_ticks, start) - 1)
+        data = self.data
+        pos = self.index[i][1]
+        tick = None
+        logic = None
+
+        while True:
+            # Keyframe: state mới (đến kỳ, hoặc ván mới sau khi chơi lại)
+            if pos < len(data) and data[pos] & TAG_KEYFRAME:
+                tick, logic = self.load_keyframe(pos)
+                pos += 1 + KEYFRAME.size
+                continue
+
+            if tick >= start:
+                yield tick, logic
+            if tick >= stop or pos >= len(data):
+                return
+
+            flags = data[pos]
+            logic.set_paddle_input(1, bool(flags & INPUT_UP1), bool(flags & INPUT_DOWN1))
+            logic.set_paddle_input(2, bool(flags & INPUT_UP2), bool(flags & INPUT_DOWN2))
+            logic.update(self.dt)
+            tick += 1
+            pos += 1
+
+    def state_at(self, tick):
+        """GameState ngay trước khi mô phỏng tick (tick = total_ticks: state cuối)"""
+        for _, logic in self.replay(tick, tick):
+            return logic.get_state()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xem state trong file replay")
+    parser.add_argument('path', help="File .replay")
+    parser.add_argument('--tick', type=int, default=None, help="Tick cần xem (mặc định: tick cuối)")
+    args = parser.parse_args()
+
+    reader = ReplayReader(args.path)
+    tick = reader.total_ticks if args.tick is None else args.tick
+    print(f"🎬 Room {reader.room_id} @ {reader.tick_rate} Hz, recorded "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.created))}")
+    print(f"   {reader.total_ticks} ticks, {len(reader.index)} keyframes")
+
+    state = reader.state_at(tick)
+    ball = state.ball
+    print(f"⏱️  Tick {tick}: score {state.score1}-{state.score2}"
+          f"{f' (winner: Player {state.winner})' if state.game_over else ''}")
+    print(f"   Ball ({ball.x:.2f}, {ball.y:.2f}) v=({ball.vx:.2f}, {ball.vy:.2f}) color {ball.color}")
+    print(f"   Paddle1 y={state.paddle1.y:.2f}  Paddle2 y={state.paddle2.y:.2f}")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,71 @@
 # server/room_manager.py
 """
 Quản lý phòng chơi và matchmaking
+
+Thread mạng không sửa trạng thái game trực tiếp: ready/play again/rời phòng
+được đưa vào hàng đợi lệnh của phòng, input được ghi đè vào slot của player;
+game loop xử lý cả hai ở đầu tick.
+Thành viên của RoomManager (phòng, map connection) được bảo vệ bằng lock.
 """
+import random
+import threading
+from collections import OrderedDict, deque
+from shared.constants import *
 from server.game_logic import GameLogic
 from server.ai_player import AIPlayer
+from server.input_buffer import InputBuffer
 
 class Room:
-    def __init__(self, room_id, ai_mode=False, ai_difficulty="medium"):
+    def __init__(self, room_id, ai_mode=False, ai_difficulty="medium", logic_factory=GameLogic,
+                 ai_factory=AIPlayer, on_active_change=None, seed=None):
+        """
+        seed: seed của phòng, sinh ra seed cho mỗi ván và cho AI (None: ngẫu nhiên)
+        ai_factory: tạo AI cho phòng AI mode (AIPlayer hoặc BatchAI.create_player)
+        on_active_change: callback(room) khi room.active đổi (RoomManager cập nhật index)
+        """
+        self.on_active_change = on_active_change
+        self._active = False
         self.room_id = room_id
+        self.seeds = random.Random(seed)
+        self.recorder = None  # ReplayRecorder nếu server ghi replay
         self.player1 = None
         self.player2 = None
-        self.game_logic = GameLogic()
+        self.logic_factory = logic_factory  # GameLogic hoặc BatchGameLogic.create_logic
+        self.game_logic = logic_factory(self.seeds.getrandbits(64))
         self.ready_count = 0
-        self.active = False
         self.play_again_count = 0
+        self.spectators = []  # Connections chỉ xem (copy-on-write, game loop đọc không cần khóa)
+        self.spectator_seq = 0  # Seq của keyframe gửi chung cho spectator
+        self.commands = deque()  # (command, player_id, data) chờ game loop xử lý
+        self.command_queued = False  # Đã nằm trong RoomManager.command_rooms chưa
+        self.pending_leaves = 0  # Lệnh rời phòng chưa được game loop xử lý (RoomManager.lock)
+        self.inputs = {}  # {player_id: InputBuffer} của các player người (copy-on-write)
         
         # AI Mode
         self.ai_mode = ai_mode
         self.ai_player = None
         if ai_mode:
-            self.ai_player = AIPlayer(difficulty=ai_difficulty)
+            self.ai_player = ai_factory(difficulty=ai_difficulty, seed=self.seeds.getrandbits(64))
             print(f"🤖 Room {room_id} created with AI ({ai_difficulty})")
     
+    @property
+    def active(self):
+        """Phòng đang chơi (được game loop update)"""
+        return self._active
+    
+    @active.setter
+    def active(self, value):
+        if value == self._active:
+            return
+        self._active = value
+        if self.on_active_change:
+            self.on_active_change(self)
+    
     def add_player(self, conn, addr):
         """Thêm player vào phòng"""
         if self.player1 is None:
             self.player1 = {'conn': conn, 'addr': addr, 'ready': False}
+            self.inputs = {**self.inputs, 1: InputBuffer()}
             
             # Nếu AI mode, tự động thêm AI làm player 2
             if self.ai_mode:
@@ -36,6 +76,7 @@ class Room:
             return 1
         elif self.player2 is None and not self.ai_mode:
             self.player2 = {'conn': conn, 'addr': addr, 'ready': False}
+            self.inputs = {**self.inputs, 2: InputBuffer()}
             return 2
         return None
     
@@ -45,6 +86,7 @@ class Room:
             self.player1 = None
         elif player_id == 2:
             self.player2 = None
+        self.inputs = {pid: inputs for pid, inputs in self.inputs.items() if pid != player_id}
         self.ready_count = 0
         self.active = False
     
@@ -57,6 +99,9 @@ class Room:
     
     def is_empty(self):
         """Kiểm tra phòng có rỗng không"""
+        if self.ai_mode:
+            # Slot của AI không tính là người chơi
+            return self.player1 is None
         return self.player1 is None and self.player2 is None
     
     def set_ready(self, player_id):
@@ -76,7 +121,7 @@ class Room:
     
     def restart_game(self):
         """Restart game cho chơi lại"""
-        self.game_logic = GameLogic()  # Tạo game logic mới
+        self.game_logic = self.logic_factory(self.seeds.getrandbits(64))  # Tạo game logic mới
         self.game_logic.reset_ball()
         self.play_again_count = 0
         self.active = True
@@ -102,6 +147,42 @@ class Room:
             conns.append(self.player2['conn'])
         return conns
     
+    def add_spectator(self, conn):
+        """Thêm spectator vào phòng"""
+        self.spectators = self.spectators + [conn]
+    
+    def remove_spectator(self, conn):
+        """Xóa spectator khỏi phòng"""
+        if conn in self.spectators:
+            self.spectators = [c for c in self.spectators if c is not conn]
+    
+    def get_spectators(self):
+        """Lấy tất cả spectator connections"""
+        return self.spectators
+    
+    def post(self, command, player_id, data=None):
+        """Đưa lệnh vào hàng đợi (thread mạng gọi, deque.append không cần khóa)"""
+        self.commands.append((command, player_id, data))
+    
+    def drain_commands(self):
+        """Lấy lần lượt các lệnh đang chờ (chỉ game loop gọi, ở đầu tick)"""
+        commands = self.commands
+        while commands:
+            yield commands.popleft()
+    
+    def apply_inputs(self):
+        """
+        Đọc slot input của mỗi player (một lần mỗi tick) và áp dụng cho tick này,
+        ghi kèm tick client để client đối chiếu
+        """
+        state = self.game_logic.state
+        for player_id, inputs in self.inputs.items():
+            inputs.poll()
+            move_up, move_down = inputs.next()
+            self.game_logic.set_paddle_input(player_id, move_up, move_down)
+            paddle = state.paddle1 if player_id == 1 else state.paddle2
+            paddle.input_seq = inputs.seq
+    
     def update_ai(self):
         """Update AI movement"""
         if self.ai_mode and self.ai_player and self.active:
@@ -110,40 +191,115 @@ class Room:
 
 
 class RoomManager:
-    def __init__(self):
+    def __init__(self, first_room_id=1, room_id_step=1, logic_factory=GameLogic, ai_factory=AIPlayer,
+                 seed=None):
+        """
+        first_room_id/room_id_step: khi chạy nhiều worker, mỗi worker cấp room ID
+        riêng (worker i: i+1, i+1+N, ...) để biết phòng thuộc worker nào
+        logic_factory: tạo game logic cho mỗi phòng
+        ai_factory: tạo AI cho phòng AI mode
+        seed: sinh seed cho từng phòng (cùng seed + cùng input -> cùng diễn biến)
+        """
+        self.logic_factory = logic_factory
+        self.ai_factory = ai_factory
+        self.seeds = random.Random(seed)
+        self.lock = threading.RLock()  # Thread mạng và game loop cùng sửa thành viên
         self.rooms = {}
-        self.next_room_id = 1
+        self.next_room_id = first_room_id
+        self.room_id_step = room_id_step
         self.player_room_map = {}  # {conn: (room_id, player_id)}
+        self.spectator_room_map = {}  # {conn: room_id}
+        # Index cập nhật dần để matchmaking và game loop không phải quét mọi phòng
+        self.open_rooms = OrderedDict()  # {room_id: room} phòng PvP còn chỗ, FIFO
+        self.active_rooms = {}  # {room_id: room} phòng đang chơi
+        self.command_rooms = deque()  # Phòng có lệnh chờ (kể cả phòng chưa chơi)
+    
+    def create_room(self, ai_mode=False, ai_difficulty="medium"):
+        """Tạo phòng mới với room ID kế tiếp"""
+        room_id = self.next_room_id
+        self.next_room_id += self.room_id_step
+        room = Room(room_id, ai_mode=ai_mode, ai_difficulty=ai_difficulty,
+                    logic_factory=self.logic_factory, ai_factory=self.ai_factory,
+                    on_active_change=self.update_active_index,
+                    seed=self.seeds.getrandbits(64))
+        self.rooms[room_id] = room
+        return room
+    
+    def update_active_index(self, room):
+        """Callback khi room.active đổi"""
+        with self.lock:
+            if room.active and room.room_id in self.rooms:
+                self.active_rooms[room.room_id] = room
+            else:
+                self.active_rooms.pop(room.room_id, None)
+    
+    def update_open_index(self, room):
+        """
+        Đưa phòng PvP còn chỗ vào cuối hàng đợi, bỏ phòng đã đầy
+        hoặc còn lệnh rời phòng chưa xử lý (player khác sắp rời đi)
+        """
+        if room.ai_mode or room.is_full() or room.pending_leaves or room.room_id not in self.rooms:
+            self.open_rooms.pop(room.room_id, None)
+        elif room.room_id not in self.open_rooms:
+            self.open_rooms[room.room_id] = room
     
     def find_or_create_room(self, conn, addr, ai_mode=False, ai_difficulty="medium"):
         """Tìm phòng available hoặc tạo phòng mới"""
+        with self.lock:
+            return self._find_or_create_room(conn, addr, ai_mode, ai_difficulty)
+    
+    def _find_or_create_room(self, conn, addr, ai_mode, ai_difficulty):
         # Nếu AI mode, luôn tạo phòng mới
         if ai_mode:
-            room_id = self.next_room_id
-            self.next_room_id += 1
-            room = Room(room_id, ai_mode=True, ai_difficulty=ai_difficulty)
+            room = self.create_room(ai_mode=True, ai_difficulty=ai_difficulty)
             player_id = room.add_player(conn, addr)
-            self.rooms[room_id] = room
-            self.player_room_map[conn] = (room_id, player_id)
-            return room_id, player_id, room.is_full()
+            self.player_room_map[conn] = (room.room_id, player_id)
+            return room.room_id, player_id, room.is_full()
         
-        # Multiplayer mode: tìm phòng chưa đầy
-        for room_id, room in self.rooms.items():
-            if not room.ai_mode and not room.is_full():
-                player_id = room.add_player(conn, addr)
-                if player_id:
-                    self.player_room_map[conn] = (room_id, player_id)
-                    return room_id, player_id, room.is_full()
+        # Multiplayer mode: lấy phòng chờ lâu nhất trong hàng đợi
+        if self.open_rooms:
+            room = next(iter(self.open_rooms.values()))
+            player_id = room.add_player(conn, addr)
+            self.update_open_index(room)
+            if player_id:
+                self.player_room_map[conn] = (room.room_id, player_id)
+                return room.room_id, player_id, room.is_full()
         
         # Tạo phòng multiplayer mới
-        room_id = self.next_room_id
-        self.next_room_id += 1
-        room = Room(room_id, ai_mode=False)
+        room = self.create_room()
         player_id = room.add_player(conn, addr)
-        self.rooms[room_id] = room
-        self.player_room_map[conn] = (room_id, player_id)
+        self.player_room_map[conn] = (room.room_id, player_id)
+        self.update_open_index(room)
         
-        return room_id, player_id, False
+        return room.room_id, player_id, False
+    
+    def add_spectator(self, conn, room_id=None, max_spectators=None):
+        """
+        Cho connection xem một phòng (room_id=None: chọn phòng đang chơi đầu tiên)
+        Returns: room, hoặc None nếu không có phòng phù hợp
+        """
+        with self.lock:
+            return self._add_spectator(conn, room_id, max_spectators)
+    
+    def _add_spectator(self, conn, room_id, max_spectators):
+        if room_id is not None:
+            room = self.rooms.get(room_id)
+        else:
+            room = next(iter(self.active_rooms.values()), None)
+        
+        if room is None:
+            return None
+        if max_spectators is not None and len(room.spectators) >= max_spectators:
+            return None
+        
+        room.add_spectator(conn)
+        self.spectator_room_map[conn] = room.room_id
+        return room
+    
+    def get_spectated_room(self, conn):
+        """Lấy room mà spectator đang xem"""
+        room_id = self.spectator_room_map.get(conn)
+        return self.rooms.get(room_id) if room_id is not None else None
     
     def get_room(self, conn):
         """Lấy room của connection"""
@@ -160,20 +316,91 @@ class RoomManager:
         return None
     
     def remove_player(self, conn):
-        """Xóa player khỏi phòng"""
-        if conn in self.player_room_map:
-            room_id, player_id = self.player_room_map[conn]
-            room = self.rooms.get(room_id)
+        """
+        Xóa player (hoặc spectator) khỏi phòng
+        Player được gỡ khỏi map ngay, còn slot trong phòng do game loop xóa
+        khi xử lý lệnh rời phòng (release_player)
+        """
+        with self.lock:
+            if conn in self.spectator_room_map:
+                room = self.get_spectated_room(conn)
+                if room:
+                    room.remove_spectator(conn)
+                del self.spectator_room_map[conn]
             
-            if room:
-                room.remove_player(player_id)
+            if conn in self.player_room_map:
+                room_id, player_id = self.player_room_map.pop(conn)
+                room = self.rooms.get(room_id)
                 
-                # Xóa phòng nếu rỗng
-                if room.is_empty():
-                    del self.rooms[room_id]
+                if room:
+                    # Không ghép người mới vào phòng cho đến khi game loop xóa xong slot
+                    room.pending_leaves += 1
+                    self.open_rooms.pop(room_id, None)
+                    self.queue_command(room, MSG_DISCONNECT, player_id)
+    
+    def release_player(self, room, player_id):
+        """Game loop xử lý lệnh rời phòng: xóa slot, xóa phòng nếu rỗng"""
+        with self.lock:
+            room.pending_leaves -= 1
+            room.remove_player(player_id)
+            
+            # Xóa phòng nếu rỗng
+            if room.is_empty() and room.room_id in self.rooms:
+                for spectator in room.spectators:
+                    self.spectator_room_map.pop(spectator, None)
+                del self.rooms[room.room_id]
+                self.active_rooms.pop(room.room_id, None)
             
-            del self.player_room_map[conn]
+            # Phòng PvP còn một người thì mở lại cho matchmaking
+            # (sau khi mọi lệnh rời phòng đang chờ đã được xử lý)
+            self.update_open_index(room)
+    
+    def post_command(self, conn, command, data=None):
+        """
+        Đưa lệnh của player vào hàng đợi phòng (thread mạng gọi)
+        Returns: False nếu connection không ở trong phòng nào
+        """
+        entry = self.player_room_map.get(conn)
+        room = self.rooms.get(entry[0]) if entry else None
+        if room is None:
+            return False
+        self.queue_command(room, command, entry[1], data)
+        return True
+    
+    def post_input(self, conn, message):
+        """
+        Ghi message input (đã kiểm tra bằng parse_input) vào slot của player
+        (thread mạng gọi, không qua hàng đợi lệnh)
+        Returns: True nếu đè message chưa được đọc, None nếu không ở trong phòng nào
+        """
+        entry = self.player_room_map.get(conn)
+        room = self.rooms.get(entry[0]) if entry else None
+        inputs = room.inputs.get(entry[1]) if room else None
+        if inputs is None:
+            return None
+        return inputs.offer(message)
+    
+    def queue_command(self, room, command, player_id, data=None):
+        """Đưa lệnh vào phòng và đánh dấu phòng cần xử lý ở tick tới"""
+        room.post(command, player_id, data)
+        if not room.command_queued:
+            room.command_queued = True
+            self.command_rooms.append(room)
+    
+    def rooms_to_tick(self):
+        """
+        Các phòng game loop cần xử lý tick này: phòng đang chơi và phòng có lệnh chờ
+        (cờ command_queued được xóa trước khi game loop lấy lệnh nên không mất lệnh)
+        """
+        with self.lock:
+            rooms = dict(self.active_rooms)
+        while self.command_rooms:
+            room = self.command_rooms.popleft()
+            room.command_queued = False
+            rooms.setdefault(room.room_id, room)
+        return list(rooms.values())
     
     def get_all_active_rooms(self):
         """Lấy tất cả phòng đang active"""
-        return [room for room in self.rooms.values() if room.active]
\ No newline at end of file
+        with self.lock:
+            return list(self.active_rooms.values())
\ No newline at end of file
@@ -0,0 +1,272 @@
+# server/sharded_server.py
+"""
+Chế độ nhiều process: N worker, mỗi worker là một AsyncGameServer giữ một phần
+các phòng và chạy game loop riêng (không chung GIL).
+Front acceptor nhận kết nối, đọc message đầu tiên để biết client muốn gì rồi
+chuyển socket sang worker phù hợp:
+- AI_MODE / SPECTATE không kèm phòng: chia đều (round-robin)
+- CONNECT (PvP): 2 người liên tiếp vào cùng một worker để được ghép phòng
+- SPECTATE kèm room_id: worker sở hữu phòng đó (room ID được chia theo worker)
+"""
+import asyncio
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import threading
+import time
+from multiprocessing import reduction
+from shared.constants import *
+from shared.protocol import Message, FrameDecoder
+from server.async_game_server import AsyncGameServer
+from server.room_manager import RoomManager
+from server.config import ServerConfig
+
+
+class ShardWorker(AsyncGameServer):
+    """Worker process: không tự listen TCP, nhận socket từ front acceptor qua pipe"""
+
+    def __init__(self, index, workers, channel, host='0.0.0.0', port=PORT):
+        super().__init__(host, port)
+        self.index = index
+        self.channel = channel
+        self.udp_port = port + 1 + index  # Mỗi worker một port UDP
+        self.room_manager = RoomManager(
+            first_room_id=index + 1, room_id_step=workers,
+            logic_factory=self.logic_factory, ai_factory=self.ai_factory,
+            seed=None if ServerConfig.SIMULATION_SEED is None else ServerConfig.SIMULATION_SEED + index
+        )
+
+    async def open_listeners(self):
+        """Chỉ mở UDP; kết nối TCP đến từ front acceptor"""
+        await self.open_udp()
+        threading.Thread(target=self.receive_handoffs, daemon=True).start()
+        print(f"🧩 Worker {self.index} ready (pid {os.getpid()}, UDP port {self.udp_port})")
+
+    def receive_handoffs(self):
+        """Thread nhận socket (fd + bytes đã đọc) từ front acceptor"""
+        front = multiprocessing.parent_process()
+        while True:
+            try:
+                if not self.channel.poll(1.0):
+                    # Front acceptor đã chết -> worker tự dừng
+                    if front is not None and not front.is_alive():
+                        break
+                    continue
+                fd = reduction.recv_handle(self.channel)
+                initial_data = self.channel.recv_bytes()
+            except (EOFError, OSError):
+                break
+            self.loop.call_soon_threadsafe(self.adopt, fd, initial_data)
+        self.loop.call_soon_threadsafe(self.shutdown)
+
+    def shutdown(self):
+        """Dừng game loop (chạy trên event loop)"""
+        self.running = False
+
+    def adopt(self, fd, initial_data):
+        """Nhận quản lý một kết nối đã được accept ở front acceptor"""
+        sock = socket.socket(fileno=fd)
+        sock.setblocking(False)
+        self.loop.create_task(self.handle_adopted(sock, initial_data))
+
+    async def handle_adopted(self, sock, initial_data):
+        reader, writer = await asyncio.open_connection(sock=sock)
+        await self.handle_stream(reader, writer, initial_data)
+
+
+def run_worker(index, workers, channel, host, port, config):
+    """
+    Entry point của worker process
+    config: ServerConfig.to_dict() của process cha. Với start method spawn/forkserver
+    worker import lại ServerConfig mặc định nên phải áp dụng lại giá trị từ dòng lệnh
+    """
+    ServerConfig.update(config)
+    worker = ShardWorker(index, workers, channel, host, port)
+    try:
+        worker.start()
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardedGameServer:
+    def __init__(self, host='0.0.0.0', port=PORT, workers=None):
+        self.host = host
+        self.port = port
+        self.worker_count = workers or ServerConfig.SHARD_WORKERS
+        self.server_socket = None
+        self.selector = None
+        self.running = False
+        self.workers = []  # [(process, channel)]
+        self.pending = {}  # {sock: [decoder, bytes đã đọc, thời điểm accept]}
+        self.next_worker = 0
+        self.waiting_pvp_worker = None  # Worker đang có người chờ ghép PvP
+
+    def start(self):
+        """Khởi động các worker rồi chạy front acceptor"""
+        if os.name != 'posix':
+            raise RuntimeError("Sharded mode requires a POSIX system (socket handoff)")
+
+        try:
+            config = ServerConfig.to_dict()
+            for index in range(self.worker_count):
+                parent_channel, child_channel = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=run_worker,
+                    args=(index, self.worker_count, child_channel, self.host, self.port, config),
+                    daemon=True
+                )
+                process.start()
+                self.workers.append((process, parent_channel))
+
+            # SIGTERM -> thoát accept loop để dừng các worker
+            signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'running', False))
+
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(ServerConfig.LISTEN_BACKLOG)
+            self.server_socket.setblocking(False)
+            self.running = True
+
+            print(f"🎮 Sharded server started on {self.host}:{self.port} with {self.worker_count} workers")
+            print("Waiting for players...")
+
+            self.accept_loop()
+
+        except Exception as e:
+            print(f"❌ Error starting server: {e}")
+        finally:
+            self.stop()
+
+    def accept_loop(self):
+        """Front acceptor: accept và đọc message đầu tiên của mỗi kết nối"""
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+
+        while self.running:
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.fileobj is self.server_socket:
+                    self.accept()
+                else:
+                    self.read_first_message(key.fileobj)
+            self.drop_idle()
+
+    def accept(self):
+        try:
+            sock, addr = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        self.pending[sock] = [FrameDecoder(), bytearray(), time.monotonic()]
+        self.selector.register(sock, selectors.EVENT_READ)
+
+    def read_first_message(self, sock):
+        decoder, received, _ = self.pending[sock]
+        try:
+            data = sock.recv(BUFFER_SIZE)
+            if not data:
+                self.drop(sock)
+                return
+            received += data
+            frames = decoder.feed(data)
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception:
+            self.drop(sock)
+            return
+
+        if not frames:
+            return
+
+        try:
+            msg_type, msg_data = Message.parse(frames[0])
+            if msg_data is None:
+                msg_data = {}
+            if not isinstance(msg_data, dict):
+                raise ValueError("message data must be an object")
+            worker = self.route(msg_type, msg_data)
+        except Exception:
+            # Message đầu tiên không hợp lệ: chỉ đóng kết nối này, không dừng acceptor
+            self.drop(sock)
+            return
+        self.selector.unregister(sock)
+        del self.pending[sock]
+        self.handoff(sock, worker, bytes(received))
+
+    def route(self, msg_type, msg_data):
+        """
+        Chọn worker cho kết nối dựa trên message đầu tiên
+        Raises: ValueError nếu room_id của SPECTATE không phải số nguyên
+        """
+        room_id = msg_data.get('room_id')
+        if msg_type == MSG_SPECTATE and room_id is not None:
+            if not isinstance(room_id, int) or isinstance(room_id, bool):
+                raise ValueError(f"invalid room_id: {room_id!r}")
+            # Room ID của worker i là i+1, i+1+N, ...
+            return (room_id - 1) % self.worker_count
+
+        if msg_type == MSG_CONNECT:
+            if self.waiting_pvp_worker is not None:
+                worker, self.waiting_pvp_worker = self.waiting_pvp_worker, None
+                return worker
+            self.waiting_pvp_worker = self.round_robin()
+            return self.waiting_pvp_worker
+
+        return self.round_robin()
+
+    def round_robin(self):
+        worker = self.next_worker
+        self.next_worker = (self.next_worker + 1) % self.worker_count
+        return worker
+
+    def handoff(self, sock, worker, initial_data):
+        """Chuyển socket (kèm bytes đã đọc) sang worker"""
+        process, channel = self.workers[worker]
+        try:
+            reduction.send_handle(channel, sock.fileno(), process.pid)
+            channel.send_bytes(initial_data)
+        except Exception as e:
+            print(f"❌ Error handing connection to worker {worker}: {e}")
+        finally:
+            sock.close()  # Worker giữ bản sao fd của riêng nó
+
+    def drop(self, sock):
+        """Đóng kết nối chưa được chuyển cho worker"""
+        try: self.selector.unregister(sock)
+        except: pass
+        self.pending.pop(sock, None)
+        try: sock.close()
+        except: pass
+
+    def drop_idle(self):
+        """Đóng các kết nối không gửi message đầu tiên đủ nhanh"""
+        now = time.monotonic()
+        for sock, (_, _, accepted) in list(self.pending.items()):
+            if now - accepted > ServerConfig.SHARD_HANDSHAKE_TIMEOUT:
+                self.drop(sock)
+
+    def stop(self):
+        """Dừng front acceptor và các worker"""
+        if not self.running and not self.workers:
+            return
+        print("\n🛑 Shutting down server...")
+        self.running = False
+
+        for sock in list(self.pending):
+            self.drop(sock)
+        if self.server_socket:
+            try: self.server_socket.close()
+            except: pass
+            self.server_socket = None
+
+        for process, channel in self.workers:
+            try: channel.close()
+            except: pass
+            process.terminate()
+        for process, _ in self.workers:
+            process.join(timeout=2)
+        self.workers = []
+
+        print("✅ Server stopped")
@@ -0,0 +1,59 @@
+# server/tick_scheduler.py
+"""
+Bộ lập lịch tick cố định (fixed timestep) dùng đồng hồ monotonic.
+Thời gian thực được cộng dồn vào accumulator, mỗi lần đủ dt thì chạy một tick,
+nên game loop không bị trôi dù sleep dậy sớm/muộn.
+"""
+import time
+from server.config import ServerConfig
+
+
+class TickScheduler:
+    def __init__(self, rate, max_catch_up=None, clock=time.monotonic):
+        """
+        rate: số tick mỗi giây
+        max_catch_up: số tick tối đa chạy bù trong một lần (server bị chậm
+            quá lâu thì bỏ phần thời gian còn lại thay vì chạy dồn mãi)
+        clock: hàm trả về thời gian monotonic (giây)
+        """
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_catch_up = max_catch_up or ServerConfig.MAX_CATCH_UP_TICKS
+        self.clock = clock
+        self.tick = 0  # Số tick đã chạy
+        self.ticks_skipped = 0  # Số tick bị bỏ do vượt giới hạn chạy bù
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def start(self):
+        """Bắt đầu đếm thời gian từ bây giờ"""
+        self.last_time = self.clock()
+        self.accumulator = 0.0
+
+    def due_ticks(self):
+        """
+        Các tick đến hạn kể từ lần gọi trước
+        Returns: range các số thứ tự tick cần chạy (có thể rỗng)
+        """
+        now = self.clock()
+        if self.last_time is None:
+            self.last_time = now
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        steps = int(self.accumulator // self.dt)
+        if steps > self.max_catch_up:
+            skipped = steps - self.max_catch_up
+            self.ticks_skipped += skipped
+            self.accumulator -= skipped * self.dt
+            steps = self.max_catch_up
+        self.accumulator -= steps * self.dt
+
+        first = self.tick + 1
+        self.tick += steps
+        return range(first, self.tick + 1)
+
+    def time_until_next(self):
+        """Số giây còn lại đến tick kế tiếp (dùng để sleep)"""
+        elapsed = self.clock() - self.last_time if self.last_time is not None else 0.0
+        return max(0.0, self.dt - self.accumulator - elapsed)
@@ -0,0 +1,291 @@
+# shared/codec.py
+"""
+Codec nhị phân cho các message gửi mỗi frame (GAME_STATE, INPUT).
+Payload JSON luôn bắt đầu bằng '{', payload nhị phân bắt đầu bằng 1 byte loại
+message nên hai định dạng có thể đi chung một stream.
+"""
+import struct
+import threading
+from shared.constants import *
+from shared.models import GameState
+
+# Byte đầu tiên của payload nhị phân
+BIN_GAME_STATE = 0x01
+BIN_INPUT = 0x02
+BIN_KEYFRAME = 0x03
+BIN_DELTA = 0x04
+BIN_ACK = 0x05
+BIN_KEYFRAME_REQUEST = 0x06
+BIN_UDP_HELLO = 0x07
+BINARY_TYPES = (BIN_GAME_STATE, BIN_INPUT, BIN_KEYFRAME, BIN_DELTA, BIN_ACK,
+                BIN_KEYFRAME_REQUEST, BIN_UDP_HELLO)
+
+# Các field của một snapshot, theo thứ tự:
+# ball x/y/vx/vy, paddle1 y, paddle2 y, score1, score2, flags,
+# seq input đã áp dụng của paddle1/paddle2 (client dự đoán paddle của mình)
+# Kích thước/vị trí x của paddle là hằng số nên không cần gửi
+FIELD_FORMATS = '6f3B2I'
+FIELD_CODES = 'ffffffBBBII'
+FIELD_COUNT = len(FIELD_CODES)
+FIELDS_STRUCT = struct.Struct('!' + FIELD_FORMATS)
+
+# type + fields
+STATE_STRUCT = struct.Struct('!B' + FIELD_FORMATS)
+# type, seq + fields
+KEYFRAME_STRUCT = struct.Struct('!BI' + FIELD_FORMATS)
+# type, seq, seq - base_seq, mask các field thay đổi (+ giá trị các field đó)
+DELTA_HEADER = struct.Struct('!BIBH')
+# type, seq
+ACK_STRUCT = struct.Struct('!BI')
+# type, seq, tick hiện tại của client, số thay đổi input đi kèm
+# (seq để server bỏ message cũ đến trễ qua UDP)
+INPUT_HEADER = struct.Struct('!BIIB')
+# Mỗi thay đổi input: tick bắt đầu áp dụng, flags
+INPUT_CHANGE_STRUCT = struct.Struct('!IB')
+# type, token (client chứng minh datagram UDP thuộc kết nối TCP nào)
+UDP_HELLO_STRUCT = struct.Struct('!BI')
+
+# Flags của GAME_STATE
+FLAG_GAME_OVER = 0x01
+WINNER_SHIFT = 1  # bit 1-2: winner (0 = chưa có)
+
+# Flags của INPUT
+FLAG_MOVE_UP = 0x01
+FLAG_MOVE_DOWN = 0x02
+
+MAX_DELTA_DISTANCE = 255  # seq - base_seq phải vừa 1 byte
+
+_delta_structs = {}  # mask -> struct của các field thay đổi
+
+
+def _delta_struct(mask):
+    """Struct cho các giá trị field có trong mask (cache theo mask)"""
+    values_struct = _delta_structs.get(mask)
+    if values_struct is None:
+        codes = ''.join(FIELD_CODES[i] for i in range(FIELD_COUNT) if mask & (1 << i))
+        values_struct = _delta_structs[mask] = struct.Struct('!' + codes)
+    return values_struct
+
+
+class BinaryCodec:
+    @staticmethod
+    def is_binary(payload):
+        """Kiểm tra payload có phải định dạng nhị phân không"""
+        return len(payload) > 0 and payload[0] in BINARY_TYPES
+
+    @staticmethod
+    def state_fields(state):
+        """GameState -> tuple các field được gửi đi"""
+        flags = (FLAG_GAME_OVER if state.game_over else 0) | ((state.winner or 0) << WINNER_SHIFT)
+        ball = state.ball
+        return (
+            ball.x, ball.y, ball.vx, ball.vy,
+            state.paddle1.y, state.paddle2.y,
+            state.score1, state.score2,
+            flags,
+            state.paddle1.input_seq, state.paddle2.input_seq
+        )
+
+    @staticmethod
+    def apply_fields(fields, state=None):
+        """
+        Tuple field -> GameState
+        Truyền state có sẵn để ghi đè tại chỗ (không cấp phát object mới)
+        """
+        (ball_x, ball_y, ball_vx, ball_vy, paddle1_y, paddle2_y,
+         score1, score2, flags, input_seq1, input_seq2) = fields
+
+        if state is None:
+            state = GameState()
+        ball = state.ball
+        ball.x = ball_x
+        ball.y = ball_y
+        ball.vx = ball_vx
+        ball.vy = ball_vy
+        state.paddle1.y = paddle1_y
+        state.paddle2.y = paddle2_y
+        state.paddle1.input_seq = input_seq1
+        state.paddle2.input_seq = input_seq2
+        state.score1 = score1
+        state.score2 = score2
+        state.game_over = bool(flags & FLAG_GAME_OVER)
+        state.winner = (flags >> WINNER_SHIFT) or None
+        return state
+
+    @staticmethod
+    def encode_state(state):
+        """GameState -> bytes (36 bytes)"""
+        return STATE_STRUCT.pack(BIN_GAME_STATE, *BinaryCodec.state_fields(state))
+
+    @staticmethod
+    def decode_state(payload, state=None):
+        """bytes -> GameState (ghi đè vào state nếu được truyền vào)"""
+        return BinaryCodec.apply_fields(FIELDS_STRUCT.unpack_from(payload, 1), state)
+
+    @staticmethod
+    def encode_keyframe(state, seq):
+        """GameState -> keyframe có seq (dùng chung cho nhiều client, không cần ack)"""
+        return KEYFRAME_STRUCT.pack(BIN_KEYFRAME, seq, *BinaryCodec.state_fields(state))
+
+    @staticmethod
+    def encode_input(changes, tick, seq=0):
+        """
+        Các thay đổi input gần nhất [(tick, move_up, move_down), ...] -> bytes
+        (10 bytes + 5 bytes mỗi thay đổi)
+        """
+        parts = [INPUT_HEADER.pack(BIN_INPUT, seq, tick, len(changes))]
+        for change_tick, move_up, move_down in changes:
+            flags = (FLAG_MOVE_UP if move_up else 0) | (FLAG_MOVE_DOWN if move_down else 0)
+            parts.append(INPUT_CHANGE_STRUCT.pack(change_tick, flags))
+        return b''.join(parts)
+
+    @staticmethod
+    def decode_input(payload):
+        """bytes -> dict giống data của INPUT dạng JSON"""
+        _, seq, tick, count = INPUT_HEADER.unpack_from(payload)
+        changes = []
+        for i in range(count):
+            change_tick, flags = INPUT_CHANGE_STRUCT.unpack_from(
+                payload, INPUT_HEADER.size + i * INPUT_CHANGE_STRUCT.size
+            )
+            changes.append((change_tick, bool(flags & FLAG_MOVE_UP), bool(flags & FLAG_MOVE_DOWN)))
+        return {'seq': seq, 'tick': tick, 'changes': changes}
+
+    @staticmethod
+    def encode_ack(seq):
+        """Client báo đã nhận snapshot seq"""
+        return ACK_STRUCT.pack(BIN_ACK, seq)
+
+    @staticmethod
+    def encode_keyframe_request():
+        """Client xin keyframe (mất baseline)"""
+        return bytes((BIN_KEYFRAME_REQUEST,))
+
+    @staticmethod
+    def encode_udp_hello(token):
+        """Client mở kênh UDP"""
+        return UDP_HELLO_STRUCT.pack(BIN_UDP_HELLO, token)
+
+    @staticmethod
+    def decode(payload):
+        """Parse payload nhị phân, trả về (msg_type, data) như Message.parse"""
+        kind = payload[0]
+        if kind == BIN_GAME_STATE:
+            return MSG_GAME_STATE, BinaryCodec.decode_state(payload)
+        if kind == BIN_INPUT:
+            return MSG_INPUT, BinaryCodec.decode_input(payload)
+        if kind in (BIN_KEYFRAME, BIN_DELTA):
+            # Cần DeltaDecoder của client để giải mã
+            return MSG_SNAPSHOT, payload
+        if kind == BIN_ACK:
+            return MSG_ACK, {'seq': ACK_STRUCT.unpack(payload)[1]}
+        if kind == BIN_KEYFRAME_REQUEST:
+            return MSG_KEYFRAME_REQUEST, {}
+        if kind == BIN_UDP_HELLO:
+            return MSG_UDP_HELLO, {'token': UDP_HELLO_STRUCT.unpack(payload)[1]}
+        return None, None
+
+
+class DeltaEncoder:
+    """
+    Phía server, mỗi client một encoder: gửi snapshot dạng delta so với
+    snapshot gần nhất mà client đã ack, kèm keyframe định kỳ / khi được yêu cầu
+    """
+    def __init__(self, keyframe_interval=SNAPSHOT_KEYFRAME_INTERVAL, history=SNAPSHOT_HISTORY):
+        self.keyframe_interval = keyframe_interval
+        self.history = history
+        self.seq = 0
+        self.sent = {}  # {seq: fields} các snapshot đã gửi nhưng chưa ack
+        self.baseline = None  # (seq, fields) snapshot client đã ack gần nhất, đổi cả cặp một lần
+        self.since_keyframe = 0
+        self.force_keyframe = True
+        self.lock = threading.Lock()  # Game loop encode, thread mạng ack
+
+    def encode(self, state):
+        """GameState -> payload keyframe hoặc delta"""
+        fields = BinaryCodec.state_fields(state)
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+
+            self.sent[seq] = fields
+            if len(self.sent) > self.history:
+                del self.sent[next(iter(self.sent))]
+
+            # Đọc baseline đúng một lần: delta và khoảng cách seq cùng một snapshot gốc
+            baseline = self.baseline
+            self.since_keyframe += 1
+            if (self.force_keyframe or baseline is None or
+                    self.since_keyframe >= self.keyframe_interval or
+                    seq - baseline[0] > MAX_DELTA_DISTANCE):
+                self.force_keyframe = False
+                self.since_keyframe = 0
+                return KEYFRAME_STRUCT.pack(BIN_KEYFRAME, seq, *fields)
+
+        base_seq, base = baseline
+        mask = 0
+        changed = []
+        for i in range(FIELD_COUNT):
+            if fields[i] != base[i]:
+                mask |= 1 << i
+                changed.append(fields[i])
+
+        header = DELTA_HEADER.pack(BIN_DELTA, seq, seq - base_seq, mask)
+        return header + _delta_struct(mask).pack(*changed)
+
+    def ack(self, seq):
+        """Client đã nhận snapshot seq -> dùng làm baseline mới"""
+        with self.lock:
+            fields = self.sent.get(seq)
+            if fields is None or (self.baseline is not None and seq <= self.baseline[0]):
+                return
+            self.baseline = (seq, fields)
+
+            # Bỏ các snapshot cũ hơn baseline
+            for old_seq in [s for s in self.sent if s < seq]:
+                del self.sent[old_seq]
+
+    def request_keyframe(self):
+        """Gửi keyframe ở snapshot kế tiếp"""
+        self.force_keyframe = True
+
+
+class DeltaDecoder:
+    """Phía client: dựng lại snapshot từ keyframe/delta"""
+    def __init__(self, history=SNAPSHOT_HISTORY):
+        self.history = history
+        self.received = {}  # {seq: fields}
+        self.latest_seq = 0
+
+    def is_stale(self, payload):
+        """Snapshot cũ hơn snapshot mới nhất đã nhận (UDP đến sai thứ tự)"""
+        return ACK_STRUCT.unpack_from(payload)[1] <= self.latest_seq
+
+    def decode(self, payload):
+        """
+        Giải mã keyframe/delta
+        Returns: (seq, fields), hoặc (None, None) nếu không có baseline
+        """
+        if payload[0] == BIN_KEYFRAME:
+            unpacked = KEYFRAME_STRUCT.unpack(payload)
+            seq, fields = unpacked[1], unpacked[2:]
+        else:
+            _, seq, distance, mask = DELTA_HEADER.unpack_from(payload)
+            base = self.received.get(seq - distance)
+            if base is None:
+                return None, None
+
+            values = _delta_struct(mask).unpack_from(payload, DELTA_HEADER.size)
+            fields = list(base)
+            j = 0
+            for i in range(FIELD_COUNT):
+                if mask & (1 << i):
+                    fields[i] = values[j]
+                    j += 1
+            fields = tuple(fields)
+
+        self.received[seq] = fields
+        if len(self.received) > self.history:
+            del self.received[next(iter(self.received))]
+        self.latest_seq = max(self.latest_seq, seq)
+        return seq, fields
@@ -7,6 +7,38 @@ Hằng số dùng chung cho cả client và server
 HOST = 'localhost'
 PORT = 5555
 BUFFER_SIZE = 4096
+FRAME_HEADER_SIZE = 4  # Độ dài payload (uint32, big-endian) đứng trước mỗi message
+MAX_FRAME_SIZE = 64 * 1024
+
+# Codec cho GAME_STATE/INPUT (thỏa thuận trong CONNECT/AI_MODE)
+CODEC_JSON = "json"
+CODEC_BINARY = "binary"
+CODEC_DELTA = "delta"  # Nhị phân + delta so với snapshot client đã ack
+SUPPORTED_CODECS = (CODEC_JSON, CODEC_BINARY, CODEC_DELTA)
+DEFAULT_CODEC = CODEC_DELTA
+
+# Kênh UDP cho GAME_STATE/INPUT (chỉ dùng với CODEC_DELTA)
+UDP_HELLO_INTERVAL = 0.2  # Gửi lại hello mỗi 0.2s cho đến khi server xác nhận
+UDP_HANDSHAKE_TIMEOUT = 2.0  # Quá thời gian này thì dùng TCP
+UDP_FALLBACK_TIMEOUT = 3.0  # Đang chơi mà không nhận được UDP -> quay về TCP
+MAX_DATAGRAM_SIZE = 1400
+
+# Delta snapshot
+SNAPSHOT_KEYFRAME_INTERVAL = 60  # Gửi keyframe đầy đủ mỗi 60 snapshot
+SNAPSHOT_HISTORY = 64  # Số snapshot giữ lại để làm baseline
+
+# Client: nội suy snapshot (vẽ mượt với mọi tần số gửi của server)
+INTERPOLATION_DELAY = 0.1  # Vẽ trễ 100ms so với hiện tại (đủ 2 snapshot ở 20 Hz)
+MAX_EXTRAPOLATION = 0.1  # Snapshot đến trễ: ngoại suy bóng tối đa 100ms
+SNAPSHOT_BUFFER_SIZE = 32  # Số snapshot giữ lại để nội suy
+
+# Client: dự đoán paddle của mình (không chờ RTT)
+PREDICTION_HISTORY = 120  # Input chưa được server ack giữ tối đa (2s ở 60 tick/s)
+MAX_PREDICTION_CATCH_UP = 60  # Vòng lặp bị chậm: chạy bù tối đa 1s (tick client khớp nhịp server)
+
+# Client: chỉ gửi INPUT khi input đổi, cộng keepalive định kỳ
+INPUT_KEEPALIVE_INTERVAL = 0.25  # Input không đổi: vẫn gửi lại 4 lần/giây
+INPUT_REDUNDANCY = 3  # Mỗi message kèm 3 thay đổi input gần nhất (chịu được mất gói)
 
 # Screen
 SCREEN_WIDTH = 800
@@ -36,6 +68,11 @@ WINNING_SCORE = 5
 NET_WIDTH = 5
 FONT_SIZE = 48
 SMALL_FONT_SIZE = 24
+TEXT_CACHE_SIZE = 256  # Số text surface render sẵn giữ lại (client)
+MENU_KEY_REPEAT_DELAY = 300  # ms giữ phím trước khi menu tự chuyển dòng
+MENU_KEY_REPEAT_INTERVAL = 150  # ms giữa hai lần tự chuyển dòng khi giữ phím
+UI_IDLE_TIMEOUT = 250  # ms ngủ tối đa chờ event ở menu / màn hình chờ (vẫn kiểm tra mạng)
+WAITING_DOTS_INTERVAL = 500  # ms mỗi frame của dấu chấm động ở màn hình chờ
 
 # Message Types
 MSG_CONNECT = "CONNECT"
@@ -49,10 +86,19 @@ MSG_PLAYER_ID = "PLAYER_ID"
 MSG_PLAY_AGAIN = "PLAY_AGAIN"
 MSG_RESTART = "RESTART"
 MSG_AI_MODE = "AI_MODE"
+MSG_SNAPSHOT = "SNAPSHOT"  # Keyframe/delta nhị phân
+MSG_ACK = "ACK"
+MSG_KEYFRAME_REQUEST = "KEYFRAME_REQUEST"
+MSG_UDP_HELLO = "UDP_HELLO"
+MSG_UDP_READY = "UDP_READY"
+MSG_UDP_DISABLE = "UDP_DISABLE"
+MSG_SPECTATE = "SPECTATE"  # Client xin xem một phòng
+MSG_SPECTATING = "SPECTATING"  # Server trả về phòng đang xem (None nếu không có)
 
 # UI Text
 TEXT_WIN = "WIN!"
 TEXT_LOSE = "LOSE!"
+TEXT_GAME_OVER = "GAME OVER"
 TEXT_WINNER_ANNO = "Player {} Wins!"
 TEXT_PLAY_AGAIN = "Play Again"
 TEXT_MAIN_MENU = "Main Menu"
@@ -37,13 +37,15 @@ class Paddle:
         self.speed = PADDLE_SPEED
         self.move_up = False
         self.move_down = False
+        self.input_seq = 0  # Seq của input server đã áp dụng gần nhất (client đối chiếu dự đoán)
     
     def to_dict(self):
         return {
             'x': self.x,
             'y': self.y,
             'width': self.width,
-            'height': self.height
+            'height': self.height,
+            'input_seq': self.input_seq
         }
     
     @staticmethod
@@ -51,6 +53,7 @@ class Paddle:
         paddle = Paddle(data['x'], data['y'])
         paddle.width = data['width']
         paddle.height = data['height']
+        paddle.input_seq = data.get('input_seq', 0)
         return paddle
 
 
@@ -0,0 +1,25 @@
+# shared/physics.py
+"""
+Luật di chuyển dùng chung cho server (GameLogic) và client (dự đoán paddle).
+Hai bên phải tính giống hệt nhau (cùng thứ tự phép tính) thì dự đoán mới khớp.
+"""
+from shared.constants import *
+
+PADDLE_MAX_Y = SCREEN_HEIGHT - PADDLE_HEIGHT
+
+
+def move_paddle(y, move_up, move_down, speed=PADDLE_SPEED, scale=1.0):
+    """
+    Vị trí mới của paddle sau một bước dài scale frame (trừ rồi mới cộng)
+    Returns: y đã giới hạn trong màn hình
+    """
+    if move_up:
+        y -= speed * scale
+    if move_down:
+        y += speed * scale
+    return max(0, min(PADDLE_MAX_Y, y))
+
+
+def tick_scale(tick_rate):
+    """Số frame (ở FPS) của một tick, giống dt * FPS trong GameLogic.update"""
+    return (1.0 / tick_rate) * FPS
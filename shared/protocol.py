@@ -3,31 +3,114 @@
 Protocol giao tiếp giữa client và server
 """
 import json
+import struct
 from shared.constants import *
+from shared.codec import BinaryCodec
+
+FRAME_HEADER = struct.Struct('!I')
+
+
+class ProtocolError(Exception):
+    """Dữ liệu nhận được không đúng định dạng frame"""
+
+
+class FrameDecoder:
+    """
+    Tách stream TCP thành các frame [độ dài uint32][payload].
+    Dữ liệu nhận được ghi thẳng vào một bytearray cấp phát sẵn; mỗi lần recv
+    trả về tất cả frame đầy đủ đang có, phần thừa được giữ lại cho lần sau.
+    """
+    def __init__(self, capacity=FRAME_HEADER_SIZE + MAX_FRAME_SIZE + BUFFER_SIZE):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Đầu phần dữ liệu chưa xử lý
+        self.end = 0    # Cuối phần dữ liệu đã nhận
+    
+    def _reserve(self, size):
+        """Đảm bảo còn ít nhất size byte trống ở cuối buffer"""
+        if len(self.buffer) - self.end >= size:
+            return
+        
+        # Dồn phần dữ liệu còn dở về đầu buffer
+        pending = self.end - self.start
+        self.buffer[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+        
+        if len(self.buffer) - self.end < size:
+            raise ProtocolError("Frame buffer overflow")
+    
+    def feed(self, data):
+        """Thêm dữ liệu đã nhận, trả về list payload của các frame đầy đủ"""
+        size = len(data)
+        self._reserve(size)
+        self.buffer[self.end:self.end + size] = data
+        self.end += size
+        return self.drain()
+    
+    def recv_into(self, sock, size=BUFFER_SIZE):
+        """
+        Đọc từ socket thẳng vào buffer (không tạo bytes trung gian)
+        Returns: list payload, hoặc None nếu phía bên kia đã đóng kết nối
+        """
+        self._reserve(size)
+        received = sock.recv_into(self.view[self.end:self.end + size])
+        if not received:
+            return None
+        self.end += received
+        return self.drain()
+    
+    def drain(self):
+        """Lấy ra tất cả frame đầy đủ trong buffer"""
+        frames = []
+        while self.end - self.start >= FRAME_HEADER_SIZE:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame too large: {length} bytes")
+            
+            payload_start = self.start + FRAME_HEADER_SIZE
+            payload_end = payload_start + length
+            if payload_end > self.end:
+                break
+            
+            frames.append(bytes(self.view[payload_start:payload_end]))
+            self.start = payload_end
+        
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frames
+
 
 class Message:
+    @staticmethod
+    def frame(payload):
+        """Gắn header độ dài vào payload"""
+        return FRAME_HEADER.pack(len(payload)) + payload
+    
     @staticmethod
     def create(msg_type, data=None):
-        """Tạo message để gửi"""
+        """Tạo message để gửi (đã đóng frame)"""
         message = {
             'type': msg_type,
             'data': data or {}
         }
-        return json.dumps(message).encode('utf-8')
+        return Message.frame(json.dumps(message).encode('utf-8'))
     
     @staticmethod
     def parse(raw_data):
-        """Parse message nhận được"""
+        """Parse payload của một frame nhận được (JSON hoặc nhị phân)"""
         try:
+            if BinaryCodec.is_binary(raw_data):
+                return BinaryCodec.decode(raw_data)
             message = json.loads(raw_data.decode('utf-8'))
             return message['type'], message.get('data', {})
         except:
             return None, None
     
     @staticmethod
-    def connect():
-        """Client gửi yêu cầu kết nối"""
-        return Message.create(MSG_CONNECT)
+    def connect(codec=CODEC_JSON):
+        """Client gửi yêu cầu kết nối (kèm codec muốn dùng)"""
+        return Message.create(MSG_CONNECT, {'codec': codec})
     
     @staticmethod
     def ready():
@@ -35,18 +118,48 @@ class Message:
         return Message.create(MSG_READY)
     
     @staticmethod
-    def game_state(state):
+    def game_state(state, codec=CODEC_JSON):
         """Server gửi game state"""
+        if codec != CODEC_JSON:
+            return Message.frame(BinaryCodec.encode_state(state))
         return Message.create(MSG_GAME_STATE, state.to_dict())
     
     @staticmethod
-    def input_data(move_up, move_down):
-        """Client gửi input"""
+    def input_data(changes, tick, codec=CODEC_JSON, seq=0):
+        """
+        Client gửi input: chỉ khi input đổi (kèm vài thay đổi trước đó phòng
+        mất gói) và keepalive định kỳ
+        changes: [(tick bắt đầu áp dụng, move_up, move_down), ...] cũ -> mới
+        tick: tick hiện tại của client
+        """
+        if codec != CODEC_JSON:
+            return Message.frame(BinaryCodec.encode_input(changes, tick, seq))
         return Message.create(MSG_INPUT, {
-            'move_up': move_up,
-            'move_down': move_down
+            'seq': seq,
+            'tick': tick,
+            'changes': [list(change) for change in changes]
         })
     
+    @staticmethod
+    def ack(seq):
+        """Client ack snapshot đã nhận"""
+        return Message.frame(BinaryCodec.encode_ack(seq))
+    
+    @staticmethod
+    def keyframe_request():
+        """Client xin keyframe"""
+        return Message.frame(BinaryCodec.encode_keyframe_request())
+    
+    @staticmethod
+    def udp_ready():
+        """Server xác nhận đã nhận được UDP hello"""
+        return Message.create(MSG_UDP_READY)
+    
+    @staticmethod
+    def udp_disable():
+        """Client không nhận được UDP, yêu cầu gửi lại qua TCP"""
+        return Message.create(MSG_UDP_DISABLE)
+    
     @staticmethod
     def disconnect():
         """Thông báo disconnect"""
@@ -58,9 +171,17 @@ class Message:
         return Message.create(MSG_WAIT, {'message': 'Waiting for another player...'})
     
     @staticmethod
-    def player_id(player_id):
-        """Server gửi player ID"""
-        return Message.create(MSG_PLAYER_ID, {'id': player_id})
+    def player_id(player_id, codec=CODEC_JSON, udp=None, tick_rate=None):
+        """
+        Server gửi player ID (kèm codec đã chọn, thông tin kênh UDP nếu có
+        và số tick/giây để client dự đoán paddle đúng nhịp server)
+        """
+        data = {'id': player_id, 'codec': codec}
+        if tick_rate:
+            data['tick_rate'] = tick_rate
+        if udp:
+            data.update(udp)
+        return Message.create(MSG_PLAYER_ID, data)
     
     @staticmethod
     def game_over(winner):
@@ -78,6 +199,16 @@ class Message:
         return Message.create(MSG_RESTART)
     
     @staticmethod
-    def ai_mode(difficulty="medium"):
+    def spectate(room_id=None, codec=CODEC_JSON):
+        """Client xin xem một phòng (None = phòng bất kỳ đang chơi)"""
+        return Message.create(MSG_SPECTATE, {'room_id': room_id, 'codec': codec})
+    
+    @staticmethod
+    def spectating(room_id, codec=CODEC_JSON):
+        """Server báo phòng client đang xem"""
+        return Message.create(MSG_SPECTATING, {'room_id': room_id, 'codec': codec})
+    
+    @staticmethod
+    def ai_mode(difficulty="medium", codec=CODEC_JSON):
         """Client yêu cầu chơi với AI"""
-        return Message.create(MSG_AI_MODE, {'difficulty': difficulty})
\ No newline at end of file
+        return Message.create(MSG_AI_MODE, {'difficulty': difficulty, 'codec': codec})
\ No newline at end of file